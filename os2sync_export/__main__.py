@@ -2,25 +2,81 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 import asyncio
-from operator import itemgetter
+import time
+from contextlib import aclosing
+from functools import partial
+from typing import Any
+from typing import AsyncIterable
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
 from typing import Dict
+from typing import Iterable
+from typing import List
 from typing import Set
+from typing import Tuple
+from typing import TypeVar
 from uuid import UUID
 
+import httpx
 import structlog
 from fastramqpi.ra_utils.asyncio_utils import gather_with_concurrency
-from fastramqpi.ra_utils.tqdm_wrapper import tqdm
 from gql.client import AsyncClientSession
 from more_itertools import all_unique
 from more_itertools import flatten
+from prometheus_client import Counter
+from prometheus_client import Gauge
+from tenacity import AsyncRetrying
+from tenacity import retry_if_exception
+from tenacity import stop_after_attempt
+from tenacity import wait_exponential
 
 from os2sync_export import os2mo
+from os2sync_export.concurrency import AdaptiveConcurrency
+from os2sync_export.concurrency import concurrency_limit
+from os2sync_export.concurrency import is_overloaded
 from os2sync_export.config import Settings
+from os2sync_export.depends import GraphQLClient
+from os2sync_export.exceptions import NotFoundError
+from os2sync_export.os2mo_gql import iter_org_unit_uuid_pages
+from os2sync_export.os2mo_gql import iter_person_uuids
+from os2sync_export.os2mo_gql import read_all_person_uuids
+from os2sync_export.os2mo_gql import read_org_unit_subtree_parents
+from os2sync_export.os2mo_gql import sync_mo_user_to_fk_org
+from os2sync_export.os2mo_gql import sync_orgunit
 from os2sync_export.os2sync import OS2SyncClient
+from os2sync_export.os2sync import user_changed
 from os2sync_export.os2sync_models import OrgUnit
+from os2sync_export.os2sync_models import User
+from os2sync_export.pipeline import map_unordered
 
 logger = structlog.stdlib.get_logger()
 
+T = TypeVar("T")
+
+write_failures = Counter(
+    "os2sync_export_write_failures",
+    "Writes to fk-org during a full sync which failed after retrying",
+    ["operation"],
+)
+# Wait between attempts of a write to fk-org
+write_retry_wait = wait_exponential(min=1, max=30)
+
+hierarchy_blocked_seconds = Gauge(
+    "os2sync_export_hierarchy_blocked_seconds",
+    "Time the last full sync was blocked waiting for the hierarchy from fk-org",
+)
+
+
+async def wait_for_hierarchy(hierarchy: "asyncio.Task[T]") -> T:
+    """Await the hierarchy fetched in the background and report how long we were blocked on it"""
+    start = time.monotonic()
+    result = await hierarchy
+    blocked = time.monotonic() - start
+    hierarchy_blocked_seconds.set(blocked)
+    logger.info(f"Waited {blocked:.1f}s for the hierarchy from fk-org")
+    return result
+
 
 def log_mox_config(settings):
     """It is imperative for log-forensics to have as
@@ -35,145 +91,465 @@ def log_mox_config(settings):
 
 
 async def read_all_org_units(
-    settings: Settings, graphql_session: AsyncClientSession
+    settings: Settings, graphql_client: GraphQLClient
 ) -> Dict[UUID, OrgUnit]:
     """Read all current org_units from OS2MO
 
     Returns a dict mapping uuids to os2sync payload for each org_unit
     """
     logger.info("read_all_org_units starting")
-    # Read all relevant org_unit uuids from os2mo
-    os2mo_uuids_present = await os2mo.org_unit_uuids(
+    # Read the relevant org_unit uuids from os2mo a page at a time,
+    # creating the os2sync payloads of each page while the next is fetched
+    found: List[UUID] = []
+    org_units: List[OrgUnit] = []
+    async for uuids in iter_org_unit_uuid_pages(
+        graphql_client,
         root=settings.top_unit_uuid,
         hierarchy_uuids=await os2mo.get_org_unit_hierarchy(
             settings.filter_hierarchy_names
         ),
-    )
-
-    logger.info(f"Aktive Orgenheder fundet i OS2MO {len(os2mo_uuids_present)}")
+        limit=settings.mo_page_size,
+    ):
+        found.extend(uuids)
+        org_units.extend(
+            await os2mo.read_sts_orgunits(graphql_client, uuids, settings=settings)
+        )
 
-    # Create os2sync payload for all org_units:
-    org_units = await asyncio.gather(
-        *[
-            os2mo.get_sts_orgunit(
-                UUID(i), settings=settings, graphql_session=graphql_session
-            )
-            for i in os2mo_uuids_present
-        ]
-    )
+    logger.info(f"Aktive Orgenheder fundet i OS2MO {len(found)}")
+    if not settings.filter_orgunit_uuid:
+        # The units read are below top_unit_uuid and in the filtered hierarchies, so they are relevant.
+        # Without ancestors we can't tell whether a unit is filtered by filter_orgunit_uuid.
+        # The cache is keyed by the uuids in os2mo, which differ from the payload uuids with uuid_from_it_systems.
+        relevance_cache = os2mo.get_relevance_cache()
+        for uuid in found:
+            relevance_cache.prime(uuid, True, ttl=settings.relevance_cache_ttl)
     # TODO: Check that only one org_unit has parent=None
 
-    return {ou.Uuid: ou for ou in org_units if ou}
+    return {ou.Uuid: ou for ou in org_units}
+
 
+def group_by_depth(parents: Dict[UUID, UUID | None]) -> List[List[UUID]]:
+    """Group uuids by their depth in the tree given a mapping of uuid to parent uuid.
 
-async def read_all_user_uuids(org_uuid: str, limit: int = 1_000) -> Set[str]:
-    """Return a set of all employee uuids in MO.
+    Units whose parent is not among the given uuids (eg. the top unit) are placed at depth 0.
+    Returns a list of levels where every unit's parent is found in an earlier level.
+    """
+    depths: Dict[UUID, int] = {}
+
+    def depth(uuid: UUID) -> int:
+        # Walk up the tree until we reach a unit with known depth or leave the given uuids
+        path: List[UUID] = []
+        current: UUID | None = uuid
+        while current in parents and current not in depths and current not in path:
+            path.append(current)
+            current = parents[current]
+        base = depths.get(current, -1) if current else -1
+        for i, u in enumerate(reversed(path), start=1):
+            depths[u] = base + i
+        return depths[uuid]
+
+    levels: List[List[UUID]] = []
+    for uuid in parents:
+        d = depth(uuid)
+        while len(levels) <= d:
+            levels.append([])
+        levels[d].append(uuid)
+    return levels
+
+
+async def upsert_org_units(
+    settings: Settings,
+    os2sync_client: OS2SyncClient,
+    org_units: Dict[UUID, OrgUnit],
+    snapshot: Dict[UUID, OrgUnit | None] | None = None,
+) -> None:
+    """Upsert org_units to fk-org one level at a time with bounded concurrency.
 
-    :param limit: Size of pagination groups. Set to 0 to skip pagination and fetch all users in one request.
-    :return: set of uuids of all employees.
+    Each level is completed before the next is started to ensure parents are created before their children.
+    If a snapshot of the org_units in fk-org is given, only org_units that have changed are written.
     """
 
-    start = 0
-    total = 1
-    all_employee_uuids = set()
-    while start < total:
-        res = await os2mo.os2mo_get(
-            f"{{BASE}}/o/{org_uuid}/e/?limit={limit}&start={start}"
+    async def upsert(org_unit: OrgUnit) -> bool:
+        if snapshot is None:
+            await os2sync_client.upsert_org_unit(org_unit)
+            return True
+        return await os2sync_client.upsert_org_unit_from_snapshot(org_unit, snapshot)
+
+    written = 0
+    levels = group_by_depth({u: o.ParentOrgUnitUuid for u, o in org_units.items()})
+    for depth, level in enumerate(levels):
+        logger.info(
+            f"Updating OrgUnits in fk-org at depth {depth+1}/{len(levels)}: {len(level)} units"
         )
-        employee_list = res.json()
+        results = await gather_with_concurrency(
+            settings.os2sync_concurrency,
+            *(upsert(org_units[uuid]) for uuid in level),
+        )
+        written += sum(results)
+    logger.info(
+        f"Updated {written} OrgUnits in fk-org, {len(org_units) - written} were unchanged"
+    )
 
-        batch = set(map(itemgetter("uuid"), employee_list["items"]))
-        all_employee_uuids.update(batch)
-        start = employee_list["offset"] + limit
-        total = employee_list["total"]
-    return all_employee_uuids
 
+def _retryable_write_error(error: BaseException) -> bool:
+    return is_overloaded(error) or isinstance(error, httpx.TransportError)
 
-async def read_all_users(
-    graphql_session: AsyncClientSession, settings: Settings
-) -> Dict[UUID, Dict]:
-    """Read all current users from OS2MO
 
-    Returns a dict mapping uuids to os2sync payload for each user
+async def write_all(
+    settings: Settings,
+    operation: str,
+    writes: Iterable[Tuple[UUID, Callable[[], Awaitable[Any]]]]
+    | AsyncIterable[Tuple[UUID, Callable[[], Awaitable[Any]]]],
+) -> Dict[UUID, Exception]:
+    """Run writes to fk-org with bounded concurrency, retrying each on connection errors and 429/5xx.
+
+    A failed write does not stop the others. Failures are returned by uuid to be reported at the end of the run.
+    """
+    failures: Dict[UUID, Exception] = {}
+
+    async def write(item: Tuple[UUID, Callable[[], Awaitable[Any]]]) -> None:
+        uuid, call = item
+        try:
+            async for attempt in AsyncRetrying(
+                retry=retry_if_exception(_retryable_write_error),
+                stop=stop_after_attempt(settings.os2sync_write_attempts),
+                wait=write_retry_wait,
+                reraise=True,
+            ):
+                with attempt:
+                    await call()
+        except Exception as e:
+            logger.error(f"{operation} failed", uuid=uuid, error=str(e))
+            write_failures.labels(operation).inc()
+            failures[uuid] = e
+
+    async with aclosing(
+        map_unordered(write, writes, settings.os2sync_concurrency)
+    ) as written:
+        async for _ in written:
+            pass
+    return failures
+
+
+def report_write_failures(failures: Dict[str, Dict[UUID, Exception]]) -> None:
+    """Log the number of writes to fk-org that failed during a full sync.
+
+    Each failure is logged by `write_all` when it happens.
+    """
+    total = sum(len(f) for f in failures.values())
+    if not total:
+        return
+    logger.error(
+        f"Skrivninger til OS2Sync som fejlede: {total}",
+        **{operation: len(f) for operation, f in failures.items()},
+    )
+
+
+async def iter_users(
+    graphql_session: AsyncClientSession,
+    graphql_client: GraphQLClient,
+    settings: Settings,
+) -> AsyncIterator[Dict]:
+    """Stream the os2sync payload of every current user in OS2MO
+
+    Pages of employee uuids are read ahead of building the payloads, which is done with bounded concurrency.
+    Only the uuids of the payloads are kept to skip duplicates.
     """
 
     logger.info("read_all_users starting")
 
-    org_uuid = await os2mo.organization_uuid()
+    uuids = iter_person_uuids(graphql_client, limit=settings.mo_page_size)
 
-    logger.info("read_all_users getting list of users from os2mo")
-    os2mo_uuids_present = await read_all_user_uuids(org_uuid)
+    build: Callable[[UUID], Awaitable[List[Dict]]]
+    if settings.mo_read_adaptive_concurrency:
+        limiter = AdaptiveConcurrency(
+            "read_all_users",
+            initial=settings.mo_read_concurrency,
+            maximum=settings.mo_read_max_concurrency,
+        )
 
-    logger.info(f"Medarbejdere fundet i OS2Mo: {len(os2mo_uuids_present)}")
+        def build(uuid: UUID) -> Awaitable[List[Dict]]:
+            return limiter.run(
+                partial(
+                    os2mo.get_sts_user,
+                    str(uuid),
+                    graphql_session=graphql_session,
+                    settings=settings,
+                )
+            )
 
-    tasks = [
-        os2mo.get_sts_user(uuid, graphql_session=graphql_session, settings=settings)
-        for uuid in os2mo_uuids_present
-    ]
-    all_users = await gather_with_concurrency(5, *tasks)
-    res: Dict[UUID, Dict] = {}
-    for u in flatten(all_users):
-        if u is None:
-            continue
-        user_uuid = UUID(u["Uuid"])  # type: ignore
-        if res.get(user_uuid):
-            # This might happen if more than one user has the same uuid in an it-account
-            # or one has the same uuid in an it-account as another user without any it-accounts' MO uuid
-            logger.error(f"Duplicated uuid: {user_uuid}")
-        else:
-            res[user_uuid] = u
+        concurrency = settings.mo_read_max_concurrency
+    else:
+        concurrency_limit.labels("read_all_users").set(settings.mo_read_concurrency)
 
-    return res
+        def build(uuid: UUID) -> Awaitable[List[Dict]]:
+            return os2mo.get_sts_user(
+                str(uuid), graphql_session=graphql_session, settings=settings
+            )
+
+        concurrency = settings.mo_read_concurrency
+
+    found = 0
+    emitted: Set[UUID] = set()
+    async with aclosing(map_unordered(build, uuids, concurrency)) as all_users:
+        async for users in all_users:
+            found += 1
+            for u in users:
+                if u is None:
+                    continue
+                user_uuid = UUID(u["Uuid"])
+                if user_uuid in emitted:
+                    # This might happen if more than one user has the same uuid in an it-account
+                    # or one has the same uuid in an it-account as another user without any it-accounts' MO uuid
+                    logger.error(f"Duplicated uuid: {user_uuid}")
+                    continue
+                emitted.add(user_uuid)
+                yield u
 
+    logger.info(f"Medarbejdere fundet i OS2Mo: {found}")
 
-async def main(settings: Settings, graphql_session, os2sync_client):
+
+async def read_all_users(
+    graphql_session: AsyncClientSession,
+    graphql_client: GraphQLClient,
+    settings: Settings,
+) -> Dict[UUID, Dict]:
+    """Read all current users from OS2MO
+
+    Returns a dict mapping uuids to os2sync payload for each user
+    """
+    return {
+        UUID(u["Uuid"]): u
+        async for u in iter_users(
+            graphql_session=graphql_session,
+            graphql_client=graphql_client,
+            settings=settings,
+        )
+    }
+
+
+async def main(
+    settings: Settings, graphql_session, graphql_client: GraphQLClient, os2sync_client
+):
     log_mox_config(settings)
 
     os2sync_client = os2sync_client or OS2SyncClient(settings=settings)
     request_uuid = await os2sync_client.trigger_hierarchy()
-    mo_org_units = await read_all_org_units(settings, graphql_session)
+    # The hierarchy holds the state of fk-org before this run and is used to skip unchanged objects.
+    # It is fetched in the background while reading from os2mo.
+    hierarchy = asyncio.create_task(
+        os2sync_client.get_snapshot(request_uuid=request_uuid)
+    )
+    try:
+        mo_org_units = await read_all_org_units(settings, graphql_client)
+    except BaseException:
+        hierarchy.cancel()
+        raise
 
     logger.info(f"Orgenheder som tjekkes i OS2Sync: {len(mo_org_units)}")
 
-    for org_unit in tqdm(
-        mo_org_units.values(), desc="Updating OrgUnits in fk-org", unit="OrgUnit"
-    ):
-        await os2sync_client.upsert_org_unit(org_unit)
-
     (
         existing_os2sync_org_units,
         existing_os2sync_users,
-    ) = await os2sync_client.get_existing_uuids(
-        request_uuid=request_uuid,
+    ) = await wait_for_hierarchy(hierarchy)
+
+    await upsert_org_units(
+        settings, os2sync_client, mo_org_units, snapshot=existing_os2sync_org_units
     )
 
+    # Failed writes of users and deletions, by operation
+    failures: Dict[str, Dict[UUID, Exception]] = {}
+
     if settings.autowash:
         # Delete any org_unit not in os2mo
         assert mo_org_units, "No org_units were found in os2mo. Stopping os2sync_export to ensure we won't delete every org_unit from fk-org"
-        terminated_org_units = existing_os2sync_org_units - set(mo_org_units)
+        terminated_org_units = existing_os2sync_org_units.keys() - set(mo_org_units)
         logger.info(f"Orgenheder som slettes i OS2Sync: {len(terminated_org_units)}")
-        for uuid in terminated_org_units:
-            await os2sync_client.delete_orgunit(uuid)
+        failures["delete_orgunit"] = await write_all(
+            settings,
+            "delete_orgunit",
+            (
+                (uuid, partial(os2sync_client.delete_orgunit, uuid))
+                for uuid in terminated_org_units
+            ),
+        )
 
     logger.info("sync_os2sync_orgunits done")
 
     logger.info("Start syncing users")
-    mo_users = await read_all_users(
-        graphql_session=graphql_session,
-        settings=settings,
+    # Payloads are streamed from os2mo to os2sync, keeping only the uuids of users in os2mo
+    mo_users: Set[UUID] = set()
+    unchanged = 0
+
+    async def changed_users() -> AsyncIterator[Tuple[UUID, Callable[[], Awaitable]]]:
+        nonlocal unchanged
+        async for user in iter_users(
+            graphql_session=graphql_session,
+            graphql_client=graphql_client,
+            settings=settings,
+        ):
+            uuid = UUID(user["Uuid"])
+            mo_users.add(uuid)
+            if user_changed(user, existing_os2sync_users.get(uuid)):
+                yield uuid, partial(os2sync_client.post_user, user, force=True)
+            else:
+                unchanged += 1
+
+    failures["post_user"] = await write_all(settings, "post_user", changed_users())
+    logger.info(
+        f"Medarbejdere overført til OS2SYNC: {len(mo_users) - unchanged}, uændrede: {unchanged}"
     )
     assert mo_users, "No mo-users were found. Stopping os2sync_export to ensure we won't delete every user from fk-org. Again"
-    # Create or update users
-    logger.info(f"Medarbejdere overført til OS2SYNC: {len(mo_users)}")
-    for user in mo_users.values():
-        await os2sync_client.os2sync_post("{BASE}/user", json=user)
 
     # Delete any user not in os2mo
-    terminated_users = existing_os2sync_users - set(mo_users)
+    terminated_users = existing_os2sync_users.keys() - mo_users
     logger.info(f"Medarbejdere slettes i OS2Sync: {len(terminated_users)}")
-    for uuid in terminated_users:
-        await os2sync_client.delete_user(uuid)
+    failures["delete_user"] = await write_all(
+        settings,
+        "delete_user",
+        (
+            (uuid, partial(os2sync_client.delete_user, uuid))
+            for uuid in terminated_users
+        ),
+    )
+
+    report_write_failures(failures)
+    logger.info("sync users done")
+
+
+async def main_new(
+    settings: Settings,
+    graphql_client: GraphQLClient,
+    os2sync_client: OS2SyncClient,
+    force: bool = False,
+):
+    """Full sync of every org_unit and person in MO to fk-org using the new integration
+
+    Payloads unchanged since they were last written are skipped unless force is set.
+    """
+    log_mox_config(settings)
+
+    # Failed syncs and deletions, by operation
+    failures: Dict[str, Dict[UUID, Exception]] = {"sync_orgunit": {}, "sync_person": {}}
+
+    async def sync_unit(uuid: UUID) -> OrgUnit | None:
+        try:
+            return await sync_orgunit(
+                uuid,
+                settings=settings,
+                graphql_client=graphql_client,
+                os2sync_client=os2sync_client,
+                force=force,
+            )
+        except NotFoundError:
+            logger.info("OrgUnit not found in MO", uuid=uuid)
+        except Exception as e:
+            logger.error("sync_orgunit failed", uuid=uuid, error=str(e))
+            write_failures.labels("sync_orgunit").inc()
+            failures["sync_orgunit"][uuid] = e
+        return None
+
+    request_uuid = await os2sync_client.trigger_hierarchy()
+
+    # Fetch the hierarchy in the background while syncing org_units
+    hierarchy = asyncio.create_task(
+        os2sync_client.get_existing_uuids(request_uuid=request_uuid)
+    )
+    try:
+        logger.info("Reading all org_units from MO")
+        parents = await read_org_unit_subtree_parents(
+            graphql_client, root=settings.top_unit_uuid, limit=settings.mo_page_size
+        )
+        logger.info(f"Orgenheder som tjekkes i OS2Sync: {len(parents)}")
+
+        synced_org_units: Set[UUID] = set()
+        levels = group_by_depth(parents)
+        for depth, level in enumerate(levels):
+            logger.info(
+                f"Updating OrgUnits in fk-org at depth {depth+1}/{len(levels)}: {len(level)} units"
+            )
+            org_units = await gather_with_concurrency(
+                settings.os2sync_concurrency, *(sync_unit(uuid) for uuid in level)
+            )
+            synced_org_units.update(o.Uuid for o in org_units if o)
+    except BaseException:
+        hierarchy.cancel()
+        raise
+
+    (
+        existing_os2sync_org_units,
+        existing_os2sync_users,
+    ) = await wait_for_hierarchy(hierarchy)
+
+    if settings.autowash and failures["sync_orgunit"]:
+        # The org_units which failed would look terminated, so we won't delete anything.
+        logger.error(
+            "Unable to sync some org_units, skipping deletion of org_units from fk-org"
+        )
+    elif settings.autowash:
+        # Delete any org_unit not in os2mo
+        assert synced_org_units, "No org_units were found in os2mo. Stopping os2sync_export to ensure we won't delete every org_unit from fk-org"
+        terminated_org_units = existing_os2sync_org_units - synced_org_units
+        logger.info(f"Orgenheder som slettes i OS2Sync: {len(terminated_org_units)}")
+        failures["delete_orgunit"] = await write_all(
+            settings,
+            "delete_orgunit",
+            (
+                (uuid, partial(os2sync_client.delete_orgunit, uuid))
+                for uuid in terminated_org_units
+            ),
+        )
+
+    logger.info("sync_os2sync_orgunits done")
+
+    logger.info("Start syncing users")
+    person_uuids = await read_all_person_uuids(
+        graphql_client, limit=settings.mo_page_size
+    )
+    logger.info(f"Medarbejdere fundet i OS2Mo: {len(person_uuids)}")
+
+    async def sync_person(uuid: UUID) -> tuple[list[User], set[UUID]]:
+        try:
+            return await sync_mo_user_to_fk_org(
+                uuid,
+                graphql_client=graphql_client,
+                settings=settings,
+                os2sync_client=os2sync_client,
+                force=force,
+            )
+        except Exception as e:
+            logger.error("sync_person failed", uuid=uuid, error=str(e))
+            write_failures.labels("sync_person").inc()
+            failures["sync_person"][uuid] = e
+            return [], set()
+
+    results = await gather_with_concurrency(
+        settings.os2sync_concurrency, *(sync_person(uuid) for uuid in person_uuids)
+    )
+    synced_users = {user.Uuid for updates, _ in results for user in updates}
+    deleted_users = set(flatten(deletes for _, deletes in results))
+    assert synced_users, "No mo-users were found. Stopping os2sync_export to ensure we won't delete every user from fk-org. Again"
+    logger.info(f"Medarbejdere overført til OS2SYNC: {len(synced_users)}")
+
+    if failures["sync_person"]:
+        # We can't tell which fk-org users belong to these persons so we won't delete anything.
+        logger.error(
+            "Unable to sync some persons, skipping deletion of users from fk-org"
+        )
+    else:
+        # Delete any user not in os2mo
+        terminated_users = existing_os2sync_users - synced_users - deleted_users
+        logger.info(f"Medarbejdere slettes i OS2Sync: {len(terminated_users)}")
+        failures["delete_user"] = await write_all(
+            settings,
+            "delete_user",
+            (
+                (uuid, partial(os2sync_client.delete_user, uuid))
+                for uuid in terminated_users
+            ),
+        )
 
+    report_write_failures(failures)
     logger.info("sync users done")
 
 
@@ -222,12 +598,13 @@ async def cleanup_duplicate_engagements(
 async def cleanup_duplicates(
     settings: Settings,
     graphql_session: AsyncClientSession,
+    graphql_client: GraphQLClient,
     os2sync_client: OS2SyncClient,
 ):
     logger.info("Starting cleanup of duplicates")
     logger.info("Reading all orgunits")
     orgunits = await read_all_org_units(
-        settings=settings, graphql_session=graphql_session
+        settings=settings, graphql_client=graphql_client
     )
     logger.info("Passivating and synchronizing orgunits")
     for uuid, unit in orgunits.items():
@@ -236,6 +613,7 @@ async def cleanup_duplicates(
     logger.info("Read all users from MO")
     mo_users = await read_all_users(
         graphql_session=graphql_session,
+        graphql_client=graphql_client,
         settings=settings,
     )
     logger.info("Passivating and synchronizing users")
@@ -205,6 +205,70 @@ from .input_types import UuidsBoundITUserFilter
 from .input_types import UuidsBoundLeaveFilter
 from .input_types import UuidsBoundOrganisationUnitFilter
 from .input_types import ValidityInput
+from .read_all_employee_uuids import ReadAllEmployeeUuids
+from .read_all_employee_uuids import ReadAllEmployeeUuidsEmployees
+from .read_all_employee_uuids import ReadAllEmployeeUuidsEmployeesObjects
+from .read_all_employee_uuids import ReadAllEmployeeUuidsEmployeesPageInfo
+from .read_org_tree import ReadOrgTree
+from .read_org_tree import ReadOrgTreeOrgUnits
+from .read_org_tree import ReadOrgTreeOrgUnitsObjects
+from .read_org_tree import ReadOrgTreeOrgUnitsObjectsCurrent
+from .read_org_tree import ReadOrgTreeOrgUnitsObjectsCurrentItusers
+from .read_org_tree import ReadOrgTreeOrgUnitsObjectsCurrentItusersItsystem
+from .read_org_tree import ReadOrgTreeOrgUnitsObjectsCurrentOrgUnitHierarchyModel
+from .read_org_tree import ReadOrgTreeOrgUnitsObjectsCurrentParent
+from .read_org_tree import ReadOrgTreeOrgUnitsPageInfo
+from .read_org_unit_fk_org_it_users import ReadOrgUnitFkOrgItUsers
+from .read_org_unit_fk_org_it_users import ReadOrgUnitFkOrgItUsersOrgUnits
+from .read_org_unit_fk_org_it_users import ReadOrgUnitFkOrgItUsersOrgUnitsObjects
+from .read_org_unit_fk_org_it_users import ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrent
+from .read_org_unit_fk_org_it_users import (
+    ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrentItusers,
+)
+from .read_org_unit_fk_org_it_users import (
+    ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrentItusersItsystem,
+)
+from .read_org_unit_fk_org_it_users import ReadOrgUnitFkOrgItUsersOrgUnitsPageInfo
+from .read_org_unit_subtree_uuids import ReadOrgUnitSubtreeUuids
+from .read_org_unit_subtree_uuids import ReadOrgUnitSubtreeUuidsOrgUnits
+from .read_org_unit_subtree_uuids import ReadOrgUnitSubtreeUuidsOrgUnitsObjects
+from .read_org_unit_subtree_uuids import ReadOrgUnitSubtreeUuidsOrgUnitsObjectsCurrent
+from .read_org_unit_subtree_uuids import (
+    ReadOrgUnitSubtreeUuidsOrgUnitsObjectsCurrentParent,
+)
+from .read_org_unit_subtree_uuids import ReadOrgUnitSubtreeUuidsOrgUnitsPageInfo
+from .read_org_units_bulk import ReadOrgUnitsBulk
+from .read_org_units_bulk import ReadOrgUnitsBulkOrgUnits
+from .read_org_units_bulk import ReadOrgUnitsBulkOrgUnitsObjects
+from .read_org_units_bulk import ReadOrgUnitsBulkOrgUnitsObjectsCurrent
+from .read_org_units_bulk import ReadOrgUnitsBulkOrgUnitsObjectsCurrentAllItusers
+from .read_org_units_bulk import (
+    ReadOrgUnitsBulkOrgUnitsObjectsCurrentAllItusersItsystem,
+)
+from .read_org_units_bulk import ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspects
+from .read_org_units_bulk import (
+    ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspectsKleAspects,
+)
+from .read_org_units_bulk import (
+    ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspectsKleNumber,
+)
+from .read_org_units_bulk import ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersons
+from .read_org_units_bulk import (
+    ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPerson,
+)
+from .read_org_units_bulk import (
+    ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPersonItusers,
+)
+from .read_org_units_bulk import (
+    ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPersonItusersItsystem,
+)
+from .read_org_units_bulk import ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusers
+from .read_org_units_bulk import (
+    ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusersItusers,
+)
+from .read_org_units_bulk import (
+    ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusersItusersItsystem,
+)
 from .read_orgunit import ReadOrgunit
 from .read_orgunit import ReadOrgunitOrgUnits
 from .read_orgunit import ReadOrgunitOrgUnitsObjects
@@ -435,6 +499,48 @@ __all__ = [
     "ParentsBoundFacetFilter",
     "RAOpenValidityInput",
     "RAValidityInput",
+    "ReadAllEmployeeUuids",
+    "ReadAllEmployeeUuidsEmployees",
+    "ReadAllEmployeeUuidsEmployeesObjects",
+    "ReadAllEmployeeUuidsEmployeesPageInfo",
+    "ReadOrgTree",
+    "ReadOrgTreeOrgUnits",
+    "ReadOrgTreeOrgUnitsObjects",
+    "ReadOrgTreeOrgUnitsObjectsCurrent",
+    "ReadOrgTreeOrgUnitsObjectsCurrentItusers",
+    "ReadOrgTreeOrgUnitsObjectsCurrentItusersItsystem",
+    "ReadOrgTreeOrgUnitsObjectsCurrentOrgUnitHierarchyModel",
+    "ReadOrgTreeOrgUnitsObjectsCurrentParent",
+    "ReadOrgTreeOrgUnitsPageInfo",
+    "ReadOrgUnitFkOrgItUsers",
+    "ReadOrgUnitFkOrgItUsersOrgUnits",
+    "ReadOrgUnitFkOrgItUsersOrgUnitsObjects",
+    "ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrent",
+    "ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrentItusers",
+    "ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrentItusersItsystem",
+    "ReadOrgUnitFkOrgItUsersOrgUnitsPageInfo",
+    "ReadOrgUnitSubtreeUuids",
+    "ReadOrgUnitSubtreeUuidsOrgUnits",
+    "ReadOrgUnitSubtreeUuidsOrgUnitsObjects",
+    "ReadOrgUnitSubtreeUuidsOrgUnitsObjectsCurrent",
+    "ReadOrgUnitSubtreeUuidsOrgUnitsObjectsCurrentParent",
+    "ReadOrgUnitSubtreeUuidsOrgUnitsPageInfo",
+    "ReadOrgUnitsBulk",
+    "ReadOrgUnitsBulkOrgUnits",
+    "ReadOrgUnitsBulkOrgUnitsObjects",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrent",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentAllItusers",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentAllItusersItsystem",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspects",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspectsKleAspects",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspectsKleNumber",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersons",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPerson",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPersonItusers",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPersonItusersItsystem",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusers",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusersItusers",
+    "ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusersItusersItsystem",
     "ReadOrgunit",
     "ReadOrgunitOrgUnits",
     "ReadOrgunitOrgUnitsObjects",
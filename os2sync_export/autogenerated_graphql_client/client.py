@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Any
 from typing import List
 from typing import Optional
 from typing import Union
@@ -31,6 +32,16 @@ from .input_types import ITSystemFilter
 from .input_types import ITSystemTerminateInput
 from .input_types import ITUserCreateInput
 from .input_types import OrganisationUnitCreateInput
+from .read_all_employee_uuids import ReadAllEmployeeUuids
+from .read_all_employee_uuids import ReadAllEmployeeUuidsEmployees
+from .read_org_tree import ReadOrgTree
+from .read_org_tree import ReadOrgTreeOrgUnits
+from .read_org_unit_fk_org_it_users import ReadOrgUnitFkOrgItUsers
+from .read_org_unit_fk_org_it_users import ReadOrgUnitFkOrgItUsersOrgUnits
+from .read_org_unit_subtree_uuids import ReadOrgUnitSubtreeUuids
+from .read_org_unit_subtree_uuids import ReadOrgUnitSubtreeUuidsOrgUnits
+from .read_org_units_bulk import ReadOrgUnitsBulk
+from .read_org_units_bulk import ReadOrgUnitsBulkOrgUnits
 from .read_orgunit import ReadOrgunit
 from .read_orgunit import ReadOrgunitOrgUnits
 from .read_user_i_t_accounts import ReadUserITAccounts
@@ -256,6 +267,105 @@ class GraphQLClient(AsyncBaseClient):
         data = self.get_data(response)
         return ReadOrgunit.parse_obj(data).org_units
 
+    async def read_org_units_bulk(self, uuids: List[UUID]) -> ReadOrgUnitsBulkOrgUnits:
+        query = gql("""
+            query ReadOrgUnitsBulk($uuids: [UUID!]!) {
+              org_units(filter: {uuids: $uuids}) {
+                objects {
+                  current {
+                    ...UnitFields
+                    all_itusers: itusers {
+                      user_key
+                      itsystem {
+                        uuid
+                        name
+                      }
+                    }
+                    parent_itusers: parent {
+                      itusers {
+                        user_key
+                        itsystem {
+                          name
+                        }
+                      }
+                    }
+                    manager_persons: managers {
+                      person {
+                        uuid
+                        itusers {
+                          uuid
+                          user_key
+                          engagement_uuid
+                          itsystem {
+                            name
+                          }
+                        }
+                      }
+                    }
+                    kles_with_aspects: kles {
+                      kle_number {
+                        uuid
+                      }
+                      kle_aspects {
+                        name
+                      }
+                    }
+                  }
+                }
+              }
+            }
+
+            fragment UnitFields on OrganisationUnit {
+              uuid
+              name
+              parent {
+                uuid
+                itusers(filter: {user_keys: ["FK-ORG-UUID", "FK-ORG UUID"]}) {
+                  user_key
+                }
+              }
+              ancestors {
+                uuid
+              }
+              unit_type {
+                uuid
+              }
+              org_unit_level {
+                uuid
+              }
+              org_unit_hierarchy_model {
+                name
+              }
+              addresses {
+                address_type {
+                  scope
+                  uuid
+                  user_key
+                }
+                name
+              }
+              itusers(filter: {user_keys: ["FK-ORG-UUID", "FK-ORG UUID"]}) {
+                user_key
+              }
+              managers {
+                person {
+                  itusers(filter: {itsystem: {user_keys: ["FK-ORG-UUID", "FK-ORG UUID"]}}) {
+                    external_id
+                  }
+                }
+              }
+              kles {
+                kle_number {
+                  uuid
+                }
+              }
+            }
+            """)
+        variables: dict[str, object] = {"uuids": uuids}
+        response = await self.execute(query=query, variables=variables)
+        data = self.get_data(response)
+        return ReadOrgUnitsBulk.parse_obj(data).org_units
+
     async def find_address_unit_or_person(
         self, uuid: UUID
     ) -> FindAddressUnitOrPersonAddresses:
@@ -363,6 +473,141 @@ class GraphQLClient(AsyncBaseClient):
         data = self.get_data(response)
         return FindEngagementPerson.parse_obj(data).engagements
 
+    async def read_all_employee_uuids(
+        self,
+        limit: Union[Optional[Any], UnsetType] = UNSET,
+        cursor: Union[Optional[Any], UnsetType] = UNSET,
+    ) -> ReadAllEmployeeUuidsEmployees:
+        query = gql("""
+            query ReadAllEmployeeUuids($limit: int, $cursor: Cursor = null) {
+              employees(limit: $limit, cursor: $cursor) {
+                page_info {
+                  next_cursor
+                }
+                objects {
+                  uuid
+                }
+              }
+            }
+            """)
+        variables: dict[str, object] = {"limit": limit, "cursor": cursor}
+        response = await self.execute(query=query, variables=variables)
+        data = self.get_data(response)
+        return ReadAllEmployeeUuids.parse_obj(data).employees
+
+    async def read_org_tree(
+        self,
+        uuids: Union[Optional[List[UUID]], UnsetType] = UNSET,
+        limit: Union[Optional[Any], UnsetType] = UNSET,
+        cursor: Union[Optional[Any], UnsetType] = UNSET,
+    ) -> ReadOrgTreeOrgUnits:
+        query = gql("""
+            query ReadOrgTree($uuids: [UUID!] = null, $limit: int, $cursor: Cursor = null) {
+              org_units(filter: {uuids: $uuids}, limit: $limit, cursor: $cursor) {
+                page_info {
+                  next_cursor
+                }
+                objects {
+                  uuid
+                  current {
+                    parent {
+                      uuid
+                    }
+                    org_unit_hierarchy_model {
+                      name
+                    }
+                    itusers {
+                      itsystem {
+                        name
+                      }
+                    }
+                  }
+                }
+              }
+            }
+            """)
+        variables: dict[str, object] = {
+            "uuids": uuids,
+            "limit": limit,
+            "cursor": cursor,
+        }
+        response = await self.execute(query=query, variables=variables)
+        data = self.get_data(response)
+        return ReadOrgTree.parse_obj(data).org_units
+
+    async def read_org_unit_fk_org_it_users(
+        self,
+        uuids: Union[Optional[List[UUID]], UnsetType] = UNSET,
+        limit: Union[Optional[Any], UnsetType] = UNSET,
+        cursor: Union[Optional[Any], UnsetType] = UNSET,
+    ) -> ReadOrgUnitFkOrgItUsersOrgUnits:
+        query = gql("""
+            query ReadOrgUnitFkOrgItUsers($uuids: [UUID!] = null, $limit: int, $cursor: Cursor = null) {
+              org_units(filter: {uuids: $uuids}, limit: $limit, cursor: $cursor) {
+                page_info {
+                  next_cursor
+                }
+                objects {
+                  uuid
+                  current {
+                    itusers {
+                      user_key
+                      itsystem {
+                        name
+                      }
+                    }
+                  }
+                }
+              }
+            }
+            """)
+        variables: dict[str, object] = {
+            "uuids": uuids,
+            "limit": limit,
+            "cursor": cursor,
+        }
+        response = await self.execute(query=query, variables=variables)
+        data = self.get_data(response)
+        return ReadOrgUnitFkOrgItUsers.parse_obj(data).org_units
+
+    async def read_org_unit_subtree_uuids(
+        self,
+        root: UUID,
+        hierarchy: Union[Optional[ClassFilter], UnsetType] = UNSET,
+        limit: Union[Optional[Any], UnsetType] = UNSET,
+        cursor: Union[Optional[Any], UnsetType] = UNSET,
+    ) -> ReadOrgUnitSubtreeUuidsOrgUnits:
+        query = gql("""
+            query ReadOrgUnitSubtreeUuids($root: UUID!, $hierarchy: ClassFilter = null, $limit: int, $cursor: Cursor = null) {
+              org_units(
+                filter: {ancestor: {uuids: [$root]}, hierarchy: $hierarchy}
+                limit: $limit
+                cursor: $cursor
+              ) {
+                page_info {
+                  next_cursor
+                }
+                objects {
+                  uuid
+                  current {
+                    parent {
+                      uuid
+                    }
+                  }
+                }
+              }
+            }
+            """)
+        variables: dict[str, object] = {
+            "root": root,
+            "hierarchy": hierarchy,
+            "limit": limit,
+            "cursor": cursor,
+        }
+        response = await self.execute(query=query, variables=variables)
+        data = self.get_data(response)
+        return ReadOrgUnitSubtreeUuids.parse_obj(data).org_units
+
     async def find_f_k_itsystem(self) -> FindFKItsystemItsystems:
         query = gql("""
             query FindFKItsystem {
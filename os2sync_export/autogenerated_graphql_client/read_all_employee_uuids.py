@@ -1,4 +1,6 @@
+from typing import Any
 from typing import List
+from typing import Optional
 from uuid import UUID
 
 from .base_model import BaseModel
@@ -9,13 +11,19 @@ class ReadAllEmployeeUuids(BaseModel):
 
 
 class ReadAllEmployeeUuidsEmployees(BaseModel):
+    page_info: "ReadAllEmployeeUuidsEmployeesPageInfo"
     objects: List["ReadAllEmployeeUuidsEmployeesObjects"]
 
 
+class ReadAllEmployeeUuidsEmployeesPageInfo(BaseModel):
+    next_cursor: Optional[Any]
+
+
 class ReadAllEmployeeUuidsEmployeesObjects(BaseModel):
     uuid: UUID
 
 
 ReadAllEmployeeUuids.update_forward_refs()
 ReadAllEmployeeUuidsEmployees.update_forward_refs()
+ReadAllEmployeeUuidsEmployeesPageInfo.update_forward_refs()
 ReadAllEmployeeUuidsEmployeesObjects.update_forward_refs()
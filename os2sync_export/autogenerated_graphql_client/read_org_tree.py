@@ -0,0 +1,59 @@
+from typing import Any
+from typing import List
+from typing import Optional
+from uuid import UUID
+
+from .base_model import BaseModel
+
+
+class ReadOrgTree(BaseModel):
+    org_units: "ReadOrgTreeOrgUnits"
+
+
+class ReadOrgTreeOrgUnits(BaseModel):
+    page_info: "ReadOrgTreeOrgUnitsPageInfo"
+    objects: List["ReadOrgTreeOrgUnitsObjects"]
+
+
+class ReadOrgTreeOrgUnitsPageInfo(BaseModel):
+    next_cursor: Optional[Any]
+
+
+class ReadOrgTreeOrgUnitsObjects(BaseModel):
+    uuid: UUID
+    current: Optional["ReadOrgTreeOrgUnitsObjectsCurrent"]
+
+
+class ReadOrgTreeOrgUnitsObjectsCurrent(BaseModel):
+    parent: Optional["ReadOrgTreeOrgUnitsObjectsCurrentParent"]
+    org_unit_hierarchy_model: Optional[
+        "ReadOrgTreeOrgUnitsObjectsCurrentOrgUnitHierarchyModel"
+    ]
+    itusers: List["ReadOrgTreeOrgUnitsObjectsCurrentItusers"]
+
+
+class ReadOrgTreeOrgUnitsObjectsCurrentParent(BaseModel):
+    uuid: UUID
+
+
+class ReadOrgTreeOrgUnitsObjectsCurrentOrgUnitHierarchyModel(BaseModel):
+    name: str
+
+
+class ReadOrgTreeOrgUnitsObjectsCurrentItusers(BaseModel):
+    itsystem: "ReadOrgTreeOrgUnitsObjectsCurrentItusersItsystem"
+
+
+class ReadOrgTreeOrgUnitsObjectsCurrentItusersItsystem(BaseModel):
+    name: str
+
+
+ReadOrgTree.update_forward_refs()
+ReadOrgTreeOrgUnits.update_forward_refs()
+ReadOrgTreeOrgUnitsPageInfo.update_forward_refs()
+ReadOrgTreeOrgUnitsObjects.update_forward_refs()
+ReadOrgTreeOrgUnitsObjectsCurrent.update_forward_refs()
+ReadOrgTreeOrgUnitsObjectsCurrentParent.update_forward_refs()
+ReadOrgTreeOrgUnitsObjectsCurrentOrgUnitHierarchyModel.update_forward_refs()
+ReadOrgTreeOrgUnitsObjectsCurrentItusers.update_forward_refs()
+ReadOrgTreeOrgUnitsObjectsCurrentItusersItsystem.update_forward_refs()
@@ -0,0 +1,46 @@
+from typing import Any
+from typing import List
+from typing import Optional
+from uuid import UUID
+
+from .base_model import BaseModel
+
+
+class ReadOrgUnitFkOrgItUsers(BaseModel):
+    org_units: "ReadOrgUnitFkOrgItUsersOrgUnits"
+
+
+class ReadOrgUnitFkOrgItUsersOrgUnits(BaseModel):
+    page_info: "ReadOrgUnitFkOrgItUsersOrgUnitsPageInfo"
+    objects: List["ReadOrgUnitFkOrgItUsersOrgUnitsObjects"]
+
+
+class ReadOrgUnitFkOrgItUsersOrgUnitsPageInfo(BaseModel):
+    next_cursor: Optional[Any]
+
+
+class ReadOrgUnitFkOrgItUsersOrgUnitsObjects(BaseModel):
+    uuid: UUID
+    current: Optional["ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrent"]
+
+
+class ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrent(BaseModel):
+    itusers: List["ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrentItusers"]
+
+
+class ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrentItusers(BaseModel):
+    user_key: str
+    itsystem: "ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrentItusersItsystem"
+
+
+class ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrentItusersItsystem(BaseModel):
+    name: str
+
+
+ReadOrgUnitFkOrgItUsers.update_forward_refs()
+ReadOrgUnitFkOrgItUsersOrgUnits.update_forward_refs()
+ReadOrgUnitFkOrgItUsersOrgUnitsPageInfo.update_forward_refs()
+ReadOrgUnitFkOrgItUsersOrgUnitsObjects.update_forward_refs()
+ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrent.update_forward_refs()
+ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrentItusers.update_forward_refs()
+ReadOrgUnitFkOrgItUsersOrgUnitsObjectsCurrentItusersItsystem.update_forward_refs()
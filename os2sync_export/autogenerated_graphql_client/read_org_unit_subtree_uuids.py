@@ -0,0 +1,40 @@
+from typing import Any
+from typing import List
+from typing import Optional
+from uuid import UUID
+
+from .base_model import BaseModel
+
+
+class ReadOrgUnitSubtreeUuids(BaseModel):
+    org_units: "ReadOrgUnitSubtreeUuidsOrgUnits"
+
+
+class ReadOrgUnitSubtreeUuidsOrgUnits(BaseModel):
+    page_info: "ReadOrgUnitSubtreeUuidsOrgUnitsPageInfo"
+    objects: List["ReadOrgUnitSubtreeUuidsOrgUnitsObjects"]
+
+
+class ReadOrgUnitSubtreeUuidsOrgUnitsPageInfo(BaseModel):
+    next_cursor: Optional[Any]
+
+
+class ReadOrgUnitSubtreeUuidsOrgUnitsObjects(BaseModel):
+    uuid: UUID
+    current: Optional["ReadOrgUnitSubtreeUuidsOrgUnitsObjectsCurrent"]
+
+
+class ReadOrgUnitSubtreeUuidsOrgUnitsObjectsCurrent(BaseModel):
+    parent: Optional["ReadOrgUnitSubtreeUuidsOrgUnitsObjectsCurrentParent"]
+
+
+class ReadOrgUnitSubtreeUuidsOrgUnitsObjectsCurrentParent(BaseModel):
+    uuid: UUID
+
+
+ReadOrgUnitSubtreeUuids.update_forward_refs()
+ReadOrgUnitSubtreeUuidsOrgUnits.update_forward_refs()
+ReadOrgUnitSubtreeUuidsOrgUnitsPageInfo.update_forward_refs()
+ReadOrgUnitSubtreeUuidsOrgUnitsObjects.update_forward_refs()
+ReadOrgUnitSubtreeUuidsOrgUnitsObjectsCurrent.update_forward_refs()
+ReadOrgUnitSubtreeUuidsOrgUnitsObjectsCurrentParent.update_forward_refs()
@@ -0,0 +1,103 @@
+from typing import List
+from typing import Optional
+from uuid import UUID
+
+from .base_model import BaseModel
+from .fragments import UnitFields
+
+
+class ReadOrgUnitsBulk(BaseModel):
+    org_units: "ReadOrgUnitsBulkOrgUnits"
+
+
+class ReadOrgUnitsBulkOrgUnits(BaseModel):
+    objects: List["ReadOrgUnitsBulkOrgUnitsObjects"]
+
+
+class ReadOrgUnitsBulkOrgUnitsObjects(BaseModel):
+    current: Optional["ReadOrgUnitsBulkOrgUnitsObjectsCurrent"]
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrent(UnitFields):
+    all_itusers: List["ReadOrgUnitsBulkOrgUnitsObjectsCurrentAllItusers"]
+    parent_itusers: Optional["ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusers"]
+    manager_persons: List["ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersons"]
+    kles_with_aspects: List["ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspects"]
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentAllItusers(BaseModel):
+    user_key: str
+    itsystem: "ReadOrgUnitsBulkOrgUnitsObjectsCurrentAllItusersItsystem"
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentAllItusersItsystem(BaseModel):
+    uuid: UUID
+    name: str
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusers(BaseModel):
+    itusers: List["ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusersItusers"]
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusersItusers(BaseModel):
+    user_key: str
+    itsystem: "ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusersItusersItsystem"
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusersItusersItsystem(BaseModel):
+    name: str
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersons(BaseModel):
+    person: Optional[List["ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPerson"]]
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPerson(BaseModel):
+    uuid: UUID
+    itusers: List["ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPersonItusers"]
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPersonItusers(BaseModel):
+    uuid: UUID
+    user_key: str
+    engagement_uuid: Optional[UUID]
+    itsystem: (
+        "ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPersonItusersItsystem"
+    )
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPersonItusersItsystem(
+    BaseModel
+):
+    name: str
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspects(BaseModel):
+    kle_number: List["ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspectsKleNumber"]
+    kle_aspects: List["ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspectsKleAspects"]
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspectsKleNumber(BaseModel):
+    uuid: UUID
+
+
+class ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspectsKleAspects(BaseModel):
+    name: str
+
+
+ReadOrgUnitsBulk.update_forward_refs()
+ReadOrgUnitsBulkOrgUnits.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjects.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrent.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentAllItusers.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentAllItusersItsystem.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusers.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusersItusers.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentParentItusersItusersItsystem.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersons.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPerson.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPersonItusers.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentManagerPersonsPersonItusersItsystem.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspects.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspectsKleNumber.update_forward_refs()
+ReadOrgUnitsBulkOrgUnitsObjectsCurrentKlesWithAspectsKleAspects.update_forward_refs()
@@ -0,0 +1,109 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+"""Batching of concurrent lookups of single objects, in the style of a DataLoader.
+
+Lookups made within the same iteration of the event loop are collected and loaded with a
+single call, whose result is fanned back out to each caller.
+"""
+
+import asyncio
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Generic
+from typing import Hashable
+from typing import List
+from typing import Mapping
+from typing import Set
+from typing import Tuple
+from typing import TypeVar
+
+from prometheus_client import Counter
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+batched_loads = Counter(
+    "os2sync_export_batched_loads",
+    "Lookups of single objects loaded in a batch",
+    ["name"],
+)
+batches = Counter(
+    "os2sync_export_batches",
+    "Batches of lookups loaded with a single call",
+    ["name"],
+)
+
+# Maximum number of keys loaded with a single call
+MAX_BATCH_SIZE = 100
+
+
+class _Batch(Generic[K, V]):
+    def __init__(
+        self, name: str, load_many: Callable[[List[K]], Awaitable[Mapping[K, V]]]
+    ):
+        self.name = name
+        self.load_many = load_many
+        self.futures: Dict[K, asyncio.Future[V | None]] = {}
+
+    def add(self, key: K) -> asyncio.Future[V | None]:
+        if key not in self.futures:
+            self.futures[key] = asyncio.get_running_loop().create_future()
+        return self.futures[key]
+
+    async def run(self) -> None:
+        batches.labels(self.name).inc()
+        batched_loads.labels(self.name).inc(len(self.futures))
+        try:
+            values = await self.load_many(list(self.futures))
+        except Exception as error:
+            for future in self.futures.values():
+                if not future.done():
+                    future.set_exception(error)
+                    # Retrieved here in case every caller was cancelled
+                    future.exception()
+            return
+        for key, future in self.futures.items():
+            if not future.done():
+                future.set_result(values.get(key))
+
+
+# The batches collecting keys in this iteration of the event loop, by name and scope
+_collecting: Dict[Tuple[str, int], _Batch] = {}
+# Keep references to the running batches so they aren't garbage collected
+_running: Set[asyncio.Task] = set()
+
+
+def _dispatch(batch_key: Tuple[str, int], batch: _Batch) -> None:
+    if _collecting.get(batch_key) is batch:
+        del _collecting[batch_key]
+    task = asyncio.ensure_future(batch.run())
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def load(
+    name: str,
+    scope: object,
+    key: K,
+    load_many: Callable[[List[K]], Awaitable[Mapping[K, V]]],
+) -> V | None:
+    """Load the value of `key`, batched with the concurrent loads with the same name and scope.
+
+    `load_many` is called with the keys of the batch once the current iteration of the event
+    loop is done, and returns the values found by key. Returns None if the key is not found.
+    The scope is typically the session used by `load_many`, as loads are only batched together
+    if they can share it.
+    """
+    batch_key = (name, id(scope))
+    batch = _collecting.get(batch_key)
+    if batch is None:
+        batch = _collecting[batch_key] = _Batch(name, load_many)
+        asyncio.get_running_loop().call_soon(_dispatch, batch_key, batch)
+    future = batch.add(key)
+    if len(batch.futures) >= MAX_BATCH_SIZE:
+        # Later loads start a new batch, this one is still dispatched as scheduled
+        del _collecting[batch_key]
+    # Shielded so a cancelled caller doesn't cancel the load shared with others
+    return await asyncio.shield(future)
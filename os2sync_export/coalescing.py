@@ -0,0 +1,172 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from functools import lru_cache
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Set
+from typing import Tuple
+
+import structlog
+from fastramqpi.ra_utils.asyncio_utils import gather_with_concurrency
+from more_itertools import chunked
+from prometheus_client import Counter
+from tenacity import AsyncRetrying
+from tenacity import stop_after_attempt
+from tenacity import wait_exponential
+
+from os2sync_export.autogenerated_graphql_client import GraphQLClient
+
+logger = structlog.stdlib.get_logger()
+
+events_sent = Counter(
+    "os2sync_export_internal_events_sent",
+    "Internal events sent to the os2sync_export namespace",
+    ["routing_key"],
+)
+events_coalesced = Counter(
+    "os2sync_export_internal_events_coalesced",
+    "Internal events dropped as a duplicate of an event waiting to be sent",
+    ["routing_key"],
+)
+
+NAMESPACE = "os2sync_export"
+# Number of events sent in each request, and number of concurrent requests
+BATCH_SIZE = 100
+BATCH_CONCURRENCY = 5
+
+# An event is a routing_key and a subject
+EventKey = Tuple[str, str]
+
+
+@lru_cache
+def _event_send_batch(size: int) -> str:
+    """A mutation sending `size` events using an alias for each"""
+    variables = ", ".join(
+        f"$routing_key_{i}: String!, $subject_{i}: String!" for i in range(size)
+    )
+    fields = "\n".join(
+        f"  e{i}: event_send(input: {{namespace: $namespace, routing_key: $routing_key_{i}, subject: $subject_{i}}})"
+        for i in range(size)
+    )
+    return f"mutation EventSendBatch($namespace: String!, {variables}) {{\n{fields}\n}}"
+
+
+async def _send_batch(graphql_client: GraphQLClient, events: List[EventKey]) -> None:
+    if len(events) == 1:
+        routing_key, subject = events[0]
+        await graphql_client.event_send(
+            namespace=NAMESPACE, routing_key=routing_key, subject=subject
+        )
+    else:
+        variables: Dict[str, object] = {"namespace": NAMESPACE}
+        for i, (routing_key, subject) in enumerate(events):
+            variables[f"routing_key_{i}"] = routing_key
+            variables[f"subject_{i}"] = subject
+        response = await graphql_client.execute(
+            query=_event_send_batch(len(events)), variables=variables
+        )
+        graphql_client.get_data(response)
+    for routing_key, _ in events:
+        events_sent.labels(routing_key).inc()
+
+
+async def send_events(
+    graphql_client: GraphQLClient, events: Iterable[EventKey]
+) -> None:
+    """Send internal events, many in each request and with bounded concurrency"""
+    await gather_with_concurrency(
+        BATCH_CONCURRENCY,
+        *(_send_batch(graphql_client, batch) for batch in chunked(events, BATCH_SIZE)),
+    )
+
+
+class EventCoalescer:
+    """Collapse duplicate internal events within a window.
+
+    Events are sent in batches `window` seconds after the first event of the batch is added.
+    Events with the same routing_key and subject added in the meantime are dropped, as the
+    handler reads the current state from MO anyway. An event added after the pending one
+    was sent is sent again.
+
+    Adding events waits until their batch is sent, and raises if it can't be sent, so the
+    event causing them is only acknowledged once they are sent and is otherwise redelivered.
+    """
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        # Insertion ordered set of the events waiting to be sent
+        self.pending: Dict[EventKey, None] = {}
+        # Resolved when the pending events are sent
+        self.flushed: asyncio.Future[None] | None = None
+        self.graphql_client: GraphQLClient | None = None
+        self.waiting: asyncio.Task | None = None
+        self.sending: Set[asyncio.Task] = set()
+
+    async def add(
+        self, graphql_client: GraphQLClient, events: Iterable[EventKey]
+    ) -> None:
+        self.graphql_client = graphql_client
+        added = False
+        for key in events:
+            added = True
+            if key in self.pending:
+                events_coalesced.labels(key[0]).inc()
+                continue
+            self.pending[key] = None
+        if not added:
+            return
+        if self.flushed is None:
+            self.flushed = asyncio.get_running_loop().create_future()
+        flushed = self.flushed
+        if self.waiting is None:
+            self.waiting = asyncio.create_task(self._send_later())
+        # Shielded so a cancelled handler doesn't cancel the batch shared with others
+        await asyncio.shield(flushed)
+
+    async def _send_later(self) -> None:
+        await asyncio.sleep(self.window)
+        self.waiting = None
+        task = asyncio.current_task()
+        assert task is not None
+        self.sending.add(task)
+        try:
+            await self._send()
+        finally:
+            self.sending.discard(task)
+
+    async def _send(self) -> None:
+        events, self.pending = list(self.pending), {}
+        flushed, self.flushed = self.flushed, None
+        if flushed is None:
+            return
+        try:
+            if self.graphql_client is not None:
+                async for attempt in AsyncRetrying(
+                    stop=stop_after_attempt(5),
+                    wait=wait_exponential(min=1, max=30),
+                    reraise=True,
+                ):
+                    with attempt:
+                        await send_events(self.graphql_client, events)
+        except asyncio.CancelledError:
+            flushed.cancel()
+            raise
+        except Exception as error:
+            logger.exception("Unable to send internal events", events=len(events))
+            # Raised in the handlers which added the events, so their events are redelivered
+            flushed.set_exception(error)
+            # Retrieved here in case every handler was cancelled
+            flushed.exception()
+        else:
+            flushed.set_result(None)
+
+    async def close(self) -> None:
+        """Send the pending events right away and wait for the events being sent"""
+        if self.waiting is not None:
+            self.waiting.cancel()
+            self.waiting = None
+        await asyncio.gather(*self.sending, return_exceptions=True)
+        await self._send()
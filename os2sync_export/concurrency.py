@@ -0,0 +1,128 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+import statistics
+import time
+from typing import Awaitable
+from typing import Callable
+from typing import TypeVar
+
+import httpx
+import structlog
+from gql.transport.exceptions import TransportServerError
+from prometheus_client import Counter
+from prometheus_client import Gauge
+
+logger = structlog.stdlib.get_logger()
+
+T = TypeVar("T")
+
+concurrency_limit = Gauge(
+    "os2sync_export_concurrency_limit",
+    "Current limit of concurrent calls",
+    ["name"],
+)
+concurrency_changes = Counter(
+    "os2sync_export_concurrency_changes",
+    "Changes of the limit of concurrent calls",
+    ["name", "direction"],
+)
+
+# Windows of latencies are at least this long to give a meaningful p95
+MIN_WINDOW = 10
+
+
+def is_overloaded(error: BaseException) -> bool:
+    """Whether an error means that MO is overloaded and the call can be retried"""
+    if isinstance(error, httpx.HTTPStatusError):
+        code: int | None = error.response.status_code
+    elif isinstance(error, TransportServerError):
+        code = error.code
+    else:
+        return isinstance(error, httpx.TimeoutException)
+    return code is not None and (code == 429 or code >= 500)
+
+
+class AdaptiveConcurrency:
+    """Limits concurrent calls with an AIMD controller.
+
+    The limit is increased by one after each window of calls where the p95 latency stays
+    within `tolerance` times the lowest p95 seen. It is halved if a window has a higher p95
+    or if a call fails because MO is overloaded, in which case the call is retried.
+    Calls started before the last change of the limit are not considered.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        maximum: int,
+        tolerance: float = 1.5,
+        retries: int = 3,
+        backoff: float = 1.0,
+    ) -> None:
+        self.name = name
+        self.maximum = max(1, maximum)
+        self.limit = max(1, min(initial, self.maximum))
+        self.tolerance = tolerance
+        self.retries = retries
+        self.backoff = backoff
+        self.in_flight = 0
+        self.generation = 0
+        self.latencies: list[float] = []
+        self.baseline: float | None = None
+        self.condition = asyncio.Condition()
+        concurrency_limit.labels(name).set(self.limit)
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(lambda: self.in_flight < self.limit)
+                self.in_flight += 1
+                generation = self.generation
+            start = time.monotonic()
+            overloaded = False
+            try:
+                return await call()
+            except Exception as error:
+                overloaded = is_overloaded(error)
+                if not overloaded or attempt >= self.retries:
+                    raise
+                logger.warning("MO is overloaded, retrying", error=str(error))
+            finally:
+                async with self.condition:
+                    self.in_flight -= 1
+                    self._observe(generation, time.monotonic() - start, overloaded)
+                    # Each waiter woken takes a free slot, or goes back to waiting
+                    self.condition.notify(max(0, self.limit - self.in_flight))
+            attempt += 1
+            await asyncio.sleep(self.backoff * attempt)
+
+    def _observe(self, generation: int, latency: float, overloaded: bool) -> None:
+        if generation != self.generation:
+            return
+        if overloaded:
+            self._change(self.limit // 2, "decrease")
+            return
+        self.latencies.append(latency)
+        if len(self.latencies) < max(self.limit, MIN_WINDOW):
+            return
+        p95 = statistics.quantiles(self.latencies, n=20)[-1]
+        self.baseline = p95 if self.baseline is None else min(self.baseline, p95)
+        if p95 > self.baseline * self.tolerance:
+            self._change(self.limit // 2, "decrease")
+        else:
+            self._change(self.limit + 1, "increase")
+
+    def _change(self, limit: int, direction: str) -> None:
+        limit = max(1, min(limit, self.maximum))
+        self.generation += 1
+        self.latencies = []
+        if limit == self.limit:
+            return
+        logger.info(f"Concurrency of {self.name} changed from {self.limit} to {limit}")
+        self.limit = limit
+        concurrency_limit.labels(self.name).set(limit)
+        concurrency_changes.labels(self.name, direction).inc()
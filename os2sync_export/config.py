@@ -50,6 +50,32 @@ class Settings(BaseSettings):  # type: ignore
     autowash: bool = False
     ca_verify_os2sync: bool = True
     ca_verify_os2mo: bool = True
+    # Connection pool of the session used for requests to MOs service API
+    mo_max_connections: int = 20
+    mo_max_keepalive_connections: int = 20
+    mo_keepalive_expiry: float = 30.0
+    # Store fingerprints of payloads written to fk-org in the database (FASTRAMQPI__DATABASE__*)
+    # and skip writing payloads that are unchanged since the last write.
+    fingerprint_store: bool = False
+    # Seconds to cache whether an org_unit is relevant when handling events. 0 disables the cache.
+    # The cache is cleared by every org_unit event. Full syncs cache it for the duration of the sync.
+    relevance_cache_ttl: float = 0
+    # Keep an index of the org_unit tree in memory, read at startup and patched by org_unit and it-user events,
+    # and answer whether org_units are relevant from it instead of querying MO.
+    org_tree_index: bool = False
+    # Keep a map of org_units to their fk-org uuid from uuid_from_it_systems in memory, read at startup and
+    # patched by it-user events, instead of reading the it-accounts of each org_unit from MO.
+    fk_org_uuid_map: bool = False
+    # Number of responses from MO kept during a full sync or an event, so the same url is only fetched once.
+    # 0 disables the cache.
+    mo_response_cache_size: int = 0
+    # Seconds to wait before sending an internal person/org_unit event, dropping duplicate events in the meantime.
+    # The handler causing the events waits until they are sent, so only events handled concurrently, see
+    # event_parallelism, are coalesced. 0 sends the events right away.
+    event_coalesce_window: float = 0
+    # Number of events of each kind handled concurrently. Events with the same subject are still
+    # handled one at a time and in order.
+    event_parallelism: int = 1
 
     phone_scope_classes: list[UUID] = []
     landline_scope_classes: list[UUID] = []
@@ -67,6 +93,20 @@ class Settings(BaseSettings):  # type: ignore
 
     truncate_length: int = 200
 
+    # Maximum number of concurrent requests to OS2Sync during a full sync
+    os2sync_concurrency: int = 10
+    # Attempts of each write of users and deletions to OS2Sync during a full sync
+    # before it is given up and reported at the end of the run.
+    os2sync_write_attempts: int = 3
+    # Number of users read from MO concurrently during a full sync.
+    # If adaptive, this is the initial concurrency which grows up to the maximum while MOs latency stays flat,
+    # and backs off when MO responds with 429/5xx or the latency rises.
+    mo_read_concurrency: int = 5
+    mo_read_adaptive_concurrency: bool = False
+    mo_read_max_concurrency: int = 50
+    # Number of objects in each page when paginating through every object in MO
+    mo_page_size: int = 1_000
+
     user_key_it_system_names: list[str] = ["Active Directory"]
 
     filter_hierarchy_names: list[str] = []  # Title in MO
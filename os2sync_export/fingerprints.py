@@ -0,0 +1,75 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+import hashlib
+import json
+from typing import Any
+from uuid import UUID
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import String
+from sqlalchemy import delete
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import mapped_column
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Fingerprint(Base):
+    """Fingerprint of the last payload written to fk-org for an fk-org uuid"""
+
+    __tablename__ = "payload_fingerprint"
+
+    uuid: Mapped[UUID] = mapped_column(primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64))
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, list):
+        # Lists are sorted as sets such as Tasks and ItSystems have no stable order
+        return sorted(
+            (_canonical(v) for v in value), key=lambda v: json.dumps(v, sort_keys=True)
+        )
+    return value
+
+
+def fingerprint(payload: Any) -> str:
+    """Hash a payload so that equal payloads get the same fingerprint regardless of ordering"""
+    canonical = json.dumps(
+        _canonical(jsonable_encoder(payload)), sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class FingerprintStore:
+    """Fingerprints of payloads written to fk-org, stored in the database"""
+
+    def __init__(self, sessionmaker: async_sessionmaker) -> None:
+        self.sessionmaker = sessionmaker
+
+    async def get(self, uuid: UUID) -> str | None:
+        async with self.sessionmaker() as session:
+            return await session.scalar(
+                select(Fingerprint.fingerprint).where(Fingerprint.uuid == uuid)
+            )
+
+    async def set(self, uuid: UUID, fingerprint: str) -> None:
+        statement = insert(Fingerprint).values(uuid=uuid, fingerprint=fingerprint)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Fingerprint.uuid],
+            set_={"fingerprint": statement.excluded.fingerprint},
+        )
+        async with self.sessionmaker() as session, session.begin():
+            await session.execute(statement)
+
+    async def delete(self, uuid: UUID) -> None:
+        async with self.sessionmaker() as session, session.begin():
+            await session.execute(delete(Fingerprint).where(Fingerprint.uuid == uuid))
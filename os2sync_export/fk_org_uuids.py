@@ -0,0 +1,142 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+"""Process-wide map of org_units to the fk-org uuid from their it-accounts.
+
+With `uuid_from_it_systems` the uuid of an org_unit in fk-org is the user_key of its
+it-account in the first of the it-systems that it has an account in. The map is read once
+with cursor pagination and then patched by it-user events, so positions and org_units are
+mapped without asking MO for the it-accounts of each org_unit.
+
+Enable it with the `fk_org_uuid_map` setting.
+"""
+
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from uuid import UUID
+
+import structlog
+from prometheus_client import Gauge
+
+from os2sync_export.autogenerated_graphql_client import GraphQLClient
+from os2sync_export.autogenerated_graphql_client.read_org_unit_fk_org_it_users import (
+    ReadOrgUnitFkOrgItUsersOrgUnitsObjects,
+)
+from os2sync_export.pipeline import iter_pages
+
+logger = structlog.stdlib.get_logger()
+
+fk_org_uuid_map_units = Gauge(
+    "os2sync_export_fk_org_uuid_map_units",
+    "Number of org_units with an fk-org uuid from an it-account",
+)
+
+
+class FkOrgUuidMap:
+    """Map of org_unit uuid to the fk-org uuid from its it-accounts.
+
+    Only org_units with an it-account in one of the it-systems are in the map. Org_units with
+    several it-accounts in the first of their it-systems are left out as ambiguous, since the
+    account picked by `get_fk_org_uuid` depends on the order MO returns them in. The map is
+    not used until it is built. Org_units refreshed while it is being built are kept, as
+    they are at least as new as the pages being read.
+    """
+
+    def __init__(self, uuid_from_it_systems: List[str]) -> None:
+        self.uuid_from_it_systems = uuid_from_it_systems
+        self.uuids: Dict[UUID, str] = {}
+        self.ambiguous: Set[UUID] = set()
+        self.ready = False
+        self._refreshed: Set[UUID] = set()
+
+    def _set(self, obj: ReadOrgUnitFkOrgItUsersOrgUnitsObjects) -> None:
+        itusers = [
+            it
+            for it in (obj.current.itusers if obj.current else [])
+            if it.itsystem.name in self.uuid_from_it_systems
+        ]
+        self.uuids.pop(obj.uuid, None)
+        self.ambiguous.discard(obj.uuid)
+        if not itusers:
+            return
+        # Use the it-system first in the list, like `get_fk_org_uuid`
+        first = min(self.uuid_from_it_systems.index(it.itsystem.name) for it in itusers)
+        candidates = {
+            it.user_key
+            for it in itusers
+            if self.uuid_from_it_systems.index(it.itsystem.name) == first
+        }
+        if len(candidates) > 1:
+            self.ambiguous.add(obj.uuid)
+            return
+        self.uuids[obj.uuid] = candidates.pop()
+
+    async def build(self, graphql_client: GraphQLClient, limit: int = 1_000) -> None:
+        async for res in iter_pages(
+            lambda cursor: graphql_client.read_org_unit_fk_org_it_users(
+                limit=limit, cursor=cursor
+            )
+        ):
+            for obj in res.objects:
+                if obj.uuid not in self._refreshed:
+                    self._set(obj)
+        self.ready = True
+        self._refreshed.clear()
+        fk_org_uuid_map_units.set(len(self.uuids))
+        logger.info("Map of fk-org uuids of org_units built", org_units=len(self.uuids))
+
+    async def refresh(
+        self, graphql_client: GraphQLClient, uuids: Iterable[UUID | str]
+    ) -> None:
+        """Read the it-accounts of the given org_units from MO again"""
+        unit_uuids = {UUID(str(uuid)) for uuid in uuids}
+        if not unit_uuids:
+            return
+        res = await graphql_client.read_org_unit_fk_org_it_users(uuids=list(unit_uuids))
+        found = {obj.uuid: obj for obj in res.objects}
+        for uuid in unit_uuids:
+            if uuid in found:
+                self._set(found[uuid])
+            else:
+                self.uuids.pop(uuid, None)
+                self.ambiguous.discard(uuid)
+        if not self.ready:
+            self._refreshed.update(unit_uuids)
+        fk_org_uuid_map_units.set(len(self.uuids))
+
+    def get(self, unit_uuid: UUID | str) -> Optional[str]:
+        """The fk-org uuid of an org_unit, which is its own uuid if it has no it-account.
+
+        Returns None if the org_unit is ambiguous and must be looked up in MO.
+        """
+        uuid = UUID(str(unit_uuid))
+        if uuid in self.ambiguous:
+            return None
+        return self.uuids.get(uuid, str(unit_uuid))
+
+
+# The map of the running application, if enabled
+_fk_org_uuid_map: Optional[FkOrgUuidMap] = None
+
+
+def get_fk_org_uuid_map() -> Optional[FkOrgUuidMap]:
+    """Return the map of fk-org uuids of org_units if it is enabled and built"""
+    if _fk_org_uuid_map is not None and _fk_org_uuid_map.ready:
+        return _fk_org_uuid_map
+    return None
+
+
+def set_fk_org_uuid_map(fk_org_uuid_map: Optional[FkOrgUuidMap]) -> None:
+    global _fk_org_uuid_map
+    _fk_org_uuid_map = fk_org_uuid_map
+
+
+async def refresh_fk_org_uuid_map(
+    graphql_client: GraphQLClient, uuids: Iterable[UUID | str]
+) -> None:
+    """Patch the map, if enabled, with the current it-accounts of the given org_units"""
+    if _fk_org_uuid_map is not None:
+        await _fk_org_uuid_map.refresh(graphql_client, uuids)
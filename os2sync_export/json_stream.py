@@ -0,0 +1,150 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+"""Incremental parsing of large JSON documents.
+
+Only the values that are yielded are kept in memory, which allows iterating the
+items of arrays in responses too large to be parsed at once.
+"""
+
+import codecs
+import json
+from typing import Any
+from typing import AsyncIterator
+from typing import Sequence
+from typing import Tuple
+
+_WHITESPACE = " \t\n\r"
+# Characters that can follow a complete value
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+
+class _Reader:
+    """Buffers decoded text from a stream of bytes and parses it piece by piece."""
+
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self.chunks = chunks
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.decoder_json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+
+    async def _fill(self) -> bool:
+        """Read the next chunk into the buffer. Returns False if the stream is exhausted."""
+        if self.exhausted:
+            return False
+        try:
+            chunk = await self.chunks.__anext__()
+        except StopAsyncIteration:
+            self.exhausted = True
+            self.buffer = self.buffer[self.pos :] + self.decoder.decode(b"", final=True)
+        else:
+            self.buffer = self.buffer[self.pos :] + self.decoder.decode(chunk)
+        self.pos = 0
+        return True
+
+    async def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not await self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    async def next(self) -> str:
+        """Consume and return the next non-whitespace character."""
+        char = await self.peek()
+        self.pos += 1
+        return char
+
+    async def expect(self, expected: str) -> None:
+        char = await self.next()
+        if char != expected:
+            raise ValueError(f"Expected {expected!r} but found {char!r}")
+
+    async def value(self) -> Any:
+        """Consume and return the next JSON value."""
+        await self.peek()
+        while True:
+            try:
+                value, end = self.decoder_json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not await self._fill():
+                    raise
+                continue
+            # A number cut off by the end of the buffer continues in the next chunk
+            if end == len(self.buffer) or self.buffer[end] not in _DELIMITERS:
+                if await self._fill():
+                    continue
+            self.pos = end
+            return value
+
+
+async def _next_member(reader: _Reader, closing: str) -> bool:
+    """Consume the separator after a member. Returns False at the end of the container."""
+    char = await reader.next()
+    if char == ",":
+        return True
+    if char == closing:
+        return False
+    raise ValueError(f"Expected ',' or {closing!r} but found {char!r}")
+
+
+async def _object_keys(reader: _Reader) -> AsyncIterator[str]:
+    """Yield the keys of an object. The caller must consume each value before continuing."""
+    await reader.expect("{")
+    if await reader.peek() == "}":
+        await reader.next()
+        return
+    while True:
+        key = await reader.value()
+        await reader.expect(":")
+        yield key
+        if not await _next_member(reader, "}"):
+            return
+
+
+async def _array_items(reader: _Reader) -> AsyncIterator[Any]:
+    await reader.expect("[")
+    if await reader.peek() == "]":
+        await reader.next()
+        return
+    while True:
+        yield await reader.value()
+        if not await _next_member(reader, "]"):
+            return
+
+
+async def iter_arrays(
+    chunks: AsyncIterator[bytes], path: Sequence[str]
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Yield (key, item) for each item of the arrays in the object found at path.
+
+    Values in the object which are not arrays, and everything outside of it, are skipped.
+    Raises LookupError if there is no object at path.
+    """
+    reader = _Reader(chunks)
+
+    async def walk(depth: int) -> AsyncIterator[Tuple[str, Any]]:
+        if await reader.peek() != "{":
+            await reader.value()
+            raise LookupError(f"No object found at {list(path[:depth])}")
+        found = False
+        async for key in _object_keys(reader):
+            if depth == len(path) and await reader.peek() == "[":
+                async for item in _array_items(reader):
+                    yield key, item
+            elif depth < len(path) and key == path[depth]:
+                found = True
+                async for item in walk(depth + 1):
+                    yield item
+            else:
+                await reader.value()
+        if depth < len(path) and not found:
+            raise LookupError(f"No object found at {list(path[: depth + 1])}")
+
+    async for item in walk(0):
+        yield item
@@ -1,9 +1,19 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from contextlib import suppress
+from functools import partial
 from typing import Annotated
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
 from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
 from uuid import UUID
 
 import structlog
@@ -11,6 +21,7 @@ from fastapi import APIRouter
 from fastapi import Depends
 from fastapi import FastAPI
 from fastapi import HTTPException
+from fastramqpi.context import Context
 from fastramqpi.depends import LegacyGraphQLSession
 from fastramqpi.depends import from_user_context
 from fastramqpi.events import Event
@@ -18,22 +29,41 @@ from fastramqpi.events import GraphQLEvents
 from fastramqpi.events import Listener
 from fastramqpi.events import Namespace
 from fastramqpi.main import FastRAMQPI  # type: ignore
+from fastramqpi.ramqp.depends import handle_exclusively_decorator
+from prometheus_client import Counter
+from tenacity import AsyncRetrying
+from tenacity import wait_exponential
 
 from os2sync_export.__main__ import cleanup_duplicate_engagements
 from os2sync_export.__main__ import cleanup_duplicates
 from os2sync_export.__main__ import main
+from os2sync_export.__main__ import main_new
 from os2sync_export.autogenerated_graphql_client import GraphQLClient as GraphQLClient_
+from os2sync_export.coalescing import EventCoalescer
+from os2sync_export.coalescing import send_events
 from os2sync_export.config import Settings
 from os2sync_export.depends import GraphQLClient
+from os2sync_export.fingerprints import Base
+from os2sync_export.fingerprints import FingerprintStore
+from os2sync_export.fk_org_uuids import FkOrgUuidMap
+from os2sync_export.fk_org_uuids import refresh_fk_org_uuid_map
+from os2sync_export.fk_org_uuids import set_fk_org_uuid_map
+from os2sync_export.org_tree import OrgTree
+from os2sync_export.org_tree import refresh_org_tree
+from os2sync_export.org_tree import set_org_tree
 from os2sync_export.os2mo import check_terminated_accounts
+from os2sync_export.os2mo import close_mo_session
 from os2sync_export.os2mo import find_employees
 from os2sync_export.os2mo import get_engagement_employee_uuid
 from os2sync_export.os2mo import get_ituser_org_unit_and_employee_uuids
 from os2sync_export.os2mo import get_kle_org_unit_uuid
 from os2sync_export.os2mo import get_manager_org_unit_uuid
+from os2sync_export.os2mo import get_relevance_cache
 from os2sync_export.os2mo import get_sts_orgunit
 from os2sync_export.os2mo import get_sts_user
 from os2sync_export.os2mo import is_relevant
+from os2sync_export.os2mo import mo_response_cache_scope
+from os2sync_export.os2mo import relevance_cache_scope
 from os2sync_export.os2mo_gql import find_object_person
 from os2sync_export.os2mo_gql import find_object_unit
 from os2sync_export.os2mo_gql import sync_mo_user_to_fk_org
@@ -50,18 +80,105 @@ fastapi_router = APIRouter()
 
 Settings_ = Annotated[Settings, Depends(from_user_context("settings"))]
 OS2SyncClient_ = Annotated[OS2SyncClient, Depends(from_user_context("os2sync_client"))]
+Fingerprints_ = Annotated[
+    FingerprintStore | None, Depends(from_user_context("fingerprints"))
+]
+
+
+# Coalesces internal events while the application is running, if enabled
+_event_coalescer: EventCoalescer | None = None
+
+
+async def add_events(
+    graphql_client: GraphQLClient, routing_key: str, uuids: Iterable[UUID]
+) -> None:
+    events = [(routing_key, str(uuid)) for uuid in uuids]
+    if _event_coalescer is None:
+        await send_events(graphql_client, events)
+    else:
+        await _event_coalescer.add(graphql_client, events)
+
+
+async def add_person_events(
+    graphql_client: GraphQLClient, uuids: Iterable[UUID]
+) -> None:
+    await add_events(graphql_client, "person", uuids)
+
+
+async def add_org_unit_events(
+    graphql_client: GraphQLClient, uuids: Iterable[UUID]
+) -> None:
+    await add_events(graphql_client, "org_unit", uuids)
 
 
 async def add_person_event(graphql_client: GraphQLClient, uuid: UUID) -> None:
-    await graphql_client.event_send(
-        namespace="os2sync_export", routing_key="person", subject=str(uuid)
-    )
+    await add_person_events(graphql_client, [uuid])
 
 
 async def add_org_unit_event(graphql_client: GraphQLClient, uuid: UUID) -> None:
-    await graphql_client.event_send(
-        namespace="os2sync_export", routing_key="org_unit", subject=str(uuid)
+    await add_org_unit_events(graphql_client, [uuid])
+
+
+org_unit_fan_outs = Counter(
+    "os2sync_export_org_unit_fan_outs",
+    "Synced org_units, by whether their employees were synced as well",
+    ["result"],
+)
+
+# The fields of each org_unit which the positions of its employees depend on, as of the
+# last time the employees were synced. The least recently synced org_units are forgotten,
+# which only means their employees are synced on the next event.
+PositionFields = Optional[Tuple[UUID, Optional[UUID], Optional[str]]]
+MAX_ORG_UNIT_POSITION_FIELDS = 100_000
+_org_unit_position_fields: OrderedDict[UUID, PositionFields] = OrderedDict()
+
+
+def position_fields(org_unit: OrgUnit | None) -> PositionFields:
+    """The fk-org uuid, parent and name of an org_unit, or None if it is not relevant"""
+    if org_unit is None:
+        return None
+    return (org_unit.Uuid, org_unit.ParentOrgUnitUuid, org_unit.Name)
+
+
+async def sync_org_unit_employees(
+    settings: Settings,
+    graphql_session: LegacyGraphQLSession,
+    graphql_client: GraphQLClient,
+    uuid: UUID,
+    org_unit: OrgUnit | None,
+) -> None:
+    """Sync the employees of an org_unit if the change of the org_unit can affect them.
+
+    The employees are always synced the first time an org_unit is seen, and when their work
+    address is read from the addresses of the org_unit.
+    """
+    fields = position_fields(org_unit)
+    addresses_in_positions = (
+        bool(settings.employee_engagement_address) and not settings.new
     )
+    if (
+        not addresses_in_positions
+        and uuid in _org_unit_position_fields
+        and _org_unit_position_fields[uuid] == fields
+    ):
+        logger.info(f"No changes to positions in org_unit {uuid=}, skipping employees")
+        _org_unit_position_fields.move_to_end(uuid)
+        org_unit_fan_outs.labels("skipped").inc()
+        return
+
+    logger.info(f"Synced org_unit to fk-org: {uuid=}, now checking engagements")
+    employees = await find_employees(graphql_session, uuid)
+    await add_person_events(graphql_client, employees)
+    # Only remembered once the employees are queued, so a failure is retried on redelivery
+    _org_unit_position_fields[uuid] = fields
+    _org_unit_position_fields.move_to_end(uuid)
+    while len(_org_unit_position_fields) > MAX_ORG_UNIT_POSITION_FIELDS:
+        _org_unit_position_fields.popitem(last=False)
+    org_unit_fan_outs.labels("fanned_out").inc()
+
+
+def event_subject(event_uuid: Event[UUID], *args, **kwargs) -> UUID:
+    return event_uuid.subject
 
 
 @fastapi_router.get("/")
@@ -73,15 +190,33 @@ async def index() -> Dict[str, str]:
 async def trigger_all(
     settings: Settings_,
     graphql_session: LegacyGraphQLSession,
+    graphql_client: GraphQLClient,
     os2sync_client: OS2SyncClient_,
+    force: bool = False,
 ) -> None:
+    """Full sync of MO to fk-org.
+
+    Set force to write payloads even if they are unchanged since the last write.
+    The legacy integration always writes every changed payload.
+    """
     if settings.new:
-        raise NotImplementedError
-    await main(
-        settings=settings,
-        graphql_session=graphql_session,
-        os2sync_client=os2sync_client,
-    )
+        await main_new(
+            settings=settings,
+            graphql_client=graphql_client,
+            os2sync_client=os2sync_client,
+            force=force,
+        )
+        return
+    with (
+        relevance_cache_scope(),
+        mo_response_cache_scope(settings.mo_response_cache_size),
+    ):
+        await main(
+            settings=settings,
+            graphql_session=graphql_session,
+            graphql_client=graphql_client,
+            os2sync_client=os2sync_client,
+        )
 
 
 @fastapi_router.post("/cleanup_duplicate_engagements", status_code=202)
@@ -92,11 +227,12 @@ async def trigger_cleanup_duplicate_engagements(
 ) -> None:
     if settings.new:
         raise NotImplementedError
-    await cleanup_duplicate_engagements(
-        settings=settings,
-        graphql_session=graphql_session,
-        os2sync_client=os2sync_client,
-    )
+    with mo_response_cache_scope(settings.mo_response_cache_size):
+        await cleanup_duplicate_engagements(
+            settings=settings,
+            graphql_session=graphql_session,
+            os2sync_client=os2sync_client,
+        )
 
 
 @fastapi_router.post("/cleanup_full_passivate_and_reimport", status_code=202)
@@ -115,15 +251,21 @@ async def trigger_cleanup_duplicates(
     if settings.new:
         raise NotImplementedError
     else:
-        await cleanup_duplicates(
-            settings=settings,
-            graphql_session=graphql_session,
-            os2sync_client=os2sync_client,
-        )
+        with (
+            relevance_cache_scope(),
+            mo_response_cache_scope(settings.mo_response_cache_size),
+        ):
+            await cleanup_duplicates(
+                settings=settings,
+                graphql_session=graphql_session,
+                graphql_client=graphql_client,
+                os2sync_client=os2sync_client,
+            )
     return {"triggered": "OK"}
 
 
 @fastapi_router.post("/sync/person")
+@handle_exclusively_decorator(key=event_subject)
 async def sync_person(
     event_uuid: Event[UUID],
     settings: Settings_,
@@ -155,6 +297,7 @@ async def sync_person(
 
 
 @fastapi_router.post("/sync/org_unit")
+@handle_exclusively_decorator(key=event_subject)
 async def sync_org_unit(
     event_uuid: Event[UUID],
     settings: Settings_,
@@ -163,8 +306,9 @@ async def sync_org_unit(
     os2sync_client: OS2SyncClient_,
 ) -> None:
     uuid = event_uuid.subject
+    sts_org_unit: OrgUnit | None
     if settings.new:
-        await sync_orgunit(
+        sts_org_unit = await sync_orgunit(
             settings=settings,
             graphql_client=graphql_client,
             os2sync_client=os2sync_client,
@@ -185,14 +329,18 @@ async def sync_org_unit(
         else:
             await os2sync_client.upsert_org_unit(sts_org_unit)
 
-    logger.info(f"Synced org_unit to fk-org: {uuid=}, now checking engagements")
-    employees = await find_employees(graphql_session, uuid)
-    for e in employees:
-        await add_person_event(graphql_client, e)
+    await sync_org_unit_employees(
+        settings=settings,
+        graphql_session=graphql_session,
+        graphql_client=graphql_client,
+        uuid=uuid,
+        org_unit=sts_org_unit,
+    )
 
 
 # Events for persons and orgunits in MO can be directly transferred to the internal queue
 @fastapi_router.post("/event/person")
+@handle_exclusively_decorator(key=event_subject)
 async def amqp_trigger_person(
     event_uuid: Event[UUID],
     graphql_client: GraphQLClient,
@@ -201,14 +349,19 @@ async def amqp_trigger_person(
 
 
 @fastapi_router.post("/event/org_unit")
+@handle_exclusively_decorator(key=event_subject)
 async def amqp_trigger_org_unit(
     event_uuid: Event[UUID],
     graphql_client: GraphQLClient,
 ) -> None:
+    # The org_unit may have moved in or out of the relevant part of the tree, taking its descendants with it
+    get_relevance_cache().clear()
+    await refresh_org_tree(graphql_client, [event_uuid.subject])
     await add_org_unit_event(graphql_client, event_uuid.subject)
 
 
 @fastapi_router.post("/event/address")
+@handle_exclusively_decorator(key=event_subject)
 async def amqp_trigger_address(
     event_uuid: Event[UUID],
     settings: Settings_,
@@ -226,14 +379,13 @@ async def amqp_trigger_address(
         "Address event", subject=event_uuid, employees=employees, org_units=org_units
     )
 
-    for e in employees:
-        await add_person_event(graphql_client, e)
+    await add_person_events(graphql_client, employees)
 
-    for o in org_units:
-        await add_org_unit_event(graphql_client, o)
+    await add_org_unit_events(graphql_client, org_units)
 
 
 @fastapi_router.post("/event/ituser")
+@handle_exclusively_decorator(key=event_subject)
 async def amqp_trigger_it_user(
     event_uuid: Event[UUID],
     settings: Settings_,
@@ -249,14 +401,17 @@ async def amqp_trigger_it_user(
         with suppress(ValueError):
             org_units = find_object_unit(res)
 
-        for o in org_units:
-            await add_org_unit_event(graphql_client, o)
+        # It-accounts can make an org_unit relevant and change its fk-org uuid
+        for org_unit in org_units:
+            get_relevance_cache().invalidate(org_unit)
+        await refresh_org_tree(graphql_client, org_units)
+        await refresh_fk_org_uuid_map(graphql_client, org_units)
+        await add_org_unit_events(graphql_client, org_units)
 
         employees = set()
         with suppress(ValueError):
             employees = find_object_person(res)
-        for e in employees:
-            await add_person_event(graphql_client, e)
+        await add_person_events(graphql_client, employees)
         return
     try:
         ou_uuid, e_uuid = await get_ituser_org_unit_and_employee_uuids(
@@ -284,6 +439,11 @@ async def amqp_trigger_it_user(
             )
             await os2sync_client.delete_user(terminate_uuid)
 
+    if ou_uuid:
+        # It-accounts can make an org_unit relevant and change its fk-org uuid
+        get_relevance_cache().invalidate(ou_uuid)
+        await refresh_org_tree(graphql_client, [ou_uuid])
+        await refresh_fk_org_uuid_map(graphql_client, [ou_uuid])
     if ou_uuid and await is_relevant(graphql_session, ou_uuid, settings):
         try:
             sts_org_unit = await get_sts_orgunit(
@@ -321,6 +481,7 @@ async def amqp_trigger_it_user(
 
 
 @fastapi_router.post("/event/manager")
+@handle_exclusively_decorator(key=event_subject)
 async def amqp_trigger_manager(
     event_uuid: Event[UUID],
     settings: Settings_,
@@ -332,8 +493,7 @@ async def amqp_trigger_manager(
     if settings.new:
         res = await graphql_client.find_manager_unit(uuid=uuid)
         org_units = find_object_unit(res)
-        for o in org_units:
-            await add_org_unit_event(graphql_client, o)
+        await add_org_unit_events(graphql_client, org_units)
         return
     try:
         ou_uuid = await get_manager_org_unit_uuid(graphql_session, uuid)
@@ -357,6 +517,7 @@ async def amqp_trigger_manager(
 
 
 @fastapi_router.post("/event/engagement")
+@handle_exclusively_decorator(key=event_subject)
 async def amqp_trigger_engagement(
     event_uuid: Event[UUID],
     settings: Settings_,
@@ -373,8 +534,7 @@ async def amqp_trigger_engagement(
         except ValueError:
             logger.info(f"Event registered but no engagement found {uuid=}")
             return
-        for e in employees:
-            await add_person_event(graphql_client, e)
+        await add_person_events(graphql_client, employees)
         return
     try:
         e_uuid = await get_engagement_employee_uuid(graphql_session, uuid)
@@ -393,6 +553,7 @@ async def amqp_trigger_engagement(
 
 
 @fastapi_router.post("/event/kle")
+@handle_exclusively_decorator(key=event_subject)
 async def amqp_trigger_kle(
     event_uuid: Event[UUID],
     settings: Settings_,
@@ -404,8 +565,7 @@ async def amqp_trigger_kle(
     if settings.new:
         res = await graphql_client.find_k_l_e_unit(uuid=uuid)
         org_units = find_object_unit(res)
-        for o in org_units:
-            await add_org_unit_event(graphql_client, o)
+        await add_org_unit_events(graphql_client, org_units)
         return
     try:
         ou_uuid = await get_kle_org_unit_uuid(graphql_session, uuid)
@@ -435,11 +595,13 @@ async def trigger_user(
     settings: Settings_,
     graphql_session: LegacyGraphQLSession,
     graphql_client: GraphQLClient,
+    fingerprints: Fingerprints_,
     dry_run: bool = False,
     new: bool = False,
+    force: bool = False,
 ) -> tuple[list[User], set[UUID]]:
     os2sync_client = get_os2sync_client(
-        settings=settings, session=None, dry_run=dry_run
+        settings=settings, session=None, dry_run=dry_run, fingerprints=fingerprints
     )
     try:
         if settings.new or new:
@@ -449,6 +611,7 @@ async def trigger_user(
                 os2sync_client=os2sync_client,
                 uuid=uuid,
                 dry_run=dry_run,
+                force=force,
             )
         sts_users = await get_sts_user(
             str(uuid),
@@ -458,7 +621,7 @@ async def trigger_user(
     except ValueError:
         raise HTTPException(status_code=404, detail="User not found")
 
-    await os2sync_client.update_users(uuid, sts_users)
+    await os2sync_client.update_users(uuid, sts_users, force=force)
     logger.info(f"Synced user to fk-org: {uuid}")
 
     return [User(**u) for u in sts_users if u["Positions"]], set(
@@ -474,11 +637,13 @@ async def trigger_orgunit(
     settings: Settings_,
     graphql_client: GraphQLClient,
     graphql_session: LegacyGraphQLSession,
+    fingerprints: Fingerprints_,
     dry_run: bool = False,
     new: bool = False,
+    force: bool = False,
 ) -> OrgUnit | None:
     os2sync_client = get_os2sync_client(
-        settings=settings, session=None, dry_run=dry_run
+        settings=settings, session=None, dry_run=dry_run, fingerprints=fingerprints
     )
 
     try:
@@ -488,6 +653,7 @@ async def trigger_orgunit(
                 graphql_client=graphql_client,
                 os2sync_client=os2sync_client,
                 uuid=uuid,
+                force=force,
             )
 
         sts_org_unit = await get_sts_orgunit(
@@ -496,11 +662,89 @@ async def trigger_orgunit(
     except ValueError:
         raise HTTPException(status_code=404, detail="OrgUnit not found")
 
-    await os2sync_client.update_org_unit(uuid, sts_org_unit)
+    await os2sync_client.update_org_unit(uuid, sts_org_unit, force=force)
     logger.info(f"Synced org_unit to fk-org: {uuid}")
     return sts_org_unit
 
 
+@asynccontextmanager
+async def mo_session_lifespan() -> AsyncIterator[None]:
+    yield
+    await close_mo_session()
+
+
+@asynccontextmanager
+async def event_coalescer_lifespan(window: float) -> AsyncIterator[None]:
+    global _event_coalescer
+    if window <= 0:
+        yield
+        return
+    _event_coalescer = EventCoalescer(window)
+    try:
+        yield
+    finally:
+        coalescer, _event_coalescer = _event_coalescer, None
+        await coalescer.close()
+
+
+async def build_in_background(name: str, build: Callable[[], Awaitable[None]]) -> None:
+    async for attempt in AsyncRetrying(wait=wait_exponential(min=1, max=300)):
+        with attempt:
+            try:
+                await build()
+            except Exception:
+                logger.exception(f"Unable to build the {name}, retrying")
+                raise
+
+
+@asynccontextmanager
+async def org_tree_lifespan(
+    context: Context, settings: Settings
+) -> AsyncIterator[None]:
+    if not settings.org_tree_index:
+        yield
+        return
+    org_tree = OrgTree()
+    set_org_tree(org_tree)
+    # Built in the background. Relevance is queried from MO until it is done.
+    task = asyncio.create_task(
+        build_in_background(
+            "org_unit tree index",
+            partial(org_tree.build, context["graphql_client"], settings.mo_page_size),
+        )
+    )
+    try:
+        yield
+    finally:
+        task.cancel()
+        set_org_tree(None)
+
+
+@asynccontextmanager
+async def fk_org_uuid_map_lifespan(
+    context: Context, settings: Settings
+) -> AsyncIterator[None]:
+    if not (settings.fk_org_uuid_map and settings.uuid_from_it_systems):
+        yield
+        return
+    fk_org_uuid_map = FkOrgUuidMap(settings.uuid_from_it_systems)
+    set_fk_org_uuid_map(fk_org_uuid_map)
+    # Built in the background. The it-accounts are read from MO until it is done.
+    task = asyncio.create_task(
+        build_in_background(
+            "map of fk-org uuids of org_units",
+            partial(
+                fk_org_uuid_map.build, context["graphql_client"], settings.mo_page_size
+            ),
+        )
+    )
+    try:
+        yield
+    finally:
+        task.cancel()
+        set_fk_org_uuid_map(None)
+
+
 def create_fastramqpi(**kwargs) -> FastRAMQPI:
     settings: Settings = Settings(**kwargs)
     mo_listners = [
@@ -509,6 +753,7 @@ def create_fastramqpi(**kwargs) -> FastRAMQPI:
             user_key=f"os2sync_export_{object_type}",
             routing_key=f"{object_type}",
             path=f"/event/{object_type}",
+            parallelism=settings.event_parallelism,
         )
         for object_type in (
             "address",
@@ -526,12 +771,14 @@ def create_fastramqpi(**kwargs) -> FastRAMQPI:
             user_key="os2sync_export_person",
             routing_key="person",
             path="/sync/person",
+            parallelism=settings.event_parallelism,
         ),
         Listener(
             namespace="os2sync_export",
             user_key="os2sync_export_org_unit",
             routing_key="org_unit",
             path="/sync/org_unit",
+            parallelism=settings.event_parallelism,
         ),
     ]
     fastramqpi = FastRAMQPI(
@@ -539,6 +786,7 @@ def create_fastramqpi(**kwargs) -> FastRAMQPI:
         settings=settings.fastramqpi,
         graphql_version=25,
         graphql_client_cls=GraphQLClient_,
+        database_metadata=Base.metadata if settings.fingerprint_store else None,
         graphql_events=GraphQLEvents(
             declare_namespaces=[
                 Namespace(name="os2sync_export"),
@@ -547,9 +795,31 @@ def create_fastramqpi(**kwargs) -> FastRAMQPI:
         ),
     )
 
+    fingerprints = (
+        FingerprintStore(fastramqpi.get_context()["sessionmaker"])
+        if settings.fingerprint_store
+        else None
+    )
     fastramqpi.add_context(
         settings=settings,
-        os2sync_client=WritableOS2SyncClient(settings=settings),
+        fingerprints=fingerprints,
+        os2sync_client=WritableOS2SyncClient(
+            settings=settings, fingerprints=fingerprints
+        ),
+    )
+
+    fastramqpi.add_lifespan_manager(mo_session_lifespan())
+    # Started after the GraphQL client and stopped after the event handlers,
+    # so pending events can be sent on shutdown
+    fastramqpi.add_lifespan_manager(
+        event_coalescer_lifespan(settings.event_coalesce_window), priority=500
+    )
+    # Started after the GraphQL client they are read with
+    fastramqpi.add_lifespan_manager(
+        org_tree_lifespan(fastramqpi.get_context(), settings), priority=500
+    )
+    fastramqpi.add_lifespan_manager(
+        fk_org_uuid_map_lifespan(fastramqpi.get_context(), settings), priority=500
     )
 
     app = fastramqpi.get_app()
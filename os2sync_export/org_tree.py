@@ -0,0 +1,178 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+"""Process-wide index of the org_unit tree in MO.
+
+The index is read once with cursor pagination and then patched as org_units change, so
+relevance of an org_unit is answered by walking its ancestors in memory instead of
+querying MO.
+"""
+
+from dataclasses import dataclass
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from uuid import UUID
+
+import structlog
+from prometheus_client import Gauge
+
+from os2sync_export.autogenerated_graphql_client import GraphQLClient
+from os2sync_export.autogenerated_graphql_client.read_org_tree import (
+    ReadOrgTreeOrgUnitsObjects,
+)
+from os2sync_export.config import Settings
+from os2sync_export.pipeline import iter_pages
+
+logger = structlog.stdlib.get_logger()
+
+org_tree_units = Gauge(
+    "os2sync_export_org_tree_units", "Number of org_units in the org_unit tree index"
+)
+
+
+def unit_is_relevant(
+    settings: Settings,
+    unit_uuid: UUID,
+    ancestors: Set[UUID],
+    hierarchy: Optional[str],
+    itsystems: Iterable[str],
+) -> bool:
+    """Whether an org_unit below the given ancestors should be synced to fk-org"""
+    is_below_top_uuid: bool = settings.top_unit_uuid in ancestors
+
+    # Check if the unit or any of its ancestors are filtered.
+    if unit_uuid in settings.filter_orgunit_uuid or any(
+        uuid in ancestors for uuid in settings.filter_orgunit_uuid
+    ):
+        logger.info(f"Orgunit is filtered based on settings {unit_uuid=}")
+        return False
+
+    if settings.filter_hierarchy_names:
+        # Check that the unit is part of the correct org_unit hierarchy
+        is_in_hierarchies: bool = hierarchy in settings.filter_hierarchy_names
+        # If there are an it-account we sync it regardless of the hierarchy
+        has_it_account: bool = any(
+            name in settings.uuid_from_it_systems for name in itsystems
+        )
+
+        logger.info(
+            f"is_relevant check found that {is_below_top_uuid=}, {is_in_hierarchies=}, {has_it_account=}"
+        )
+        return is_below_top_uuid and (is_in_hierarchies or has_it_account)
+    logger.info(f"is_relevant check found that {is_below_top_uuid=}")
+    return is_below_top_uuid
+
+
+@dataclass(frozen=True)
+class OrgTreeNode:
+    parent: Optional[UUID]
+    hierarchy: Optional[str]
+    itsystems: FrozenSet[str]
+
+
+class OrgTree:
+    """Index of the current org_units in MO by uuid.
+
+    The index is not used until it is built. Org_units refreshed while it is being built
+    are kept, as they are at least as new as the pages being read.
+    """
+
+    def __init__(self) -> None:
+        self.nodes: Dict[UUID, OrgTreeNode] = {}
+        self.ready = False
+        self._refreshed: Set[UUID] = set()
+
+    def _set(self, obj: ReadOrgTreeOrgUnitsObjects) -> None:
+        if obj.current is None:
+            self.nodes.pop(obj.uuid, None)
+            return
+        current = obj.current
+        self.nodes[obj.uuid] = OrgTreeNode(
+            parent=current.parent.uuid if current.parent else None,
+            hierarchy=current.org_unit_hierarchy_model.name
+            if current.org_unit_hierarchy_model
+            else None,
+            itsystems=frozenset(it.itsystem.name for it in current.itusers),
+        )
+
+    async def build(self, graphql_client: GraphQLClient, limit: int = 1_000) -> None:
+        async for res in iter_pages(
+            lambda cursor: graphql_client.read_org_tree(limit=limit, cursor=cursor)
+        ):
+            for obj in res.objects:
+                if obj.uuid not in self._refreshed:
+                    self._set(obj)
+        self.ready = True
+        self._refreshed.clear()
+        org_tree_units.set(len(self.nodes))
+        logger.info("Org_unit tree index built", org_units=len(self.nodes))
+
+    async def refresh(
+        self, graphql_client: GraphQLClient, uuids: Iterable[UUID | str]
+    ) -> None:
+        """Read the given org_units from MO again, removing those that no longer exist"""
+        unit_uuids = {UUID(str(uuid)) for uuid in uuids}
+        if not unit_uuids:
+            return
+        res = await graphql_client.read_org_tree(uuids=list(unit_uuids))
+        found = {obj.uuid: obj for obj in res.objects}
+        for uuid in unit_uuids:
+            if uuid in found:
+                self._set(found[uuid])
+            else:
+                self.nodes.pop(uuid, None)
+        if not self.ready:
+            self._refreshed.update(unit_uuids)
+        org_tree_units.set(len(self.nodes))
+
+    def ancestors(self, uuid: UUID) -> Optional[List[UUID]]:
+        """The ancestors of an org_unit from its parent to the root, or None if unknown"""
+        node = self.nodes.get(uuid)
+        if node is None:
+            return None
+        ancestors: List[UUID] = []
+        while node.parent is not None:
+            ancestors.append(node.parent)
+            node = self.nodes.get(node.parent)
+            # An unknown parent, or a cycle while the tree is being changed
+            if node is None or len(ancestors) > len(self.nodes):
+                return None
+        return ancestors
+
+    def is_relevant(self, uuid: UUID, settings: Settings) -> Optional[bool]:
+        """Whether an org_unit should be synced to fk-org, or None if it isn't known"""
+        ancestors = self.ancestors(uuid)
+        if ancestors is None:
+            return None
+        node = self.nodes[uuid]
+        return unit_is_relevant(
+            settings, uuid, set(ancestors), node.hierarchy, node.itsystems
+        )
+
+
+# The index of the running application, if enabled
+_org_tree: Optional[OrgTree] = None
+
+
+def get_org_tree() -> Optional[OrgTree]:
+    """Return the org_unit tree index if it is enabled and built"""
+    if _org_tree is not None and _org_tree.ready:
+        return _org_tree
+    return None
+
+
+def set_org_tree(org_tree: Optional[OrgTree]) -> None:
+    global _org_tree
+    _org_tree = org_tree
+
+
+async def refresh_org_tree(
+    graphql_client: GraphQLClient, uuids: Iterable[UUID | str]
+) -> None:
+    """Patch the index, if enabled, with the current state of the given org_units"""
+    if _org_tree is not None:
+        await _org_tree.refresh(graphql_client, uuids)
@@ -1,56 +1,132 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
 import datetime
+import inspect
+import logging
+import random
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from functools import wraps
 from operator import itemgetter
 from typing import Any
+from typing import Awaitable
+from typing import Callable
 from typing import Dict
+from typing import Hashable
+from typing import Iterable
 from typing import Iterator
 from typing import List
 from typing import Optional
-from typing import Set
 from typing import Tuple
+from typing import TypeVar
+from typing import cast
 from uuid import UUID
 
 import httpx
 import structlog
-from fastramqpi.ra_utils.headers import TokenSettings
+from authlib.integrations.httpx_client import AsyncOAuth2Client  # type: ignore
+from fastapi.encoders import jsonable_encoder
 from gql import gql
 from gql.client import AsyncClientSession
+from more_itertools import chunked
 from more_itertools import first
 from more_itertools import one
 from more_itertools import only
 from more_itertools import partition
+from prometheus_client import Counter
 
+from os2sync_export import batching
+from os2sync_export.autogenerated_graphql_client import GraphQLClient
+from os2sync_export.autogenerated_graphql_client.read_org_units_bulk import (
+    ReadOrgUnitsBulkOrgUnitsObjectsCurrent,
+)
 from os2sync_export.config import Settings
 from os2sync_export.config import get_os2sync_settings
+from os2sync_export.fk_org_uuids import get_fk_org_uuid_map
+from os2sync_export.org_tree import get_org_tree
+from os2sync_export.org_tree import unit_is_relevant
 from os2sync_export.os2sync_models import OrgUnit
 from os2sync_export.templates import Person
 from os2sync_export.templates import User
 
 logger = structlog.stdlib.get_logger()
 
+F = TypeVar("F", bound=Callable[..., Awaitable])
+
+mo_requests = Counter(
+    "os2sync_export_mo_requests", "Requests sent through the shared MO session"
+)
+mo_connections = Counter(
+    "os2sync_export_mo_connections", "New connections opened by the shared MO session"
+)
+mo_token_refreshes = Counter(
+    "os2sync_export_mo_token_refreshes",
+    "Access tokens fetched for the shared MO session",
+)
+
+# The shared session is bound to the event loop it was created in
+_mo_session: Optional[Tuple[asyncio.AbstractEventLoop, AsyncOAuth2Client]] = None
+
+
+async def _trace_connections(event_name: str, info: Dict[str, Any]) -> None:
+    if event_name == "connection.connect_tcp.complete":
+        mo_connections.inc()
+
+
+async def _on_mo_request(request: httpx.Request) -> None:
+    mo_requests.inc()
+    request.extensions["trace"] = _trace_connections
+
+
+async def _on_token_refresh(token, access_token=None) -> None:
+    mo_token_refreshes.inc()
+
+
+def create_mo_session(settings: Settings) -> AsyncOAuth2Client:
+    fastramqpi_settings = settings.fastramqpi
+    return AsyncOAuth2Client(
+        base_url=fastramqpi_settings.mo_url,
+        client_id=fastramqpi_settings.client_id,
+        client_secret=fastramqpi_settings.client_secret.get_secret_value(),
+        grant_type="client_credentials",
+        token_endpoint=f"{fastramqpi_settings.auth_server}/realms/{fastramqpi_settings.auth_realm}/protocol/openid-connect/token",
+        # Fetch a token on first request and refresh it 30 seconds before it expires
+        token={"expires_at": -1, "access_token": ""},
+        leeway=30,
+        update_token=_on_token_refresh,
+        verify=settings.ca_verify_os2mo,
+        headers={"User-Agent": "os2mo-data-import-and-export"},
+        limits=httpx.Limits(
+            max_connections=settings.mo_max_connections,
+            max_keepalive_connections=settings.mo_max_keepalive_connections,
+            keepalive_expiry=settings.mo_keepalive_expiry,
+        ),
+        event_hooks={"request": [_on_mo_request]},
+    )
 
-def get_mo_session():
-    settings = get_os2sync_settings()
-    session = httpx.AsyncClient(verify=settings.ca_verify_os2mo)
 
-    session.headers = httpx.Headers(
-        {
-            "User-Agent": "os2mo-data-import-and-export",
-        }
-    )
+def get_mo_session() -> AsyncOAuth2Client:
+    """Return the process-wide session for MO, creating it on first use.
+
+    The session keeps its connections and access token between requests.
+    """
+    global _mo_session
+    loop = asyncio.get_running_loop()
+    if _mo_session is None or _mo_session[0] is not loop:
+        _mo_session = (loop, create_mo_session(get_os2sync_settings()))
+    return _mo_session[1]
 
-    session_headers = TokenSettings(
-        auth_server=settings.fastramqpi.auth_server,
-        client_id=settings.fastramqpi.client_id,
-        client_secret=settings.fastramqpi.client_secret.get_secret_value(),
-        auth_realm=settings.fastramqpi.auth_realm,
-    ).get_headers()
 
-    if session_headers:
-        session.headers.update(session_headers)
-    return session
+async def close_mo_session() -> None:
+    global _mo_session
+    if _mo_session is not None:
+        await _mo_session[1].aclose()
+        _mo_session = None
 
 
 class IT:
@@ -121,28 +197,156 @@ def strip_truncate_and_warn(d, root, length):
                 )
 
 
+class MOResponse:
+    """Response from MO whose body is decoded once, on the first call to `json`.
+
+    Each caller of `os2mo_get` gets its own MOResponse, also for cached responses, so the
+    decoded body is never shared between callers.
+    """
+
+    def __init__(self, response: httpx.Response) -> None:
+        self.response = response
+        self._body: Any = None
+        self._decoded = False
+
+    def json(self) -> Any:
+        if not self._decoded:
+            self._body = self.response.json()
+            self._decoded = True
+        return self._body
+
+
+# Fraction of the responses from MO logged at debug level, and their maximum length
+LOG_RESPONSE_SAMPLE_RATE = 0.1
+LOG_RESPONSE_MAX_LENGTH = 2_000
+
+
+def redact_cpr(value: Any) -> Any:
+    """Return a copy of a decoded response with every CPR number removed"""
+    if isinstance(value, dict):
+        return {
+            k: "removed from logs" if k == "cpr_no" and v else redact_cpr(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [redact_cpr(v) for v in value]
+    return value
+
+
+def _log_response(url: str, res: MOResponse) -> None:
+    # Only decode and render the response if it is logged
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= LOG_RESPONSE_SAMPLE_RATE:
+        return
+    try:
+        body = repr(redact_cpr(res.json()))
+    except ValueError:
+        body = "<not json>"
+    if len(body) > LOG_RESPONSE_MAX_LENGTH:
+        body = body[:LOG_RESPONSE_MAX_LENGTH] + "..."
+    logger.debug("os2mo_get response", url=url, response=body)
+
+
+mo_response_cache_hits = Counter(
+    "os2sync_export_mo_response_cache_hits", "os2mo_get responses served from the cache"
+)
+mo_response_cache_misses = Counter(
+    "os2sync_export_mo_response_cache_misses",
+    "os2mo_get requests sent to MO while a response cache is in use",
+)
+
+
+class MOResponseCache:
+    """Cache of responses from MO keyed by url and params, evicting the least recently used.
+
+    Concurrent requests of the same url share a single request to MO. Failed requests,
+    including the ValueError of a 404, are not cached.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, asyncio.Future[MOResponse]] = OrderedDict()
+
+    async def get(
+        self, key: Hashable, request: Callable[[], Awaitable[MOResponse]]
+    ) -> MOResponse:
+        future = self._entries.get(key)
+        if future is None:
+            mo_response_cache_misses.inc()
+            future = asyncio.ensure_future(request())
+            self._entries[key] = future
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        else:
+            mo_response_cache_hits.inc()
+            self._entries.move_to_end(key)
+        try:
+            # Shielded so a cancelled caller doesn't cancel the request shared with others
+            return await asyncio.shield(future)
+        except Exception:
+            if self._entries.get(key) is future:
+                del self._entries[key]
+            raise
+
+
+_mo_response_cache: ContextVar[Optional[MOResponseCache]] = ContextVar(
+    "mo_response_cache", default=None
+)
+
+
+@contextmanager
+def mo_response_cache_scope(maxsize: int) -> Iterator[Optional[MOResponseCache]]:
+    """Cache responses of `os2mo_get` for the duration of the block, eg. a full sync or an event.
+
+    A maxsize of 0 disables the cache. Nested blocks use the cache of the outermost block.
+    """
+    cache = _mo_response_cache.get()
+    if cache is not None or maxsize <= 0:
+        yield cache
+        return
+    token = _mo_response_cache.set(MOResponseCache(maxsize))
+    try:
+        yield _mo_response_cache.get()
+    finally:
+        _mo_response_cache.reset(token)
+
+
+def mo_responses_cached(func: F) -> F:
+    """Run the decorated function in a `mo_response_cache_scope` of its settings"""
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        settings = signature.bind(*args, **kwargs).arguments["settings"]
+        with mo_response_cache_scope(settings.mo_response_cache_size):
+            return await func(*args, **kwargs)
+
+    return cast(F, wrapper)
+
+
 async def os2mo_get(url, **params):
-    # format url like {BASE}/service
-    mo_url = get_os2sync_settings().fastramqpi.mo_url
+    # format url like {BASE}/service, relative to the sessions base_url
+    url = url.format(BASE="/service")
+    cache = _mo_response_cache.get()
+    if cache is None:
+        return await _os2mo_get(url, params)
+    res = await cache.get(
+        (url, tuple(sorted(params.items()))), lambda: _os2mo_get(url, params)
+    )
+    # Callers may modify the decoded body, so each of them decodes the cached response
+    return MOResponse(res.response)
+
 
-    url = url.format(BASE=f"{mo_url}/service")
-    async with get_mo_session() as session:
-        r = await session.get(url, params=params)
+async def _os2mo_get(url: str, params: Dict[str, Any]) -> MOResponse:
+    r = await get_mo_session().get(url, params=params)
     if r.status_code == 404:
         raise ValueError("No object found with this uuid")
     r.raise_for_status()
 
-    try:
-        # Log every query and response, but remove CPR numbers
-        # this is wraped in try/except to avoid blocking the program by trying to log unexpected data
-        res = r.json()
-        if isinstance(res, dict) and res.get("cpr_no"):
-            res.update({"cpr_no": "removed from logs"})
-        logger.info(f"os2mo_get {url=} returned {res=}")
-    except:  # noqa: E722
-        pass
-
-    return r
+    res = MOResponse(r)
+    _log_response(url, res)
+    return res
 
 
 def pick_address(addresses: list[dict], classes: list[UUID]) -> str | None:
@@ -188,18 +392,23 @@ async def engagements_to_user(user, engagements, graphql_session, settings):
     ]
     # Job title can be read from an extension field if configured to do so.
     extension_field = f"extension_{settings.extension_field_as_job_function}"
-    for e in engagements:
-        e["job_function"] = (
+
+    def job_function(e):
+        return (
             e.get(extension_field)
             if settings.extension_field_as_job_function and e.get(extension_field)
             else e.get("job_function").get("name")
         )
 
-    for e in sorted(engagements, key=lambda e: e["job_function"] + e.get("uuid")):
+    positions = sorted(
+        ((job_function(e), e) for e in engagements),
+        key=lambda p: p[0] + p[1].get("uuid"),
+    )
+    for name, e in positions:
         user["Positions"].append(
             {
                 "OrgUnitUuid": e.get("org_unit").get("uuid"),
-                "Name": e.get("job_function"),
+                "Name": name,
                 # Only used to find primary engagements work-address
                 "is_primary": e.get("is_primary"),
             }
@@ -269,13 +478,27 @@ def get_fk_org_uuid(
     return first(it_uuids, mo_uuid)
 
 
+async def get_unit_fk_org_uuid(unit_uuid: str, uuid_from_it_systems: List[str]) -> str:
+    """Find the FK-org uuid of an org_unit, from the shared map if it is built"""
+    fk_org_uuid_map = get_fk_org_uuid_map()
+    if (
+        fk_org_uuid_map is not None
+        and fk_org_uuid_map.uuid_from_it_systems == uuid_from_it_systems
+    ):
+        fk_org_uuid = fk_org_uuid_map.get(unit_uuid)
+        if fk_org_uuid is not None:
+            return fk_org_uuid
+    res = await os2mo_get(f"{{BASE}}/ou/{unit_uuid}/details/it")
+    it = res.json()
+    return get_fk_org_uuid(it, unit_uuid, uuid_from_it_systems)
+
+
 async def overwrite_position_uuids(sts_user: Dict, uuid_from_it_systems: List):
     # For each position check the it-system of the org-unit
     for p in sts_user["Positions"]:
-        unit_uuid = p["OrgUnitUuid"]
-        res = await os2mo_get(f"{{BASE}}/ou/{unit_uuid}/details/it")
-        it = res.json()
-        p["OrgUnitUuid"] = get_fk_org_uuid(it, unit_uuid, uuid_from_it_systems)
+        p["OrgUnitUuid"] = await get_unit_fk_org_uuid(
+            p["OrgUnitUuid"], uuid_from_it_systems
+        )
 
 
 async def get_org_unit_hierarchy(titles: list[str]) -> Optional[Tuple[UUID, ...]]:
@@ -411,6 +634,7 @@ def group_accounts(
     return fk_org_accounts
 
 
+@mo_responses_cached
 async def get_sts_user(
     mo_uuid: str, graphql_session: AsyncClientSession, settings: Settings
 ) -> List[Dict[str, Any]]:
@@ -446,16 +670,6 @@ async def organization_uuid() -> str:
     return one(res.json())["uuid"]
 
 
-async def org_unit_uuids(**kwargs: Any) -> Set[str]:
-    org_uuid = await organization_uuid()
-    hierarchy_uuids = kwargs.get("hierarchy_uuids")
-    if hierarchy_uuids:
-        kwargs["hierarchy_uuids"] = tuple(str(u) for u in hierarchy_uuids)
-    res = await os2mo_get(f"{{BASE}}/o/{org_uuid}/ou/", limit=999999, **kwargs)
-    ous = res.json()["items"]
-    return set(map(itemgetter("uuid"), ous))
-
-
 async def manager_to_orgunit(unit_uuid: UUID) -> Optional[str]:
     res = await os2mo_get("{BASE}/ou/" + str(unit_uuid) + "/details/manager")
     manager = res.json()
@@ -603,20 +817,18 @@ def is_ignored(unit, settings):
 
 async def overwrite_unit_uuids(sts_org_unit: Dict, uuid_from_it_systems: List):
     # Overwrite UUIDs with values from it-account
-    uuid = sts_org_unit["Uuid"]
-    res = await os2mo_get(f"{{BASE}}/ou/{uuid}/details/it")
-    it = res.json()
-    sts_org_unit["Uuid"] = get_fk_org_uuid(it, uuid, uuid_from_it_systems)
+    sts_org_unit["Uuid"] = await get_unit_fk_org_uuid(
+        sts_org_unit["Uuid"], uuid_from_it_systems
+    )
     # Also check if parent unit has a UUID from an it-account
     parent_uuid = sts_org_unit.get("ParentOrgUnitUuid")
     if parent_uuid:
-        res = await os2mo_get(f"{{BASE}}/ou/{parent_uuid}/details/it")
-        it = res.json()
-        sts_org_unit["ParentOrgUnitUuid"] = get_fk_org_uuid(
-            it, parent_uuid, uuid_from_it_systems
+        sts_org_unit["ParentOrgUnitUuid"] = await get_unit_fk_org_uuid(
+            parent_uuid, uuid_from_it_systems
         )
 
 
+@mo_responses_cached
 async def get_sts_orgunit(
     uuid: UUID, settings: Settings, graphql_session: AsyncClientSession
 ) -> Optional[OrgUnit]:
@@ -689,15 +901,166 @@ async def get_sts_orgunit(
     return OrgUnit(**sts_org_unit)
 
 
+def bulk_orgunit_to_sts(
+    unit: ReadOrgUnitsBulkOrgUnitsObjectsCurrent, settings: Settings
+) -> Optional[OrgUnit]:
+    """Convert an org_unit read with `read_org_units_bulk` to an os2sync payload.
+
+    Gives the same result as `get_sts_orgunit` without further requests to MO.
+    """
+    if (
+        unit.org_unit_level
+        and unit.org_unit_level.uuid in settings.ignored_unit_levels
+        or unit.unit_type
+        and unit.unit_type.uuid in settings.ignored_unit_types
+    ):
+        logger.info("Ignoring %r", unit.uuid)
+        return None
+    top_unit_uuid = settings.top_unit_uuid
+    if unit.uuid != top_unit_uuid and top_unit_uuid not in {
+        a.uuid for a in unit.ancestors
+    }:
+        logger.info(
+            f"Unit with uuid={unit.uuid} is not a unit below {top_unit_uuid=}. Ignoring"
+        )
+        return None
+
+    sts_org_unit: Dict[str, Any] = {
+        "ItSystems": [],
+        "Name": unit.name,
+        "Uuid": str(unit.uuid),
+        "ParentOrgUnitUuid": str(unit.parent.uuid) if unit.parent else None,
+    }
+    itusers = jsonable_encoder(unit.all_itusers)
+    itsystems_to_orgunit(
+        sts_org_unit,
+        itusers,
+        uuid_from_it_systems=settings.uuid_from_it_systems,
+    )
+    addresses_to_orgunit(sts_org_unit, jsonable_encoder(unit.addresses))
+
+    if settings.sync_managers and unit.manager_persons:
+        manager_person = only(first(unit.manager_persons).person or [])
+        if manager_person:
+            manager_uuid = str(manager_person.uuid)
+            if settings.uuid_from_it_systems:
+                fk_org_accounts = group_accounts(
+                    jsonable_encoder(manager_person.itusers),
+                    settings.uuid_from_it_systems,
+                    settings.user_key_it_system_names,
+                )
+                # Use managers mo uuid in case there are no fk-org ituser
+                manager_uuid = first(fk_org_accounts)["uuid"] or manager_uuid
+            sts_org_unit["ManagerUuid"] = manager_uuid
+
+    if settings.enable_kle:
+        kle = [
+            {
+                "kle_number": {"uuid": str(kle_number.uuid)},
+                "kle_aspect": [{"name": a.name} for a in k.kle_aspects],
+            }
+            for k in unit.kles_with_aspects
+            for kle_number in k.kle_number
+        ]
+        kle_to_orgunit(
+            sts_org_unit, kle, use_contact_for_tasks=settings.use_contact_for_tasks
+        )
+
+    if settings.uuid_from_it_systems:
+        sts_org_unit["Uuid"] = get_fk_org_uuid(
+            itusers, str(unit.uuid), settings.uuid_from_it_systems
+        )
+        if unit.parent:
+            sts_org_unit["ParentOrgUnitUuid"] = get_fk_org_uuid(
+                jsonable_encoder(unit.parent_itusers.itusers)
+                if unit.parent_itusers
+                else [],
+                str(unit.parent.uuid),
+                settings.uuid_from_it_systems,
+            )
+
+    strip_truncate_and_warn(sts_org_unit, sts_org_unit, settings.truncate_length)
+
+    return OrgUnit(**sts_org_unit)
+
+
+async def read_sts_orgunits(
+    graphql_client: GraphQLClient,
+    uuids: Iterable[UUID],
+    settings: Settings,
+    page_size: int = 100,
+) -> List[OrgUnit]:
+    """Read org_units from MO in pages and convert them to os2sync payloads.
+
+    Units that are not found or should not be synced are left out.
+    """
+    org_units = []
+    for page in chunked(uuids, page_size):
+        res = await graphql_client.read_org_units_bulk(uuids=page)
+        for o in res.objects:
+            if o.current is None:
+                continue
+            org_unit = bulk_orgunit_to_sts(o.current, settings=settings)
+            if org_unit:
+                org_units.append(org_unit)
+    return org_units
+
+
+async def _load_objects(
+    graphql_session: AsyncClientSession,
+    query: str,
+    object_type: str,
+    uuids: List[UUID],
+) -> Dict[UUID, Dict]:
+    res = await graphql_session.execute(
+        gql(query), variable_values={"uuids": [str(u) for u in uuids]}
+    )
+    return {UUID(o["uuid"]): o for o in res[object_type]["objects"]}
+
+
+async def find_object(
+    graphql_session: AsyncClientSession,
+    name: str,
+    query: str,
+    object_type: str,
+    uuid: UUID | str,
+) -> Optional[Dict]:
+    """Find the MO object with the given uuid, batched with concurrent lookups of the same query.
+
+    The query takes the list of `$uuids` and returns the `uuid` of each of the objects.
+    Returns None if the object is not found.
+    """
+    return await batching.load(
+        name,
+        graphql_session,
+        UUID(str(uuid)),
+        partial(_load_objects, graphql_session, query, object_type),
+    )
+
+
+async def load_object(
+    graphql_session: AsyncClientSession,
+    name: str,
+    query: str,
+    object_type: str,
+    uuid: UUID | str,
+) -> Dict:
+    """Like `find_object`, but raises ValueError if the object is not found, like `one` does"""
+    obj = await find_object(graphql_session, name, query, object_type, uuid)
+    if obj is None:
+        raise ValueError(f"No {object_type} found with {uuid=}")
+    return obj
+
+
 async def get_user_it_accounts(
     graphql_session: AsyncClientSession, mo_uuid: str
 ) -> List[Dict]:
     """Find fk-org user(s) details for the person with given MO uuid"""
-    q = gql(
-        """
-    query GetITAccounts($uuid: UUID!) {
-      employees(filter: { uuids: [$uuid] }) {
+    query = """
+    query GetITAccounts($uuids: [UUID!]) {
+      employees(filter: { uuids: $uuids }) {
         objects {
+          uuid
           current {
             itusers {
               uuid
@@ -712,9 +1075,9 @@ async def get_user_it_accounts(
       }
     }
     """
+    objects = await load_object(
+        graphql_session, "GetITAccounts", query, "employees", mo_uuid
     )
-    res = await graphql_session.execute(q, variable_values={"uuid": mo_uuid})
-    objects = one(res["employees"]["objects"])
     return objects["current"]["itusers"]
 
 
@@ -805,11 +1168,11 @@ async def get_address_org_unit_and_employee_uuids(
         tuple[str|None, str|None]
     """
 
-    q = gql(
-        """
-    query GetAddress($uuid: UUID!) {
-      addresses(filter: { uuids: [$uuid], from_date: null, to_date: null }) {
+    query = """
+    query GetAddress($uuids: [UUID!]) {
+      addresses(filter: { uuids: $uuids, from_date: null, to_date: null }) {
         objects {
+          uuid
           validities {
             employee_uuid
             org_unit_uuid
@@ -818,15 +1181,8 @@ async def get_address_org_unit_and_employee_uuids(
       }
     }
     """
-    )
-    mo_uuid_str = str(mo_uuid)
-    result = await graphql_session.execute(
-        q,
-        variable_values={
-            "uuid": mo_uuid_str,
-        },
-    )
-    objects = one(result["addresses"]["objects"])["validities"]
+    obj = await load_object(graphql_session, "GetAddress", query, "addresses", mo_uuid)
+    objects = obj["validities"]
     employee_uuid = extract_uuid(objects, "employee_uuid")
     org_unit_uuid = extract_uuid(objects, "org_unit_uuid")
     return org_unit_uuid, employee_uuid
@@ -837,11 +1193,11 @@ async def get_ituser_org_unit_and_employee_uuids(
 ):
     """Finds an ituser by its UUID."""
 
-    q = gql(
-        """
-    query GetItUser($uuid: UUID!) {
-      itusers(filter: { uuids: [$uuid], from_date: null, to_date: null }) {
+    query = """
+    query GetItUser($uuids: [UUID!]) {
+      itusers(filter: { uuids: $uuids, from_date: null, to_date: null }) {
         objects {
+          uuid
           validities {
             employee_uuid
             org_unit_uuid
@@ -850,16 +1206,8 @@ async def get_ituser_org_unit_and_employee_uuids(
       }
     }
     """
-    )
-    mo_uuid_str = str(mo_uuid)
-    result = await graphql_session.execute(
-        q,
-        variable_values={
-            "uuid": mo_uuid_str,
-        },
-    )
-
-    objects = one(result["itusers"]["objects"])["validities"]
+    obj = await load_object(graphql_session, "GetItUser", query, "itusers", mo_uuid)
+    objects = obj["validities"]
     employee_uuid = extract_uuid(objects, "employee_uuid")
     org_unit_uuid = extract_uuid(objects, "org_unit_uuid")
     return org_unit_uuid, employee_uuid
@@ -868,11 +1216,11 @@ async def get_ituser_org_unit_and_employee_uuids(
 async def get_manager_org_unit_uuid(graphql_session: AsyncClientSession, mo_uuid: UUID):
     """Finds manager org_unit UUID, by manager UUID."""
 
-    q = gql(
-        """
-    query GetManager($uuid: UUID!) {
-      managers(filter: { uuids: [$uuid], from_date: null, to_date: null }) {
+    query = """
+    query GetManager($uuids: [UUID!]) {
+      managers(filter: { uuids: $uuids, from_date: null, to_date: null }) {
         objects {
+          uuid
           validities {
             employee_uuid
             org_unit_uuid
@@ -881,16 +1229,8 @@ async def get_manager_org_unit_uuid(graphql_session: AsyncClientSession, mo_uuid
       }
     }
     """
-    )
-    mo_uuid_str = str(mo_uuid)
-    result = await graphql_session.execute(
-        q,
-        variable_values={
-            "uuid": mo_uuid_str,
-        },
-    )
-
-    objects = one(result["managers"]["objects"])["validities"]
+    obj = await load_object(graphql_session, "GetManager", query, "managers", mo_uuid)
+    objects = obj["validities"]
     org_unit_uuid = extract_uuid(objects, "org_unit_uuid")
     return org_unit_uuid
 
@@ -900,11 +1240,11 @@ async def get_engagement_employee_uuid(
 ):
     """Finds an employee UUID from engagement UUID."""
 
-    q = gql(
-        """
-    query GetEngagement($uuid: UUID!) {
-      engagements(filter: { uuids: [$uuid], from_date: null, to_date: null }) {
+    query = """
+    query GetEngagement($uuids: [UUID!]) {
+      engagements(filter: { uuids: $uuids, from_date: null, to_date: null }) {
         objects {
+          uuid
           validities {
             employee_uuid
             org_unit_uuid
@@ -913,16 +1253,10 @@ async def get_engagement_employee_uuid(
       }
     }
     """
+    obj = await load_object(
+        graphql_session, "GetEngagement", query, "engagements", mo_uuid
     )
-    mo_uuid_str = str(mo_uuid)
-    result = await graphql_session.execute(
-        q,
-        variable_values={
-            "uuid": mo_uuid_str,
-        },
-    )
-
-    objects = one(result["engagements"]["objects"])["validities"]
+    objects = obj["validities"]
     employee_uuid = extract_uuid(objects, "employee_uuid")
     return employee_uuid
 
@@ -930,11 +1264,11 @@ async def get_engagement_employee_uuid(
 async def get_kle_org_unit_uuid(graphql_session: AsyncClientSession, mo_uuid: UUID):
     """Finds an KLE org_unit UUID, by KLE UUID."""
 
-    q = gql(
-        """
-    query GetKLEs($uuid: UUID!) {
-      kles(filter: { uuids: [$uuid], from_date: null, to_date: null }) {
+    query = """
+    query GetKLEs($uuids: [UUID!]) {
+      kles(filter: { uuids: $uuids, from_date: null, to_date: null }) {
         objects {
+          uuid
           validities {
             org_unit_uuid
           }
@@ -942,20 +1276,100 @@ async def get_kle_org_unit_uuid(graphql_session: AsyncClientSession, mo_uuid: UU
       }
     }
     """
-    )
-    mo_uuid_str = str(mo_uuid)
-    result = await graphql_session.execute(
-        q,
-        variable_values={
-            "uuid": mo_uuid_str,
-        },
-    )
-
-    objects = one(result["kles"]["objects"])["validities"]
+    obj = await load_object(graphql_session, "GetKLEs", query, "kles", mo_uuid)
+    objects = obj["validities"]
     org_unit_uuid = extract_uuid(objects, "org_unit_uuid")
     return org_unit_uuid
 
 
+relevance_cache_hits = Counter(
+    "os2sync_export_relevance_cache_hits", "is_relevant lookups served from the cache"
+)
+relevance_cache_misses = Counter(
+    "os2sync_export_relevance_cache_misses", "is_relevant lookups queried from MO"
+)
+
+
+class RelevanceCache:
+    """Cache of whether org_units are relevant, keyed by org_unit uuid.
+
+    Concurrent lookups of the same org_unit share a single query to MO. Entries expire
+    after the given ttl unless the cache is created with expire=False.
+    """
+
+    def __init__(self, expire: bool = True) -> None:
+        self.expire = expire
+        self._entries: Dict[UUID, Tuple[float, asyncio.Future]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _valid_entry(self, unit_uuid: UUID) -> Optional[Tuple[float, asyncio.Future]]:
+        # Futures are bound to the event loop they were created in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._entries.clear()
+            self._loop = loop
+        entry = self._entries.get(unit_uuid)
+        if entry is not None and self.expire and entry[0] < time.monotonic():
+            return None
+        return entry
+
+    def prime(self, unit_uuid: UUID, relevant: bool, ttl: float) -> None:
+        self._valid_entry(unit_uuid)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(relevant)
+        self._entries[unit_uuid] = (time.monotonic() + ttl, future)
+
+    def invalidate(self, unit_uuid: UUID | str) -> None:
+        """Drop the cached relevance of an org_unit, eg. when it has changed"""
+        self._entries.pop(UUID(str(unit_uuid)), None)
+
+    def clear(self) -> None:
+        """Drop every cached relevance, eg. when an org_unit may have moved with its descendants"""
+        self._entries.clear()
+
+    async def get(
+        self, unit_uuid: UUID, query: Callable[[], Awaitable[bool]], ttl: float
+    ) -> bool:
+        entry = self._valid_entry(unit_uuid)
+        if entry is None:
+            if self.expire and ttl <= 0:
+                return await query()
+            relevance_cache_misses.inc()
+            entry = (time.monotonic() + ttl, asyncio.ensure_future(query()))
+            self._entries[unit_uuid] = entry
+        else:
+            relevance_cache_hits.inc()
+        try:
+            # Shielded so a cancelled caller doesn't cancel the query shared with others
+            return await asyncio.shield(entry[1])
+        except Exception:
+            # Failed queries are not cached
+            if self._entries.get(unit_uuid) is entry:
+                del self._entries[unit_uuid]
+            raise
+
+
+_relevance_cache = RelevanceCache()
+_run_relevance_cache: ContextVar[Optional[RelevanceCache]] = ContextVar(
+    "run_relevance_cache", default=None
+)
+
+
+def get_relevance_cache() -> RelevanceCache:
+    """Return the cache of the current sync run, or the process-wide cache used by events."""
+    return _run_relevance_cache.get() or _relevance_cache
+
+
+@contextmanager
+def relevance_cache_scope() -> Iterator[RelevanceCache]:
+    """Cache whether org_units are relevant for the duration of the block, eg. a full sync."""
+    token = _run_relevance_cache.set(RelevanceCache(expire=False))
+    try:
+        yield get_relevance_cache()
+    finally:
+        _run_relevance_cache.reset(token)
+
+
 async def is_relevant(
     graphql_session: AsyncClientSession,
     unit_uuid: UUID,
@@ -966,16 +1380,41 @@ async def is_relevant(
     Checks that
     * the unit is below the top unit uuid
     * is part of the correct org_unit_hierarchies
+
+    Answered from the org_unit tree index if it is enabled and knows the unit.
+    Otherwise results are cached, see `get_relevance_cache`.
     """
 
+    # Events give uuids as strings, while the cache and settings use UUIDs
+    unit_uuid = UUID(str(unit_uuid))
+
     # Top unit is always relevant
     if unit_uuid == settings.top_unit_uuid:
         return True
 
+    org_tree = get_org_tree()
+    if org_tree is not None:
+        relevant = org_tree.is_relevant(unit_uuid, settings)
+        if relevant is not None:
+            return relevant
+
+    return await get_relevance_cache().get(
+        unit_uuid,
+        lambda: _query_is_relevant(graphql_session, unit_uuid, settings),
+        ttl=settings.relevance_cache_ttl,
+    )
+
+
+async def _query_is_relevant(
+    graphql_session: AsyncClientSession,
+    unit_uuid: UUID,
+    settings: Settings,
+) -> bool:
     query = """
-    query QueryAncestors($uuid: UUID!) {
-      org_units(filter: { uuids: [$uuid] }) {
+    query QueryAncestors($uuids: [UUID!]) {
+      org_units(filter: { uuids: $uuids }) {
         objects {
+          uuid
           current {
             ancestors {
               uuid
@@ -993,59 +1432,39 @@ async def is_relevant(
       }
     }
     """
-    res = await graphql_session.execute(
-        gql(query), variable_values={"uuid": str(unit_uuid)}
+    obj = await find_object(
+        graphql_session, "QueryAncestors", query, "org_units", unit_uuid
     )
-    if not res["org_units"]["objects"]:
+    if obj is None:
         logger.warn("No unit found")
         return False
 
-    org_unit = one(res["org_units"]["objects"])["current"]
+    org_unit = obj["current"]
 
     if org_unit["ancestors"] is None:
         # We won't sync other root organisation units than the one specified in settings
         return False
     # Check that the configured top unit is in the units ancestors
     ancestors = {UUID(a["uuid"]) for a in org_unit["ancestors"]}
-    is_below_top_uuid: bool = settings.top_unit_uuid in ancestors
-
-    # Check if the unit or any of its ancestors are filtered.
-    if unit_uuid in settings.filter_orgunit_uuid or any(
-        uuid in ancestors for uuid in settings.filter_orgunit_uuid
-    ):
-        logger.info(f"Orgunit is filtered based on settings {unit_uuid=}")
-        return False
-
-    if settings.filter_hierarchy_names:
-        # Check that the unit is part of the correct org_unit hierarchy
-        is_in_hierarchies: bool = (
-            False
-            if org_unit["org_unit_hierarchy_model"] is None
-            else org_unit["org_unit_hierarchy_model"]["name"]
-            in settings.filter_hierarchy_names
-        )
-        # If there are an it-account we sync it regardless of the hierarchy
-        has_it_account: bool = any(
-            it["itsystem"]["name"] in settings.uuid_from_it_systems
-            for it in org_unit["itusers"]
-        )
-
-        logger.info(
-            f"is_relevant check found that {is_below_top_uuid=}, {is_in_hierarchies=}, {has_it_account=}"
-        )
-        return is_below_top_uuid and (is_in_hierarchies or has_it_account)
-    logger.info(f"is_relevant check found that {is_below_top_uuid=}")
-    return is_below_top_uuid
+    hierarchy = org_unit.get("org_unit_hierarchy_model")
+    return unit_is_relevant(
+        settings,
+        unit_uuid,
+        ancestors,
+        hierarchy["name"] if hierarchy else None,
+        (it["itsystem"]["name"] for it in org_unit.get("itusers", [])),
+    )
 
 
-async def find_employees(
-    graphql_session: AsyncClientSession, org_unit_uuid: UUID
-) -> set[UUID]:
+async def _find_employees_of_units(
+    graphql_session: AsyncClientSession, org_unit_uuids: List[UUID]
+) -> Dict[UUID, set[UUID]]:
     query = """
-    query QueryEmployees($uuid: UUID!) {
-      engagements(filter: { org_unit: { uuids: [$uuid] } }) {
+    query QueryEmployees($uuids: [UUID!]) {
+      engagements(filter: { org_unit: { uuids: $uuids } }) {
         objects {
           current {
+            org_unit_uuid
             person {
               uuid
             }
@@ -1055,11 +1474,27 @@ async def find_employees(
     }
     """
     res = await graphql_session.execute(
-        gql(query), variable_values={"uuid": str(org_unit_uuid)}
+        gql(query), variable_values={"uuids": [str(u) for u in org_unit_uuids]}
     )
-    return {
-        UUID(one(e["current"]["person"])["uuid"]) for e in res["engagements"]["objects"]
-    }
+    employees: Dict[UUID, set[UUID]] = {}
+    for e in res["engagements"]["objects"]:
+        employees.setdefault(UUID(e["current"]["org_unit_uuid"]), set()).add(
+            UUID(one(e["current"]["person"])["uuid"])
+        )
+    return employees
+
+
+async def find_employees(
+    graphql_session: AsyncClientSession, org_unit_uuid: UUID
+) -> set[UUID]:
+    """Find the employees engaged in the org_unit, batched with concurrent lookups"""
+    employees = await batching.load(
+        "QueryEmployees",
+        graphql_session,
+        org_unit_uuid,
+        partial(_find_employees_of_units, graphql_session),
+    )
+    return employees or set()
 
 
 async def fk_org_uuid_to_mo_uuid(
@@ -5,6 +5,7 @@ from datetime import date
 from datetime import datetime
 from datetime import timedelta
 from datetime import timezone
+from typing import AsyncIterator
 from typing import Iterable
 from uuid import UUID
 from uuid import uuid4
@@ -16,6 +17,7 @@ from more_itertools import first
 from more_itertools import one
 from more_itertools import only
 
+from os2sync_export.autogenerated_graphql_client import ClassFilter
 from os2sync_export.autogenerated_graphql_client.find_address_unit_or_person import (
     FindAddressUnitOrPersonAddresses,
 )
@@ -33,6 +35,9 @@ from os2sync_export.autogenerated_graphql_client.find_manager_unit import (
 )
 from os2sync_export.autogenerated_graphql_client.fragments import UnitFields
 from os2sync_export.autogenerated_graphql_client.fragments import UnitFieldsParent
+from os2sync_export.autogenerated_graphql_client.read_org_unit_subtree_uuids import (
+    ReadOrgUnitSubtreeUuidsOrgUnitsObjects,
+)
 from os2sync_export.autogenerated_graphql_client.read_orgunit import (
     ReadOrgunitOrgUnitsObjectsCurrent,
 )
@@ -65,6 +70,7 @@ from os2sync_export.os2sync_models import OrgUnit
 from os2sync_export.os2sync_models import Person
 from os2sync_export.os2sync_models import Position
 from os2sync_export.os2sync_models import User
+from os2sync_export.pipeline import iter_pages
 
 logger = structlog.stdlib.get_logger()
 
@@ -262,10 +268,12 @@ async def sync_mo_user_to_fk_org(
     settings: Settings,
     os2sync_client: OS2SyncClient,
     dry_run: bool = False,
+    force: bool = False,
 ) -> tuple[list[User], set[UUID]]:
     """Handles sync of a persons users to fk-org.
 
     Returns a list of users synced to fk-org and a set of uuids representing users deleted from fk-org.
+    Users are written even if unchanged since the last write when force is set.
     """
     fk_org_users, it_users = await read_fk_users_from_person(
         graphql_client=graphql_client,
@@ -361,7 +369,7 @@ async def sync_mo_user_to_fk_org(
         deletes_fk.add(uuid)
 
     for os2sync_user in updates_fk:
-        await os2sync_client.update_user(os2sync_user)
+        await os2sync_client.update_user(os2sync_user, force=force)
     for deleted_user_uuid in deletes_fk:
         await os2sync_client.delete_user(deleted_user_uuid)
     return updates_fk, deletes_fk
@@ -373,6 +381,7 @@ async def sync_orgunit(
     settings: Settings,
     graphql_client: GraphQLClient,
     os2sync_client: OS2SyncClient,
+    force: bool = False,
 ) -> OrgUnit | None:
     res = await graphql_client.read_orgunit(uuid=uuid)
     if not res.objects:
@@ -389,7 +398,9 @@ async def sync_orgunit(
         await os2sync_client.delete_orgunit(uuid)
         return None
 
-    await os2sync_client.update_org_unit(os2sync_orgunit.Uuid, org_unit=os2sync_orgunit)
+    await os2sync_client.update_org_unit(
+        os2sync_orgunit.Uuid, org_unit=os2sync_orgunit, force=force
+    )
     return os2sync_orgunit
 
 
@@ -546,3 +557,73 @@ def find_object_person(
 async def find_fk_itsystem_uuid(graphql_client: GraphQLClient):
     res = await graphql_client.find_f_k_itsystem()
     return one(res.objects).uuid
+
+
+async def iter_person_uuids(
+    graphql_client: GraphQLClient, limit: int = 1_000
+) -> AsyncIterator[UUID]:
+    """Yield the uuid of every person in MO using cursor pagination"""
+    async for res in iter_pages(
+        lambda cursor: graphql_client.read_all_employee_uuids(
+            limit=limit, cursor=cursor
+        )
+    ):
+        for o in res.objects:
+            yield o.uuid
+
+
+async def _iter_org_unit_subtree_pages(
+    graphql_client: GraphQLClient,
+    root: UUID,
+    hierarchy_uuids: Iterable[UUID] | None = None,
+    limit: int = 1_000,
+) -> AsyncIterator[list[ReadOrgUnitSubtreeUuidsOrgUnitsObjects]]:
+    hierarchy = (
+        ClassFilter(uuids=list(hierarchy_uuids), from_date=None, to_date=None)
+        if hierarchy_uuids is not None
+        else None
+    )
+    async for res in iter_pages(
+        lambda cursor: graphql_client.read_org_unit_subtree_uuids(
+            root=root, hierarchy=hierarchy, limit=limit, cursor=cursor
+        )
+    ):
+        yield res.objects
+
+
+async def iter_org_unit_uuid_pages(
+    graphql_client: GraphQLClient,
+    root: UUID,
+    hierarchy_uuids: Iterable[UUID] | None = None,
+    limit: int = 1_000,
+) -> AsyncIterator[list[UUID]]:
+    """Yield the uuids of the current org_units in the subtree of root a page at a time.
+
+    The root is included. If hierarchy_uuids are given, only org_units in those hierarchies are included.
+    """
+    async for objects in _iter_org_unit_subtree_pages(
+        graphql_client, root, hierarchy_uuids, limit
+    ):
+        yield [o.uuid for o in objects]
+
+
+async def read_all_person_uuids(
+    graphql_client: GraphQLClient, limit: int = 1_000
+) -> set[UUID]:
+    """Read the uuids of every person in MO using cursor pagination"""
+    return {uuid async for uuid in iter_person_uuids(graphql_client, limit)}
+
+
+async def read_org_unit_subtree_parents(
+    graphql_client: GraphQLClient, root: UUID, limit: int = 1_000
+) -> dict[UUID, UUID | None]:
+    """Read the uuids of the current org_units in the subtree of root mapped to the uuid of their parent using cursor pagination"""
+    parents: dict[UUID, UUID | None] = {}
+    async for objects in _iter_org_unit_subtree_pages(
+        graphql_client, root, limit=limit
+    ):
+        for o in objects:
+            if o.current is None:
+                continue
+            parents[o.uuid] = o.current.parent.uuid if o.current.parent else None
+    return parents
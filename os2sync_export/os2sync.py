@@ -1,7 +1,12 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+import json
+from typing import Any
+from typing import AsyncIterator
 from typing import Dict
+from typing import Iterable
+from typing import List
 from typing import Optional
 from typing import Set
 from typing import Tuple
@@ -13,11 +18,14 @@ from fastapi.encoders import jsonable_encoder
 from tenacity import retry
 from tenacity import retry_if_exception_type
 from tenacity import stop_after_delay
-from tenacity import wait_fixed
+from tenacity import wait_exponential
 
 from os2sync_export import stub
 from os2sync_export.config import Settings
 from os2sync_export.config import get_os2sync_settings
+from os2sync_export.fingerprints import FingerprintStore
+from os2sync_export.fingerprints import fingerprint
+from os2sync_export.json_stream import iter_arrays
 from os2sync_export.os2sync_models import OrgUnit
 from os2sync_export.os2sync_models import User
 
@@ -25,10 +33,90 @@ retry_max_time = 60
 logger = structlog.stdlib.get_logger()
 
 
+def merge_org_unit(org_unit: OrgUnit, current: OrgUnit) -> OrgUnit:
+    """Avoid overwriting information that we cannot provide from os2mo."""
+    return org_unit.copy(
+        update=dict(
+            LOSShortName=current.LOSShortName,
+            Tasks=org_unit.Tasks or current.Tasks,
+            ShortKey=org_unit.ShortKey or current.ShortKey,
+            PayoutUnitUuid=org_unit.PayoutUnitUuid or current.PayoutUnitUuid,
+            ContactPlaces=org_unit.ContactPlaces or current.ContactPlaces,
+            ContactOpenHours=org_unit.ContactOpenHours or current.ContactOpenHours,
+            SOR=org_unit.SOR or current.SOR,
+        )
+    )
+
+
+def org_unit_from_snapshot(entry: Dict) -> Optional[OrgUnit]:
+    """Parse an org_unit from the fk-org hierarchy.
+
+    Returns None unless the entry holds every field of an OrgUnit, as we can't tell
+    whether a unit has changed from a partial entry.
+    """
+    if not OrgUnit.__fields__.keys() <= entry.keys():
+        return None
+    return OrgUnit(**{k: entry[k] for k in OrgUnit.__fields__})
+
+
+# Keys of the positions in a user payload which are only used internally, and never
+# stored in fk-org
+INTERNAL_POSITION_KEYS = {"is_primary"}
+
+
+def _without_nones(value: Any) -> Any:
+    """Drop fields which are None, as fk-org leaves out empty fields"""
+    if isinstance(value, dict):
+        return {k: _without_nones(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_without_nones(v) for v in value]
+    return value
+
+
+def _canonical_user(user: Dict, keys: Iterable[str]) -> Dict:
+    user = jsonable_encoder({k: user.get(k) for k in keys})
+    if user.get("Positions"):
+        user["Positions"] = sorted(
+            (
+                {k: v for k, v in p.items() if k not in INTERNAL_POSITION_KEYS}
+                for p in user["Positions"]
+            ),
+            key=lambda p: json.dumps(p, sort_keys=True),
+        )
+    return _without_nones(user)
+
+
+# Fields of a user payload which are compared with the users entry in the fk-org hierarchy
+USER_SNAPSHOT_KEYS = User.__fields__.keys() - {"DateTime"}
+
+
+def user_fingerprint(user: Dict) -> str:
+    """Fingerprint the fields of a user payload or hierarchy entry which tell whether the user has changed.
+
+    Fields which are None or missing are treated alike, and internal keys of the
+    positions are ignored.
+    """
+    return fingerprint(_canonical_user(user, USER_SNAPSHOT_KEYS))
+
+
+def user_changed(user: Dict, entry_fingerprint: Optional[str]) -> bool:
+    """Compare a user payload with the fingerprint of the users entry in the fk-org hierarchy.
+
+    Users that are missing from the hierarchy are considered changed.
+    """
+    if entry_fingerprint is None:
+        return True
+    return user_fingerprint(user) != entry_fingerprint
+
+
 class OS2SyncClient:
-    def __init__(self, settings, session=None) -> None:
+    def __init__(
+        self, settings, session=None, fingerprints: FingerprintStore | None = None
+    ) -> None:
         self.settings = settings or get_os2sync_settings()
         self.session = session or self._get_os2sync_session()
+        # Fingerprints of the payloads last written, used to skip identical writes
+        self.fingerprints = fingerprints
 
     async def os2sync_post(self, url, **params):
         raise NotImplementedError
@@ -52,6 +140,22 @@ class OS2SyncClient:
         session.headers["CVR"] = self.settings.municipality
         return session
 
+    def _fingerprint(self, payload) -> Optional[str]:
+        return fingerprint(payload) if self.fingerprints is not None else None
+
+    async def _unchanged(self, uuid: UUID, payload_fingerprint: Optional[str]) -> bool:
+        if self.fingerprints is None or payload_fingerprint is None:
+            return False
+        return await self.fingerprints.get(uuid) == payload_fingerprint
+
+    async def _remember(self, uuid: UUID, payload_fingerprint: Optional[str]) -> None:
+        if self.fingerprints is not None and payload_fingerprint is not None:
+            await self.fingerprints.set(uuid, payload_fingerprint)
+
+    async def _forget(self, uuid: UUID) -> None:
+        if self.fingerprints is not None:
+            await self.fingerprints.delete(uuid)
+
     def os2sync_url(self, url):
         """format url like {BASE}/user"""
         url = url.format(BASE=self.settings.os2sync_api_url)
@@ -81,9 +185,11 @@ class OS2SyncClient:
             return
         logger.info("delete orgunit %s", uuid)
         await self.os2sync_delete("{BASE}/orgUnit/" + str(uuid))
+        await self._forget(uuid)
 
     async def delete_user(self, uuid: UUID):
         await self.os2sync_delete("{BASE}/user/" + str(uuid))
+        await self._forget(UUID(str(uuid)))
 
     async def passivate_orgunit(self, uuid: UUID):
         if uuid == self.settings.top_unit_uuid:
@@ -91,32 +197,62 @@ class OS2SyncClient:
             return
         logger.info("passivate orgunit %s", uuid)
         await self.os2sync_passivate("{BASE}/orgUnit/passiver/" + str(uuid))
+        await self._forget(uuid)
 
     async def passivate_user(self, uuid: UUID):
         await self.os2sync_passivate("{BASE}/user/passiver/" + str(uuid))
+        await self._forget(uuid)
+
+    async def upsert_org_unit(self, org_unit: OrgUnit, force: bool = False) -> None:
+        """Upsert an org_unit unless it is unchanged since it was last written.
 
-    async def upsert_org_unit(self, org_unit: OrgUnit) -> None:
+        The fingerprint is taken of the payload from os2mo, before merging with fk-org,
+        so that unchanged org_units are skipped without reading them from os2sync.
+        """
+        payload_fingerprint = self._fingerprint(org_unit.json())
+        if not force and await self._unchanged(org_unit.Uuid, payload_fingerprint):
+            logger.info(f"OrgUnit unchanged since last sync {org_unit.Uuid=}")
+            return
         try:
             current = await self.os2sync_get_org_unit(uuid=org_unit.Uuid)
         except KeyError:
             logger.info(f"OrgUnit not found in os2sync - creating {org_unit.Uuid=}")
             await self.os2sync_post("{BASE}/orgUnit/", json=org_unit.json())
+            await self._remember(org_unit.Uuid, payload_fingerprint)
             return
 
-        # Avoid overwriting information that we cannot provide from os2mo.
-        org_unit.LOSShortName = current.LOSShortName
-        org_unit.Tasks = org_unit.Tasks or current.Tasks
-        org_unit.ShortKey = org_unit.ShortKey or current.ShortKey
-        org_unit.PayoutUnitUuid = org_unit.PayoutUnitUuid or current.PayoutUnitUuid
-        org_unit.ContactPlaces = org_unit.ContactPlaces or current.ContactPlaces
-        org_unit.ContactOpenHours = (
-            org_unit.ContactOpenHours or current.ContactOpenHours
-        )
-        org_unit.SOR = org_unit.SOR or current.SOR
+        merged = merge_org_unit(org_unit, current)
+        logger.info(f"Syncing org_unit {merged}")
+        await self.os2sync_post("{BASE}/orgUnit/", json=merged.json())
+        await self._remember(org_unit.Uuid, payload_fingerprint)
+
+    async def upsert_org_unit_from_snapshot(
+        self, org_unit: OrgUnit, snapshot: Dict[UUID, Optional[OrgUnit]]
+    ) -> bool:
+        """Upsert an org_unit using the snapshot of the fk-org hierarchy instead of reading it from os2sync.
 
-        org_unit_info = org_unit.json()
-        logger.info(f"Syncing org_unit {org_unit}")
-        await self.os2sync_post("{BASE}/orgUnit/", json=org_unit_info)
+        Returns whether the org_unit was written to os2sync.
+        """
+        payload_fingerprint = self._fingerprint(org_unit.json())
+        if org_unit.Uuid not in snapshot:
+            logger.info(f"OrgUnit not found in os2sync - creating {org_unit.Uuid=}")
+            await self.os2sync_post("{BASE}/orgUnit/", json=org_unit.json())
+            await self._remember(org_unit.Uuid, payload_fingerprint)
+            return True
+        current = snapshot[org_unit.Uuid]
+        if current is None:
+            await self.upsert_org_unit(org_unit, force=True)
+            return True
+
+        merged = merge_org_unit(org_unit, current)
+        if merged == current:
+            logger.debug(f"OrgUnit unchanged in os2sync {org_unit.Uuid=}")
+            await self._remember(org_unit.Uuid, payload_fingerprint)
+            return False
+        logger.info(f"Syncing org_unit {merged}")
+        await self.os2sync_post("{BASE}/orgUnit/", json=merged.json())
+        await self._remember(org_unit.Uuid, payload_fingerprint)
+        return True
 
     async def trigger_hierarchy(self) -> UUID:
         """ "Triggers a job in the os2sync container that gathers the entire hierarchy from FK-ORG
@@ -129,34 +265,91 @@ class OS2SyncClient:
         return UUID(r.text)
 
     @retry(
-        wait=wait_fixed(5),
+        wait=wait_exponential(min=1, max=30),
         reraise=True,
         stop=stop_after_delay(10 * 60),
         retry=retry_if_exception_type(httpx.HTTPStatusError),
     )
-    async def get_hierarchy(self, request_uuid: UUID) -> Tuple[dict, dict]:
-        """Fetches the hierarchy from os2sync. Retries for 10 minutes until it is ready."""
-        r = await self.session.get(
-            f"{self.settings.os2sync_api_url}/hierarchy/{str(request_uuid)}"
+    async def _open_hierarchy(self, request_uuid: UUID) -> httpx.Response:
+        """Opens a streamed response with the hierarchy from os2sync.
+
+        Polls with exponential backoff for up to 10 minutes until the hierarchy is ready.
+        """
+        request = self.session.build_request(
+            "GET", f"{self.settings.os2sync_api_url}/hierarchy/{str(request_uuid)}"
         )
-        r.raise_for_status()
-        hierarchy = r.json()["Result"]
-        if hierarchy is None:
+        r = await self.session.send(request, stream=True)
+        try:
+            r.raise_for_status()
+        except httpx.HTTPStatusError:
+            await r.aclose()
+            raise
+        return r
+
+    async def iter_hierarchy(
+        self, request_uuid: UUID
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Streams the hierarchy from os2sync.
+
+        Yields ("OUs", org_unit) and ("Users", user) one at a time as the response is parsed,
+        so the whole hierarchy is never held in memory.
+        """
+        r = await self._open_hierarchy(request_uuid)
+        try:
+            async for kind, item in iter_arrays(r.aiter_bytes(), path=("Result",)):
+                yield kind, item
+        except LookupError:
             raise ConnectionError("Check connection to FK-ORG")
+        finally:
+            await r.aclose()
+
+    async def get_hierarchy(self, request_uuid: UUID) -> Tuple[List, List]:
+        """Fetches the hierarchy from os2sync."""
+        hierarchy: Dict[str, List] = {"OUs": [], "Users": []}
+        async for kind, item in self.iter_hierarchy(request_uuid):
+            hierarchy.setdefault(kind, []).append(item)
         return hierarchy["OUs"], hierarchy["Users"]
 
+    async def get_snapshot(
+        self, request_uuid: UUID
+    ) -> Tuple[Dict[UUID, Optional[OrgUnit]], Dict[UUID, str]]:
+        """Fetches the hierarchy from os2sync keeping only what tells whether an org_unit or user has changed.
+
+        Org_units are parsed with `org_unit_from_snapshot` and users are reduced to their
+        `user_fingerprint`, so the entries are dropped as they are streamed.
+        """
+        org_units: Dict[UUID, Optional[OrgUnit]] = {}
+        users: Dict[UUID, str] = {}
+        async for kind, item in self.iter_hierarchy(request_uuid):
+            uuid = UUID(item["Uuid"])
+            if kind == "OUs":
+                org_units[uuid] = org_unit_from_snapshot(item)
+            elif kind == "Users":
+                users[uuid] = user_fingerprint(item)
+        return org_units, users
+
     async def get_existing_uuids(
         self, request_uuid: UUID
     ) -> Tuple[Set[UUID], Set[UUID]]:
-        org_units, users = await self.get_hierarchy(request_uuid=request_uuid)
-        existing_os2sync_org_units = {UUID(o["Uuid"]) for o in org_units}
-        existing_os2sync_users = {UUID(u["Uuid"]) for u in users}
-        return existing_os2sync_org_units, existing_os2sync_users
+        existing: Dict[str, Set[UUID]] = {"OUs": set(), "Users": set()}
+        async for kind, item in self.iter_hierarchy(request_uuid):
+            existing.setdefault(kind, set()).add(UUID(item["Uuid"]))
+        return existing["OUs"], existing["Users"]
+
+    async def post_user(self, user: Dict, force: bool = False) -> None:
+        """Post a user payload unless it is identical to the last payload written for the user."""
+        uuid = UUID(str(user["Uuid"]))
+        payload_fingerprint = self._fingerprint(user)
+        if not force and await self._unchanged(uuid, payload_fingerprint):
+            logger.info(f"User unchanged since last sync {uuid=}")
+            return
+        await self.os2sync_post("{BASE}/user", json=user)
+        await self._remember(uuid, payload_fingerprint)
 
-    async def update_user(self, user: User):
-        await self.os2sync_post("{BASE}/user", json=jsonable_encoder(user))
+    async def update_user(self, user: User, force: bool = False):
+        await self.post_user(jsonable_encoder(user), force=force)
 
-    async def update_users(self, uuid: UUID, users):
+    async def update_users(self, uuid: UUID, users, force: bool = False):
         if not users:
             # No fk-org user found. Delete user from fk-org
             logger.info(f"Deleting user {uuid=} from fk-org")
@@ -169,11 +362,13 @@ class OS2SyncClient:
                 await self.delete_user(user["Uuid"])
             else:
                 logger.info(f"Syncing user {user['Uuid']=} to fk-org")
-                await self.os2sync_post("{BASE}/user", json=user)
+                await self.post_user(user, force=force)
 
-    async def update_org_unit(self, uuid: UUID, org_unit: Optional[OrgUnit]):
+    async def update_org_unit(
+        self, uuid: UUID, org_unit: Optional[OrgUnit], force: bool = False
+    ):
         if org_unit:
-            await self.upsert_org_unit(org_unit)
+            await self.upsert_org_unit(org_unit, force=force)
         else:
             await self.delete_orgunit(uuid)
 
@@ -216,10 +411,13 @@ class WritableOS2SyncClient(OS2SyncClient):
 
 
 def get_os2sync_client(
-    settings: Settings, session: httpx.AsyncClient | None, dry_run: bool
+    settings: Settings,
+    session: httpx.AsyncClient | None,
+    dry_run: bool,
+    fingerprints: FingerprintStore | None = None,
 ) -> OS2SyncClient:
     return (
         ReadOnlyOS2SyncClient(settings, session)
         if dry_run
-        else WritableOS2SyncClient(settings, session)
+        else WritableOS2SyncClient(settings, session, fingerprints=fingerprints)
     )
@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+"""Stages of streaming pipelines with bounded memory.
+
+Stages are async iterators which are chained by passing one as the items of the next.
+Each stage holds a bounded number of items, so a slow stage holds back the ones before it.
+"""
+
+import asyncio
+from typing import Any
+from typing import AsyncGenerator
+from typing import AsyncIterable
+from typing import Awaitable
+from typing import Callable
+from typing import Iterable
+from typing import TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+async def _aiter(items: Iterable[T] | AsyncIterable[T]) -> AsyncGenerator[T, None]:
+    if not isinstance(items, AsyncIterable):
+        for item in items:
+            yield item
+        return
+    try:
+        async for item in items:
+            yield item
+    finally:
+        if isinstance(items, AsyncGenerator):
+            await items.aclose()
+
+
+async def map_unordered(
+    func: Callable[[T], Awaitable[R]],
+    items: Iterable[T] | AsyncIterable[T],
+    concurrency: int,
+) -> AsyncGenerator[R, None]:
+    """Yield func(item) for each item as they complete, running at most `concurrency` calls at a time.
+
+    Items are only read when a call completes. If a call fails the remaining calls are
+    cancelled and the error is raised.
+    """
+    iterator = _aiter(items)
+    pending: set[asyncio.Task[R]] = set()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    pending.add(asyncio.ensure_future(func(item)))
+            if not pending:
+                return
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        await iterator.aclose()
+
+
+async def iter_pages(
+    fetch: Callable[[Any], Awaitable[Any]],
+) -> AsyncGenerator[Any, None]:
+    """Yield each page of a query using cursor pagination.
+
+    The next page is fetched while the current page is processed.
+    """
+    page = asyncio.ensure_future(fetch(None))
+    try:
+        while True:
+            res = await page
+            cursor = res.page_info.next_cursor
+            if cursor is not None:
+                page = asyncio.ensure_future(fetch(cursor))
+            yield res
+            if cursor is None:
+                return
+    finally:
+        page.cancel()
@@ -38,5 +38,15 @@ class Session:
         logger.info("POST %r %r", args, json.dumps(kwargs))
         return self
 
+    def build_request(self, *args, **kwargs):
+        return args, kwargs
+
+    async def send(self, request, **kwargs):
+        logger.info("SEND %r %r", request, kwargs)
+        return self
+
+    async def aiter_bytes(self):
+        yield json.dumps(self.json()).encode()
+
     def json(self):
         return {"Result": {"OUs": [], "Users": []}}
@@ -89,7 +89,12 @@ async def _trigger_sync_fk_uuids_to_mo(dry_run: bool):
     )
     click.echo("Waiting for os2sync to build the hierarchy")
     h_uuid = await os2sync_client.trigger_hierarchy()
-    _, existing_users = await os2sync_client.get_hierarchy(h_uuid)
+    # Only keep the uuid and username of each user while streaming the hierarchy
+    existing_users = [
+        (UUID(u["Uuid"]), u["UserId"])
+        async for kind, u in os2sync_client.iter_hierarchy(h_uuid)
+        if kind == "Users"
+    ]
 
     # Ensure each fk-org user exists as an ITuser in MO
     click.echo(f"Found {len(existing_users)} users to check")
@@ -97,11 +102,11 @@ async def _trigger_sync_fk_uuids_to_mo(dry_run: bool):
         *[
             check_user_fk_org_it_accounts(
                 graphql_client=graphql_client,
-                fk_org_uuid=UUID(u["Uuid"]),
-                fk_org_username=u["UserId"],
+                fk_org_uuid=fk_org_uuid,
+                fk_org_username=fk_org_username,
                 dry_run=dry_run,
             )
-            for u in existing_users
+            for fk_org_uuid, fk_org_username in existing_users
         ]
     )
 
@@ -1,9 +1,11 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+from functools import lru_cache
 from typing import Any
 from typing import Dict
 from typing import Optional
+from typing import Tuple
 from uuid import UUID
 
 import structlog
@@ -35,6 +37,11 @@ class FieldRenderer:
         :param config: dictionary, usually `settings.templates`
         """
 
+        self._template_fields: Dict[str, Template] = {}
+        if not config:
+            # Every field renders its fallback, so Jinja isn't needed at all
+            return
+
         # Configure Jinja environment to raise exception on unknown variables
         self._env = Environment(undefined=StrictUndefined)
 
@@ -49,7 +56,7 @@ class FieldRenderer:
 
         # Instantiate all Jinja templates found in config, and map them to
         # their config key
-        self._template_fields: Dict[str, Template] = {
+        self._template_fields = {
             key: _load_template(key, source) for key, source in config.items()
         }
 
@@ -77,6 +84,19 @@ class FieldRenderer:
             ) from e
 
 
+@lru_cache(maxsize=16)
+def _compiled_field_renderer(config: Tuple[Tuple[str, str], ...]) -> FieldRenderer:
+    return FieldRenderer(dict(config))
+
+
+def get_field_renderer(config: Dict[str, str]) -> FieldRenderer:
+    """Return a field renderer for `config`, shared by every entity in the process.
+
+    The templates are parsed once per configuration instead of once per entity.
+    """
+    return _compiled_field_renderer(tuple(sorted(config.items())))
+
+
 class Entity:
     """Base class for modelling entities defined in the OS2Sync REST API"""
 
@@ -93,7 +113,7 @@ class Entity:
 
         self.context = context
         self.settings = settings
-        self.field_renderer = FieldRenderer(self.settings.templates)
+        self.field_renderer = get_field_renderer(self.settings.templates)
 
     def to_json(self) -> Dict[str, Any]:
         """Return a dictionary suitable for inclusion in a JSON payload."""
@@ -0,0 +1,313 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+"""Synthetic datasets and in-process fakes of the MO and OS2Sync APIs for benchmarks."""
+
+import json
+import re
+from collections import Counter
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from uuid import UUID
+from uuid import uuid4
+
+import httpx
+import respx
+
+FANOUT = 10
+AD_IT_SYSTEM = "Active Directory"
+
+
+@dataclass
+class Dataset:
+    """A tree of org_units and a person with an engagement and an AD account per org_unit"""
+
+    top_unit_uuid: UUID
+    organisation_uuid: UUID = field(default_factory=uuid4)
+    fk_itsystem_uuid: UUID = field(default_factory=uuid4)
+    parents: dict[UUID, UUID | None] = field(default_factory=dict)
+    ancestors: dict[UUID, list[UUID]] = field(default_factory=dict)
+    persons: dict[UUID, dict[str, Any]] = field(default_factory=dict)
+
+    @classmethod
+    def generate(cls, size: int, top_unit_uuid: UUID) -> "Dataset":
+        dataset = cls(top_unit_uuid=top_unit_uuid)
+        units = [top_unit_uuid] + [uuid4() for _ in range(size - 1)]
+        for i, unit in enumerate(units):
+            parent = units[(i - 1) // FANOUT] if i else None
+            dataset.parents[unit] = parent
+            dataset.ancestors[unit] = (
+                [parent] + dataset.ancestors[parent] if parent else []
+            )
+        for i in range(size):
+            dataset.persons[uuid4()] = {
+                "name": f"Person {i}",
+                "user_key": f"user{i}",
+                "unit": units[i],
+                "engagement_uuid": uuid4(),
+                "ad_guid": uuid4(),
+                "fk_org_uuid": uuid4(),
+            }
+        return dataset
+
+    def unit_fields(self, uuid: UUID) -> dict[str, Any]:
+        parent = self.parents[uuid]
+        return {
+            "uuid": str(uuid),
+            "name": f"Unit {uuid}",
+            "parent": {"uuid": str(parent), "itusers": []} if parent else None,
+            "ancestors": [{"uuid": str(a)} for a in self.ancestors[uuid]],
+            "unit_type": None,
+            "org_unit_level": None,
+            "org_unit_hierarchy_model": None,
+            "addresses": [],
+            "itusers": [],
+            "managers": [],
+            "kles": [],
+        }
+
+    def employee(self, uuid: UUID) -> dict[str, Any]:
+        person = self.persons[uuid]
+        return {
+            "uuid": str(uuid),
+            "name": person["name"],
+            "nickname": "",
+            "user_key": person["user_key"],
+            "cpr_no": "0101011234",
+        }
+
+
+def _page(items: list, limit: int, cursor: str | None) -> tuple[list, str | None]:
+    start = int(cursor or 0)
+    end = start + limit
+    return items[start:end], str(end) if end < len(items) else None
+
+
+class FakeMO:
+    """Answers MOs service API and GraphQL API from a dataset"""
+
+    def __init__(self, dataset: Dataset) -> None:
+        self.dataset = dataset
+        self.operations: Counter[str] = Counter()
+
+    def graphql(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        match = re.search(r"(?:query|mutation)\s+(\w+)", body["query"])
+        assert match, body["query"]
+        operation = match.group(1)
+        self.operations[operation] += 1
+        handler = getattr(self, f"gql_{operation}")
+        return httpx.Response(200, json={"data": handler(**body.get("variables", {}))})
+
+    def gql_ReadOrgUnitsBulk(self, uuids, **_):
+        objects = []
+        for uuid in map(UUID, uuids):
+            parent = self.dataset.parents[uuid]
+            unit = self.dataset.unit_fields(uuid)
+            unit.update(
+                all_itusers=[],
+                parent_itusers={"itusers": []} if parent else None,
+                manager_persons=[],
+                kles_with_aspects=[],
+            )
+            objects.append({"current": unit})
+        return {"org_units": {"objects": objects}}
+
+    def gql_read_orgunit(self, uuid, **_):
+        return {
+            "org_units": {
+                "objects": [{"current": self.dataset.unit_fields(UUID(uuid))}]
+            }
+        }
+
+    def gql_QueryAncestors(self, uuids, **_):
+        return {
+            "org_units": {
+                "objects": [
+                    {
+                        "uuid": uuid,
+                        "current": {
+                            "ancestors": [
+                                {"uuid": str(a)}
+                                for a in self.dataset.ancestors[UUID(uuid)]
+                            ],
+                            "org_unit_hierarchy_model": None,
+                            "itusers": [],
+                        },
+                    }
+                    for uuid in uuids
+                ]
+            }
+        }
+
+    def gql_GetITAccounts(self, uuids, **_):
+        return {
+            "employees": {
+                "objects": [
+                    {"uuid": uuid, "current": {"itusers": []}} for uuid in uuids
+                ]
+            }
+        }
+
+    def gql_ReadOrgUnitSubtreeUuids(self, root, limit, cursor=None, **_):
+        root = UUID(root)
+        subtree = [
+            u
+            for u, ancestors in self.dataset.ancestors.items()
+            if u == root or root in ancestors
+        ]
+        units, next_cursor = _page(subtree, limit, cursor)
+        return {
+            "org_units": {
+                "page_info": {"next_cursor": next_cursor},
+                "objects": [
+                    {
+                        "uuid": str(u),
+                        "current": {
+                            "parent": {"uuid": str(self.dataset.parents[u])}
+                            if self.dataset.parents[u]
+                            else None
+                        },
+                    }
+                    for u in units
+                ],
+            }
+        }
+
+    def gql_ReadAllEmployeeUuids(self, limit, cursor=None, **_):
+        persons, next_cursor = _page(list(self.dataset.persons), limit, cursor)
+        return {
+            "employees": {
+                "page_info": {"next_cursor": next_cursor},
+                "objects": [{"uuid": str(p)} for p in persons],
+            }
+        }
+
+    def gql_FindFKItsystem(self, **_):
+        return {
+            "itsystems": {"objects": [{"uuid": str(self.dataset.fk_itsystem_uuid)}]}
+        }
+
+    def gql_ReadUserITAccounts(self, uuid, **_):
+        person = self.dataset.persons[UUID(uuid)]
+        engagement = {
+            "validities": [
+                {
+                    "extension_1": None,
+                    "extension_3": None,
+                    "org_unit": [self.dataset.unit_fields(person["unit"])],
+                    "job_function": {"name": "Udvikler"},
+                }
+            ],
+            "startdates": [{"validity": {"from": "2020-01-01T00:00:00+01:00"}}],
+        }
+        current = {
+            "fk_org_uuids": [
+                {
+                    "uuid": str(uuid4()),
+                    "user_key": str(person["ad_guid"]),
+                    "external_id": str(person["fk_org_uuid"]),
+                }
+            ],
+            "itusers": [
+                {
+                    "user_key": person["user_key"],
+                    "external_id": str(person["ad_guid"]),
+                    "person": [
+                        {
+                            "cpr_number": "0101011234",
+                            "name": person["name"],
+                            "nickname": "",
+                        }
+                    ],
+                    "engagements_responses": {"objects": [engagement]},
+                    "email": [],
+                    "mobile": [],
+                    "landline": [],
+                }
+            ],
+        }
+        return {"employees": {"objects": [{"current": current}]}}
+
+    def organisation(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=[{"uuid": str(self.dataset.organisation_uuid)}])
+
+    def employee(self, request: httpx.Request, uuid: str) -> httpx.Response:
+        return httpx.Response(200, json=self.dataset.employee(UUID(uuid)))
+
+    def engagements(self, request: httpx.Request, uuid: str) -> httpx.Response:
+        person = self.dataset.persons[UUID(uuid)]
+        engagement = {
+            "uuid": str(person["engagement_uuid"]),
+            "org_unit": {"uuid": str(person["unit"])},
+            "job_function": {"name": "Udvikler"},
+            "is_primary": True,
+        }
+        return httpx.Response(200, json=[engagement])
+
+    def addresses(self, request: httpx.Request, uuid: str) -> httpx.Response:
+        return httpx.Response(200, json=[])
+
+    def mock(self, router: respx.Router, mo_url: str, auth_url: str) -> None:
+        router.post(auth_url, name="mo:token").mock(
+            return_value=httpx.Response(
+                200, json={"access_token": "token", "expires_in": 3600}
+            )
+        )
+        router.post(url__regex=rf"{mo_url}/graphql/v\d+", name="mo:graphql").mock(
+            side_effect=self.graphql
+        )
+        service = f"{mo_url}/service"
+        router.get(f"{service}/o/", name="mo:organisation").mock(
+            side_effect=self.organisation
+        )
+        router.get(
+            url__regex=rf"{service}/e/(?P<uuid>[^/]+)/details/engagement",
+            name="mo:engagements",
+        ).mock(side_effect=self.engagements)
+        router.get(
+            url__regex=rf"{service}/e/(?P<uuid>[^/]+)/details/address",
+            name="mo:addresses",
+        ).mock(side_effect=self.addresses)
+        router.get(
+            url__regex=rf"{service}/e/(?P<uuid>[^/]+)/$", name="mo:employee"
+        ).mock(side_effect=self.employee)
+
+
+class FakeOS2Sync:
+    """Accepts every write and starts out with an empty fk-org"""
+
+    def __init__(self) -> None:
+        self.hierarchy_uuid = uuid4()
+
+    def mock(self, router: respx.Router, api_url: str) -> None:
+        router.get(f"{api_url}/hierarchy", name="os2sync:trigger_hierarchy").mock(
+            return_value=httpx.Response(200, text=str(self.hierarchy_uuid))
+        )
+        router.get(
+            f"{api_url}/hierarchy/{self.hierarchy_uuid}", name="os2sync:hierarchy"
+        ).mock(
+            return_value=httpx.Response(200, json={"Result": {"OUs": [], "Users": []}})
+        )
+        router.get(url__regex=rf"{api_url}/orgUnit/", name="os2sync:get_org_unit").mock(
+            return_value=httpx.Response(404)
+        )
+        router.get(url__regex=rf"{api_url}/user/", name="os2sync:get_user").mock(
+            return_value=httpx.Response(404)
+        )
+        router.post(f"{api_url}/orgUnit/", name="os2sync:post_org_unit").mock(
+            return_value=httpx.Response(200)
+        )
+        router.post(f"{api_url}/user", name="os2sync:post_user").mock(
+            return_value=httpx.Response(200)
+        )
+        router.post(
+            url__regex=rf"{api_url}/(orgUnit|user)/passiver/", name="os2sync:passivate"
+        ).mock(return_value=httpx.Response(200))
+        router.delete(url__regex=rf"{api_url}/user/", name="os2sync:delete_user").mock(
+            return_value=httpx.Response(200)
+        )
+        router.delete(
+            url__regex=rf"{api_url}/orgUnit/", name="os2sync:delete_org_unit"
+        ).mock(return_value=httpx.Response(200))
@@ -0,0 +1,172 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+"""Benchmarks of the full syncs against in-process fakes of MO and OS2Sync.
+
+The benchmarks are excluded from the normal test run. Run them with eg.:
+
+    poetry run pytest -m benchmark -s tests/benchmark -k 1000
+
+Each benchmark prints wall time, requests per endpoint, peak RSS and throughput.
+Set BENCHMARK_OUTPUT to a file path to also append the results as JSON lines.
+Peak RSS is the peak of the whole process, so run one size per invocation to compare it.
+"""
+
+import json
+import os
+import resource
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from unittest.mock import patch
+
+import httpx
+import pytest
+import respx
+from gql import Client
+from gql.transport.httpx import HTTPXAsyncTransport
+
+from os2sync_export.__main__ import cleanup_duplicates
+from os2sync_export.__main__ import main
+from os2sync_export.__main__ import main_new
+from os2sync_export.autogenerated_graphql_client import GraphQLClient
+from os2sync_export.config import Settings
+from os2sync_export.os2mo import close_mo_session
+from os2sync_export.os2mo import relevance_cache_scope
+from os2sync_export.os2sync import WritableOS2SyncClient
+from tests.benchmark.fakes import AD_IT_SYSTEM
+from tests.benchmark.fakes import Dataset
+from tests.benchmark.fakes import FakeMO
+from tests.benchmark.fakes import FakeOS2Sync
+
+pytestmark = pytest.mark.benchmark
+
+SIZES = [1_000, 10_000, 50_000]
+OS2SYNC_API_URL = "http://os2sync/api"
+
+
+@pytest.fixture
+def settings(set_settings) -> Settings:
+    return set_settings(
+        os2sync_api_url=OS2SYNC_API_URL, it_system_user_keys=[AD_IT_SYSTEM]
+    )
+
+
+@pytest.fixture
+def environment(settings: Settings):
+    """Set up fakes of MO and OS2Sync and return a function running a benchmark on a dataset"""
+
+    async def run(
+        name: str,
+        size: int,
+        sync: Callable[..., Awaitable[Any]],
+    ) -> dict[str, Any]:
+        dataset = Dataset.generate(size, top_unit_uuid=settings.top_unit_uuid)
+        fake_mo = FakeMO(dataset)
+        fastramqpi = settings.fastramqpi
+        with respx.mock(assert_all_called=False) as router:
+            fake_mo.mock(
+                router,
+                mo_url=fastramqpi.mo_url,
+                auth_url=f"{fastramqpi.auth_server}/realms/{fastramqpi.auth_realm}/protocol/openid-connect/token",
+            )
+            FakeOS2Sync().mock(router, api_url=OS2SYNC_API_URL)
+
+            with patch(
+                "os2sync_export.os2mo.get_os2sync_settings", return_value=settings
+            ):
+                async with clients(settings) as (graphql_session, graphql_client):
+                    os2sync_client = WritableOS2SyncClient(settings=settings)
+                    start = time.perf_counter()
+                    await sync(
+                        settings=settings,
+                        graphql_session=graphql_session,
+                        graphql_client=graphql_client,
+                        os2sync_client=os2sync_client,
+                    )
+                    wall_time = time.perf_counter() - start
+                    await os2sync_client.session.aclose()
+                await close_mo_session()
+
+            requests = Counter(
+                {route.name: route.call_count for route in router.routes}
+            )
+            requests.update({f"graphql:{k}": v for k, v in fake_mo.operations.items()})
+
+        result = {
+            "benchmark": name,
+            "size": size,
+            "wall_time_seconds": round(wall_time, 3),
+            "objects_per_second": round(2 * size / wall_time, 1),
+            "peak_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+            ),
+            "requests": {k: v for k, v in sorted(requests.items()) if v},
+        }
+        report(result)
+        return result
+
+    return run
+
+
+@asynccontextmanager
+async def clients(settings: Settings) -> AsyncIterator[tuple[Any, GraphQLClient]]:
+    """The legacy GraphQL session and the codegen client, both talking to the fake MO"""
+    url = f"{settings.fastramqpi.mo_url}/graphql/v25"
+    client = Client(transport=HTTPXAsyncTransport(url=url), execute_timeout=None)
+    async with client as graphql_session, GraphQLClient(
+        url=url, http_client=httpx.AsyncClient()
+    ) as graphql_client:
+        yield graphql_session, graphql_client
+
+
+def report(result: dict[str, Any]) -> None:
+    print(
+        f"\n{result['benchmark']} size={result['size']}: "
+        f"{result['wall_time_seconds']}s, {result['objects_per_second']} objects/s, "
+        f"peak RSS {result['peak_rss_mb']} MB"
+    )
+    for endpoint, count in result["requests"].items():
+        print(f"    {endpoint}: {count}")
+    if output := os.environ.get("BENCHMARK_OUTPUT"):
+        with open(output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+async def legacy_main(**kwargs) -> None:
+    with relevance_cache_scope():
+        await main(**kwargs)
+
+
+async def new_main(graphql_session, **kwargs) -> None:
+    await main_new(**kwargs)
+
+
+async def legacy_cleanup(**kwargs) -> None:
+    with relevance_cache_scope():
+        await cleanup_duplicates(**kwargs)
+
+
+@pytest.mark.parametrize("size", SIZES)
+async def test_benchmark_main(environment, size: int) -> None:
+    result = await environment("main", size, legacy_main)
+    assert result["requests"]["os2sync:post_org_unit"] == size
+    assert result["requests"]["os2sync:post_user"] == size
+
+
+@pytest.mark.parametrize("size", SIZES)
+async def test_benchmark_main_new(environment, size: int) -> None:
+    result = await environment("main_new", size, new_main)
+    assert result["requests"]["os2sync:post_org_unit"] == size
+    assert result["requests"]["os2sync:post_user"] == size
+
+
+@pytest.mark.parametrize("size", SIZES)
+async def test_benchmark_cleanup_duplicates(environment, size: int) -> None:
+    result = await environment("cleanup_duplicates", size, legacy_cleanup)
+    # The top unit is never passivated
+    assert result["requests"]["os2sync:passivate"] == 2 * size - 1
@@ -0,0 +1,68 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+"""Micro-benchmark of converting a MO employee to a fk-org user.
+
+Compares building a field renderer for every entity, as before, with the renderer shared
+by every entity in the process. Run it with eg.:
+
+    poetry run pytest -m benchmark -s tests/benchmark/test_templates.py
+"""
+
+import timeit
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+
+from os2sync_export.config import Settings
+from os2sync_export.templates import FieldRenderer
+from os2sync_export.templates import Person
+from os2sync_export.templates import User
+from tests.helpers import NICKNAME_TEMPLATE
+from tests.helpers import MoEmployeeMixin
+
+pytestmark = pytest.mark.benchmark
+
+CONVERSIONS = 2_000
+TEMPLATES = {
+    "none": {},
+    "configured": {
+        "person.name": NICKNAME_TEMPLATE,
+        "person.user_id": "{{ user_key }}",
+    },
+}
+
+
+def convert(employee: dict[str, Any], settings: Settings) -> dict[str, Any]:
+    """Convert an employee like `get_sts_user_raw`"""
+    user = User(
+        dict(
+            uuid=employee["uuid"],
+            candidate_user_id=None,
+            person=Person(dict(employee), settings=settings),
+        ),
+        settings=settings,
+    )
+    return user.to_json()
+
+
+@pytest.mark.parametrize("templates", TEMPLATES)
+def test_benchmark_user_conversion(set_settings, templates: str) -> None:
+    settings = set_settings(templates=TEMPLATES[templates])
+    employee = MoEmployeeMixin().mock_employee(nickname=True)
+
+    def per_user_microseconds() -> float:
+        seconds = timeit.timeit(lambda: convert(employee, settings), number=CONVERSIONS)
+        return round(seconds / CONVERSIONS * 1e6, 1)
+
+    with patch("os2sync_export.templates.get_field_renderer", FieldRenderer):
+        uncached = per_user_microseconds()
+    cached = per_user_microseconds()
+
+    print(
+        f"\nuser conversion templates={templates}: "
+        f"{uncached} µs/user with a renderer per entity, {cached} µs/user shared"
+    )
+    if TEMPLATES[templates]:
+        assert cached < uncached
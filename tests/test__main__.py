@@ -1,11 +1,29 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
 from unittest.mock import AsyncMock
+from unittest.mock import call
+from unittest.mock import patch
 from uuid import UUID
 from uuid import uuid4
 
+import httpx
+import pytest
+from structlog.testing import capture_logs
+from tenacity import wait_none
+
 from os2sync_export.__main__ import cleanup_duplicate_engagements
+from os2sync_export.__main__ import group_by_depth
+from os2sync_export.__main__ import main_new
+from os2sync_export.__main__ import report_write_failures
+from os2sync_export.__main__ import upsert_org_units
+from os2sync_export.__main__ import write_all
+from os2sync_export.exceptions import DuplicatedITUserError
+from os2sync_export.os2sync_models import OrgUnit
+from os2sync_export.os2sync_models import Person
+from os2sync_export.os2sync_models import Position
+from os2sync_export.os2sync_models import User
 
 
 async def test_cleanup_duplicate_engagements(
@@ -46,3 +64,276 @@ async def test_cleanup_duplicate_engagements(
     )
     os2sync_client.get_hierarchy.assert_called_once()
     os2sync_client.delete_user.assert_called_with(UUID(user_fk_org_uuid))
+
+
+def test_group_by_depth():
+    root = OrgUnit(Uuid=uuid4(), Name="root", ParentOrgUnitUuid=None)
+    child = OrgUnit(Uuid=uuid4(), Name="child", ParentOrgUnitUuid=root.Uuid)
+    grandchild = OrgUnit(Uuid=uuid4(), Name="grandchild", ParentOrgUnitUuid=child.Uuid)
+    # A unit with a parent that is not synced is placed at the top level
+    orphan = OrgUnit(Uuid=uuid4(), Name="orphan", ParentOrgUnitUuid=uuid4())
+    parents = {o.Uuid: o.ParentOrgUnitUuid for o in (grandchild, orphan, child, root)}
+
+    assert group_by_depth(parents) == [
+        [orphan.Uuid, root.Uuid],
+        [child.Uuid],
+        [grandchild.Uuid],
+    ]
+
+
+async def test_upsert_org_units_parents_first(mock_settings, os2sync_client):
+    root = OrgUnit(Uuid=uuid4(), Name="root", ParentOrgUnitUuid=None)
+    children = [
+        OrgUnit(Uuid=uuid4(), Name=f"child {i}", ParentOrgUnitUuid=root.Uuid)
+        for i in range(5)
+    ]
+    org_units = {o.Uuid: o for o in children + [root]}
+
+    await upsert_org_units(mock_settings, os2sync_client, org_units)
+
+    upserted = [c.args[0] for c in os2sync_client.upsert_org_unit.await_args_list]
+    assert upserted[0] == root
+    assert set(o.Uuid for o in upserted[1:]) == set(o.Uuid for o in children)
+
+
+async def test_upsert_org_units_snapshot(mock_settings, os2sync_client):
+    root = OrgUnit(Uuid=uuid4(), Name="root", ParentOrgUnitUuid=None)
+    child = OrgUnit(Uuid=uuid4(), Name="child", ParentOrgUnitUuid=root.Uuid)
+    snapshot = {root.Uuid: root}
+
+    await upsert_org_units(
+        mock_settings, os2sync_client, {root.Uuid: root, child.Uuid: child}, snapshot
+    )
+
+    os2sync_client.upsert_org_unit.assert_not_awaited()
+    assert os2sync_client.upsert_org_unit_from_snapshot.await_args_list == [
+        call(root, snapshot),
+        call(child, snapshot),
+    ]
+
+
+@patch("os2sync_export.__main__.write_retry_wait", wait_none())
+async def test_write_all_retries_and_collects_failures(mock_settings):
+    request = httpx.Request("POST", "http://os2sync/api/user")
+    unavailable = httpx.HTTPStatusError(
+        "unavailable", request=request, response=httpx.Response(503, request=request)
+    )
+    invalid = httpx.HTTPStatusError(
+        "invalid", request=request, response=httpx.Response(400, request=request)
+    )
+    flaky, broken, fine = uuid4(), uuid4(), uuid4()
+    writes = {
+        flaky: AsyncMock(side_effect=[unavailable, None]),
+        broken: AsyncMock(side_effect=invalid),
+        fine: AsyncMock(),
+    }
+
+    failures = await write_all(mock_settings, "post_user", writes.items())
+
+    assert failures == {broken: invalid}
+    assert writes[flaky].await_count == 2
+    # Errors that won't go away by retrying are not retried
+    assert writes[broken].await_count == 1
+    assert writes[fine].await_count == 1
+
+
+async def test_write_failures_logged_once(mock_settings):
+    broken = uuid4()
+    writes = {broken: AsyncMock(side_effect=ValueError("invalid"))}
+
+    with capture_logs() as cap_log:
+        failures = await write_all(mock_settings, "post_user", writes.items())
+        report_write_failures({"post_user": failures})
+
+    errors = [log for log in cap_log if log["log_level"] == "error"]
+    assert [log.get("uuid") for log in errors] == [broken, None]
+    assert errors[1]["post_user"] == 1
+
+
+def make_user(uuid) -> User:
+    return User(
+        Uuid=uuid,
+        UserId="bsg",
+        Person=Person(Name="Brian"),
+        Positions=[Position(Name="tester", OrgUnitUuid=uuid4())],
+        PhoneNumber=None,
+        Landline=None,
+        Email=None,
+    )
+
+
+@patch("os2sync_export.__main__.sync_mo_user_to_fk_org")
+@patch("os2sync_export.__main__.sync_orgunit")
+@patch("os2sync_export.__main__.read_all_person_uuids")
+@patch("os2sync_export.__main__.read_org_unit_subtree_parents")
+async def test_main_new(
+    read_units_mock,
+    read_persons_mock,
+    sync_orgunit_mock,
+    sync_user_mock,
+    set_settings,
+    mock_graphql_client,
+    os2sync_client,
+):
+    settings = set_settings(autowash=True)
+    root = settings.top_unit_uuid
+    child = uuid4()
+    read_units_mock.return_value = {child: root, root: None}
+    sync_orgunit_mock.side_effect = lambda uuid, **_: OrgUnit(Uuid=uuid, Name="")
+
+    person, deleted_fk_user = uuid4(), uuid4()
+    read_persons_mock.return_value = {person}
+    sync_user_mock.return_value = ([make_user(person)], {deleted_fk_user})
+
+    stale_unit, stale_user = uuid4(), uuid4()
+    os2sync_client.get_existing_uuids.return_value = (
+        {root, stale_unit},
+        {person, stale_user, deleted_fk_user},
+    )
+
+    await main_new(settings, mock_graphql_client, os2sync_client, force=True)
+
+    # Payloads are written even if unchanged since the last write
+    assert all(c.kwargs["force"] for c in sync_orgunit_mock.await_args_list)
+    assert sync_user_mock.await_args.kwargs["force"]
+    # Parents are synced before their children
+    assert [c.args[0] for c in sync_orgunit_mock.await_args_list] == [root, child]
+    os2sync_client.delete_orgunit.assert_awaited_once_with(stale_unit)
+    sync_user_mock.assert_awaited_once()
+    os2sync_client.delete_user.assert_awaited_once_with(stale_user)
+
+
+@patch("os2sync_export.__main__.sync_mo_user_to_fk_org")
+@patch("os2sync_export.__main__.sync_orgunit")
+@patch("os2sync_export.__main__.read_all_person_uuids")
+@patch("os2sync_export.__main__.read_org_unit_subtree_parents")
+async def test_main_new_failed_person_skips_deletion(
+    read_units_mock,
+    read_persons_mock,
+    sync_orgunit_mock,
+    sync_user_mock,
+    mock_settings,
+    mock_graphql_client,
+    os2sync_client,
+):
+    read_units_mock.return_value = {mock_settings.top_unit_uuid: None}
+    person, failing_person = uuid4(), uuid4()
+    read_persons_mock.return_value = {person, failing_person}
+
+    async def sync_user(uuid, **_):
+        if uuid == failing_person:
+            raise DuplicatedITUserError
+        return [make_user(uuid)], set()
+
+    sync_user_mock.side_effect = sync_user
+    os2sync_client.get_existing_uuids.return_value = (set(), {uuid4()})
+
+    await main_new(mock_settings, mock_graphql_client, os2sync_client)
+
+    os2sync_client.delete_user.assert_not_called()
+
+
+@patch("os2sync_export.__main__.sync_mo_user_to_fk_org")
+@patch("os2sync_export.__main__.sync_orgunit")
+@patch("os2sync_export.__main__.read_all_person_uuids")
+@patch("os2sync_export.__main__.read_org_unit_subtree_parents")
+async def test_main_new_failed_org_unit_skips_deletion(
+    read_units_mock,
+    read_persons_mock,
+    sync_orgunit_mock,
+    sync_user_mock,
+    set_settings,
+    mock_graphql_client,
+    os2sync_client,
+):
+    settings = set_settings(autowash=True)
+    root = settings.top_unit_uuid
+    failing_unit = uuid4()
+    read_units_mock.return_value = {root: None, failing_unit: root}
+
+    async def sync_unit(uuid, **_):
+        if uuid == failing_unit:
+            raise ValueError("Boom")
+        return OrgUnit(Uuid=uuid, Name="")
+
+    sync_orgunit_mock.side_effect = sync_unit
+    person = uuid4()
+    read_persons_mock.return_value = {person}
+    sync_user_mock.return_value = ([make_user(person)], set())
+    stale_user = uuid4()
+    os2sync_client.get_existing_uuids.return_value = (
+        {root, failing_unit},
+        {person, stale_user},
+    )
+
+    await main_new(settings, mock_graphql_client, os2sync_client)
+
+    # The failed org_unit is not deleted, and the users are still synced
+    os2sync_client.delete_orgunit.assert_not_called()
+    sync_user_mock.assert_awaited_once()
+    os2sync_client.delete_user.assert_awaited_once_with(stale_user)
+
+
+@patch("os2sync_export.__main__.sync_mo_user_to_fk_org")
+@patch("os2sync_export.__main__.sync_orgunit")
+@patch("os2sync_export.__main__.read_all_person_uuids")
+@patch("os2sync_export.__main__.read_org_unit_subtree_parents")
+async def test_main_new_failed_delete_continues(
+    read_units_mock,
+    read_persons_mock,
+    sync_orgunit_mock,
+    sync_user_mock,
+    set_settings,
+    mock_graphql_client,
+    os2sync_client,
+):
+    settings = set_settings(autowash=True)
+    root = settings.top_unit_uuid
+    read_units_mock.return_value = {root: None}
+    sync_orgunit_mock.side_effect = lambda uuid, **_: OrgUnit(Uuid=uuid, Name="")
+    person = uuid4()
+    read_persons_mock.return_value = {person}
+    sync_user_mock.return_value = ([make_user(person)], set())
+
+    stale_units, stale_user = {uuid4(), uuid4()}, uuid4()
+    os2sync_client.get_existing_uuids.return_value = (
+        {root, *stale_units},
+        {person, stale_user},
+    )
+    os2sync_client.delete_orgunit.side_effect = ValueError("Boom")
+
+    with capture_logs() as cap_log:
+        await main_new(settings, mock_graphql_client, os2sync_client)
+
+    assert os2sync_client.delete_orgunit.await_count == 2
+    os2sync_client.delete_user.assert_awaited_once_with(stale_user)
+    errors = [log for log in cap_log if log["log_level"] == "error"]
+    assert errors[-1]["delete_orgunit"] == 2
+
+
+@patch("os2sync_export.__main__.read_org_unit_subtree_parents")
+async def test_main_new_cancels_hierarchy(
+    read_units_mock, mock_settings, mock_graphql_client, os2sync_client
+):
+    """The hierarchy is fetched in the background and cancelled if the sync fails"""
+    fetching = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def get_existing_uuids(request_uuid):
+        fetching.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def read_units(graphql_client, **_):
+        await fetching.wait()
+        raise ValueError("Boom")
+
+    os2sync_client.get_existing_uuids.side_effect = get_existing_uuids
+    read_units_mock.side_effect = read_units
+
+    with pytest.raises(ValueError):
+        await main_new(mock_settings, mock_graphql_client, os2sync_client)
+    await asyncio.wait_for(cancelled.wait(), 1)
@@ -367,8 +367,7 @@ async def patched_session_get(
 
 @patch("os2sync_export.os2mo.os2mo_get", patched_session_get)
 @patch.object(os2mo, "engagements_to_user", mock_engagements_to_user)
-@patch.object(os2mo, "org_unit_uuids", return_value={})
-async def test_mo_client_default(self, graphql_session):
+async def test_mo_client_default(graphql_session):
     expected = {
         "Email": "solveigk@kolding.dk",
         "Landline": None,
@@ -0,0 +1,65 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import patch
+
+import pytest
+
+from os2sync_export import batching
+
+
+async def test_load_batches_concurrent_loads():
+    load_many = AsyncMock(side_effect=lambda keys: {k: k * 2 for k in keys if k != 3})
+    scope = object()
+
+    results = await asyncio.gather(
+        *(batching.load("test", scope, k, load_many) for k in (1, 2, 2, 3))
+    )
+
+    assert results == [2, 4, 4, None]
+    load_many.assert_awaited_once_with([1, 2, 3])
+
+
+async def test_load_separate_scopes_and_iterations():
+    load_many = AsyncMock(side_effect=lambda keys: {k: k for k in keys})
+
+    await asyncio.gather(
+        batching.load("test", object(), 1, load_many),
+        batching.load("test", object(), 2, load_many),
+    )
+    assert load_many.await_count == 2
+
+    scope = object()
+    await batching.load("test", scope, 1, load_many)
+    await batching.load("test", scope, 2, load_many)
+    assert load_many.await_count == 4
+
+
+@patch("os2sync_export.batching.MAX_BATCH_SIZE", 2)
+async def test_load_max_batch_size():
+    load_many = AsyncMock(side_effect=lambda keys: {k: k for k in keys})
+    scope = object()
+
+    results = await asyncio.gather(
+        *(batching.load("test", scope, k, load_many) for k in range(5))
+    )
+
+    assert results == list(range(5))
+    assert [c.args[0] for c in load_many.await_args_list] == [[0, 1], [2, 3], [4]]
+
+
+async def test_load_failure_raised_to_every_caller():
+    load_many = AsyncMock(side_effect=ValueError("Boom"))
+    scope = object()
+
+    results = await asyncio.gather(
+        *(batching.load("test", scope, k, load_many) for k in range(3)),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(r, ValueError) for r in results)
+    load_many.assert_awaited_once()
+    with pytest.raises(ValueError):
+        await batching.load("test", scope, 1, load_many)
@@ -0,0 +1,110 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from tenacity import stop_after_attempt
+
+from os2sync_export.coalescing import EventCoalescer
+from os2sync_export.coalescing import events_coalesced
+from os2sync_export.coalescing import send_events
+
+
+def mock_graphql_client() -> AsyncMock:
+    graphql_client = AsyncMock()
+    graphql_client.get_data = MagicMock()
+    return graphql_client
+
+
+def sent_events(graphql_client: AsyncMock) -> list[tuple[str, str]]:
+    """The events sent with event_send or in batches"""
+    events = [
+        (c.kwargs["routing_key"], c.kwargs["subject"])
+        for c in graphql_client.event_send.await_args_list
+    ]
+    for c in graphql_client.execute.await_args_list:
+        variables = c.kwargs["variables"]
+        assert variables["namespace"] == "os2sync_export"
+        events.extend(
+            (variables[f"routing_key_{i}"], variables[f"subject_{i}"])
+            for i in range(len(variables) // 2)
+        )
+    return events
+
+
+async def test_send_events_in_batches():
+    graphql_client = mock_graphql_client()
+    events = [("person", str(i)) for i in range(201)]
+
+    await send_events(graphql_client, events)
+
+    assert graphql_client.execute.await_count == 2
+    graphql_client.event_send.assert_awaited_once()
+    assert sorted(sent_events(graphql_client)) == sorted(events)
+
+
+async def test_coalesce_duplicates():
+    graphql_client = mock_graphql_client()
+    coalescer = EventCoalescer(window=0.01)
+    before = events_coalesced.labels("person")._value.get()
+
+    adding = asyncio.gather(
+        *(coalescer.add(graphql_client, [("person", "a")]) for _ in range(3)),
+        coalescer.add(graphql_client, [("org_unit", "a"), ("person", "b")]),
+    )
+    await asyncio.sleep(0)
+    assert sent_events(graphql_client) == []
+    # Adding events waits until they are sent
+    await adding
+
+    assert sent_events(graphql_client) == [
+        ("person", "a"),
+        ("org_unit", "a"),
+        ("person", "b"),
+    ]
+    assert events_coalesced.labels("person")._value.get() - before == 2
+
+    # Events added after the pending event was sent are sent again
+    await coalescer.add(graphql_client, [("person", "a")])
+    graphql_client.event_send.assert_awaited_once_with(
+        namespace="os2sync_export", routing_key="person", subject="a"
+    )
+
+
+@patch(
+    "os2sync_export.coalescing.stop_after_attempt", return_value=stop_after_attempt(1)
+)
+async def test_failed_send_raises_in_handlers(_):
+    graphql_client = mock_graphql_client()
+    graphql_client.event_send.side_effect = ValueError("Boom")
+    coalescer = EventCoalescer(window=0.01)
+
+    results = await asyncio.gather(
+        coalescer.add(graphql_client, [("person", "a")]),
+        coalescer.add(graphql_client, [("person", "a")]),
+        return_exceptions=True,
+    )
+
+    # Both events are redelivered, and the event is sent again when they are handled
+    assert [type(r) for r in results] == [ValueError, ValueError]
+    graphql_client.event_send.side_effect = None
+    await coalescer.add(graphql_client, [("person", "a")])
+    assert graphql_client.event_send.await_count == 2
+
+
+async def test_close_sends_pending_events():
+    graphql_client = mock_graphql_client()
+    coalescer = EventCoalescer(window=60)
+
+    adding = asyncio.ensure_future(coalescer.add(graphql_client, [("person", "a")]))
+    await asyncio.sleep(0)
+    await coalescer.close()
+    await adding
+
+    graphql_client.event_send.assert_awaited_once_with(
+        namespace="os2sync_export", routing_key="person", subject="a"
+    )
+    assert coalescer.pending == {}
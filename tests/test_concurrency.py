@@ -0,0 +1,106 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+
+import httpx
+import pytest
+from gql.transport.exceptions import TransportServerError
+
+from os2sync_export.concurrency import MIN_WINDOW
+from os2sync_export.concurrency import AdaptiveConcurrency
+from os2sync_export.concurrency import is_overloaded
+
+
+def status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "http://mo")
+    return httpx.HTTPStatusError(
+        "error", request=request, response=httpx.Response(status_code, request=request)
+    )
+
+
+@pytest.mark.parametrize(
+    "error,expected",
+    [
+        (status_error(429), True),
+        (status_error(503), True),
+        (status_error(404), False),
+        (TransportServerError("error", 502), True),
+        (TransportServerError("error", 400), False),
+        (httpx.ReadTimeout("timeout"), True),
+        (ValueError(), False),
+    ],
+)
+def test_is_overloaded(error, expected):
+    assert is_overloaded(error) == expected
+
+
+def test_increase_while_latency_is_flat():
+    limiter = AdaptiveConcurrency("test", initial=2, maximum=3)
+    for _ in range(3 * MIN_WINDOW):
+        limiter._observe(limiter.generation, 0.1, overloaded=False)
+    assert limiter.limit == 3
+
+
+def test_decrease_when_latency_rises():
+    limiter = AdaptiveConcurrency("test", initial=8, maximum=10)
+    for _ in range(MIN_WINDOW):
+        limiter._observe(limiter.generation, 0.1, overloaded=False)
+    assert limiter.limit == 9
+    for _ in range(MIN_WINDOW):
+        limiter._observe(limiter.generation, 1.0, overloaded=False)
+    assert limiter.limit == 4
+
+
+def test_decrease_once_per_generation():
+    limiter = AdaptiveConcurrency("test", initial=8, maximum=10)
+    generation = limiter.generation
+    limiter._observe(generation, 0.1, overloaded=True)
+    limiter._observe(generation, 0.1, overloaded=True)
+    assert limiter.limit == 4
+
+
+async def test_run_limits_concurrency():
+    limiter = AdaptiveConcurrency("test", initial=3, maximum=3)
+    in_flight = 0
+    max_in_flight = 0
+
+    async def call():
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return in_flight
+
+    results = await asyncio.gather(*(limiter.run(call) for _ in range(20)))
+    assert len(results) == 20
+    assert max_in_flight == 3
+
+
+async def test_run_retries_when_overloaded():
+    limiter = AdaptiveConcurrency("test", initial=4, maximum=4, backoff=0)
+    attempts = 0
+
+    async def call():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise status_error(429)
+        return "ok"
+
+    assert await limiter.run(call) == "ok"
+    assert attempts == 2
+    assert limiter.limit == 2
+
+
+async def test_run_raises_other_errors():
+    limiter = AdaptiveConcurrency("test", initial=4, maximum=4, backoff=0)
+
+    async def call():
+        raise status_error(404)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await limiter.run(call)
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
@@ -0,0 +1,124 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+import pytest
+
+from os2sync_export.fingerprints import fingerprint
+from os2sync_export.os2sync import WritableOS2SyncClient
+from os2sync_export.os2sync import get_os2sync_client
+from os2sync_export.os2sync_models import OrgUnit
+from tests.helpers import dummy_settings
+
+
+def test_fingerprint_ignores_order():
+    tasks = [uuid4() for _ in range(5)]
+    a = OrgUnit(Uuid=uuid4(), Name="test", ParentOrgUnitUuid=None, Tasks=set(tasks))
+    b = a.copy(update={"Tasks": set(reversed(tasks))})
+    assert fingerprint(a.json()) == fingerprint(b.json())
+    assert fingerprint({"a": 1, "b": [1, 2]}) == fingerprint({"b": [2, 1], "a": 1})
+
+
+def test_fingerprint_changes():
+    org_unit = OrgUnit(Uuid=uuid4(), Name="test", ParentOrgUnitUuid=None)
+    changed = org_unit.copy(update={"Name": "changed"})
+    assert fingerprint(org_unit.json()) != fingerprint(changed.json())
+
+
+@pytest.fixture
+def fingerprints():
+    store = AsyncMock()
+    store.get.return_value = None
+    return store
+
+
+@pytest.fixture
+def os2sync_client(fingerprints):
+    client = WritableOS2SyncClient(settings=dummy_settings, fingerprints=fingerprints)
+    client.os2sync_post = AsyncMock()
+    client.os2sync_delete = AsyncMock()
+    client.os2sync_get_org_unit = AsyncMock(side_effect=KeyError)
+    return client
+
+
+@pytest.mark.asyncio
+async def test_upsert_org_unit_unchanged(os2sync_client, fingerprints):
+    org_unit = OrgUnit(Uuid=uuid4(), Name="test", ParentOrgUnitUuid=None)
+
+    await os2sync_client.upsert_org_unit(org_unit)
+    fingerprints.set.assert_awaited_once_with(
+        org_unit.Uuid, fingerprint(org_unit.json())
+    )
+    fingerprints.get.return_value = fingerprint(org_unit.json())
+    await os2sync_client.upsert_org_unit(org_unit)
+
+    os2sync_client.os2sync_post.assert_awaited_once()
+    os2sync_client.os2sync_get_org_unit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_upsert_org_unit_force(os2sync_client, fingerprints):
+    org_unit = OrgUnit(Uuid=uuid4(), Name="test", ParentOrgUnitUuid=None)
+    fingerprints.get.return_value = fingerprint(org_unit.json())
+
+    await os2sync_client.upsert_org_unit(org_unit, force=True)
+
+    os2sync_client.os2sync_post.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_update_users_unchanged(os2sync_client, fingerprints):
+    user = {
+        "Uuid": str(uuid4()),
+        "UserId": "bsg",
+        "Positions": [{"OrgUnitUuid": str(uuid4()), "Name": "Udvikler"}],
+        "Person": {"Name": "Brian Storm Graversen", "Cpr": None},
+    }
+    fingerprints.get.return_value = fingerprint(user)
+
+    await os2sync_client.update_users(user["Uuid"], [user])
+    os2sync_client.os2sync_post.assert_not_awaited()
+
+    await os2sync_client.update_users(user["Uuid"], [user], force=True)
+    os2sync_client.os2sync_post.assert_awaited_once_with("{BASE}/user", json=user)
+
+
+@pytest.mark.asyncio
+async def test_delete_user_forgets_fingerprint(os2sync_client, fingerprints):
+    uuid = uuid4()
+    await os2sync_client.delete_user(uuid)
+    fingerprints.delete.assert_awaited_once_with(uuid)
+
+
+@pytest.mark.asyncio
+async def test_failed_upsert_from_snapshot_is_not_remembered(
+    os2sync_client, fingerprints
+):
+    stored: dict = {}
+    fingerprints.get.side_effect = stored.get
+    fingerprints.set.side_effect = stored.__setitem__
+    org_unit = OrgUnit(Uuid=uuid4(), Name="test", ParentOrgUnitUuid=None)
+    snapshot = {org_unit.Uuid: org_unit.copy(update={"Name": "old"})}
+    os2sync_client.os2sync_post.side_effect = ValueError("Boom")
+
+    with pytest.raises(ValueError):
+        await os2sync_client.upsert_org_unit_from_snapshot(org_unit, snapshot)
+    assert stored == {}
+
+    os2sync_client.os2sync_post.side_effect = None
+    await os2sync_client.upsert_org_unit(org_unit)
+    assert os2sync_client.os2sync_post.await_count == 2
+    assert stored == {org_unit.Uuid: fingerprint(org_unit.json())}
+
+
+def test_dry_run_client_does_not_remember(fingerprints):
+    client = get_os2sync_client(
+        dummy_settings, session=None, dry_run=False, fingerprints=fingerprints
+    )
+    assert client.fingerprints is fingerprints
+    client = get_os2sync_client(
+        dummy_settings, session=None, dry_run=True, fingerprints=fingerprints
+    )
+    assert client.fingerprints is None
@@ -0,0 +1,130 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+from uuid import UUID
+from uuid import uuid4
+
+from os2sync_export.autogenerated_graphql_client.read_org_unit_fk_org_it_users import (
+    ReadOrgUnitFkOrgItUsersOrgUnits,
+)
+from os2sync_export.fk_org_uuids import FkOrgUuidMap
+from os2sync_export.fk_org_uuids import set_fk_org_uuid_map
+from os2sync_export.os2mo import get_unit_fk_org_uuid
+from os2sync_export.os2mo import overwrite_position_uuids
+from os2sync_export.os2mo import overwrite_unit_uuids
+
+IT_SYSTEMS = ["FK-org uuid", "AD ObjectGUID"]
+
+
+def org_units(
+    itusers: dict[UUID, list[tuple[str, str]]], cursor: str | None = None
+) -> ReadOrgUnitFkOrgItUsersOrgUnits:
+    return ReadOrgUnitFkOrgItUsersOrgUnits.parse_obj(
+        {
+            "page_info": {"next_cursor": cursor},
+            "objects": [
+                {
+                    "uuid": str(uuid),
+                    "current": {
+                        "itusers": [
+                            {"user_key": user_key, "itsystem": {"name": name}}
+                            for name, user_key in accounts
+                        ]
+                    },
+                }
+                for uuid, accounts in itusers.items()
+            ],
+        }
+    )
+
+
+async def test_build_and_refresh():
+    unit, other_unit, plain_unit = uuid4(), uuid4(), uuid4()
+    graphql_client = AsyncMock()
+    graphql_client.read_org_unit_fk_org_it_users.side_effect = [
+        org_units(
+            {
+                unit: [("AD ObjectGUID", "ad"), ("FK-org uuid", "fk")],
+                other_unit: [("AD ObjectGUID", "other")],
+            },
+            cursor="next",
+        ),
+        org_units({plain_unit: [("Something else", "ignored")]}),
+    ]
+    fk_org_uuid_map = FkOrgUuidMap(IT_SYSTEMS)
+
+    await fk_org_uuid_map.build(graphql_client, limit=2)
+
+    assert fk_org_uuid_map.ready
+    assert fk_org_uuid_map.get(unit) == "fk"
+    assert fk_org_uuid_map.get(str(other_unit)) == "other"
+    assert fk_org_uuid_map.get(plain_unit) == str(plain_unit)
+
+    # The it-account of a unit is terminated, and another unit gets one
+    graphql_client.read_org_unit_fk_org_it_users.side_effect = [
+        org_units({unit: [], plain_unit: [("FK-org uuid", "new")]})
+    ]
+    await fk_org_uuid_map.refresh(graphql_client, [unit, str(plain_unit)])
+    assert fk_org_uuid_map.get(unit) == str(unit)
+    assert fk_org_uuid_map.get(plain_unit) == "new"
+    assert fk_org_uuid_map.get(other_unit) == "other"
+
+
+async def test_overwrites_use_map():
+    unit, parent = uuid4(), uuid4()
+    graphql_client = AsyncMock()
+    graphql_client.read_org_unit_fk_org_it_users.return_value = org_units(
+        {unit: [("FK-org uuid", "fk-unit")], parent: [("AD ObjectGUID", "fk-parent")]}
+    )
+    fk_org_uuid_map = FkOrgUuidMap(IT_SYSTEMS)
+    await fk_org_uuid_map.build(graphql_client)
+    sts_user = {"Positions": [{"OrgUnitUuid": str(unit)}]}
+    sts_org_unit = {"Uuid": str(unit), "ParentOrgUnitUuid": str(parent)}
+
+    set_fk_org_uuid_map(fk_org_uuid_map)
+    try:
+        with patch("os2sync_export.os2mo.os2mo_get") as os2mo_get_mock:
+            await overwrite_position_uuids(sts_user, IT_SYSTEMS)
+            await overwrite_unit_uuids(sts_org_unit, IT_SYSTEMS)
+    finally:
+        set_fk_org_uuid_map(None)
+
+    os2mo_get_mock.assert_not_called()
+    assert sts_user == {"Positions": [{"OrgUnitUuid": "fk-unit"}]}
+    assert sts_org_unit == {"Uuid": "fk-unit", "ParentOrgUnitUuid": "fk-parent"}
+
+
+async def test_ambiguous_units_are_read_from_mo():
+    """Several accounts in the first it-system are picked from MO like before the map"""
+    unit = uuid4()
+    graphql_client = AsyncMock()
+    graphql_client.read_org_unit_fk_org_it_users.return_value = org_units(
+        {unit: [("AD ObjectGUID", "ad"), ("FK-org uuid", "a"), ("FK-org uuid", "b")]}
+    )
+    fk_org_uuid_map = FkOrgUuidMap(IT_SYSTEMS)
+    await fk_org_uuid_map.build(graphql_client)
+    assert fk_org_uuid_map.get(unit) is None
+
+    set_fk_org_uuid_map(fk_org_uuid_map)
+    try:
+        it_accounts = [
+            {"itsystem": {"name": "FK-org uuid"}, "user_key": "b"},
+            {"itsystem": {"name": "FK-org uuid"}, "user_key": "a"},
+        ]
+        with patch(
+            "os2sync_export.os2mo.os2mo_get",
+            return_value=MagicMock(**{"json.return_value": it_accounts}),
+        ):
+            assert await get_unit_fk_org_uuid(str(unit), IT_SYSTEMS) == "b"
+    finally:
+        set_fk_org_uuid_map(None)
+
+    # The unit is no longer ambiguous once an account is terminated
+    graphql_client.read_org_unit_fk_org_it_users.return_value = org_units(
+        {unit: [("FK-org uuid", "a")]}
+    )
+    await fk_org_uuid_map.refresh(graphql_client, [unit])
+    assert fk_org_uuid_map.get(unit) == "a"
@@ -2,9 +2,17 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 from unittest.mock import patch
+from uuid import UUID
 from uuid import uuid4
 
+import pytest
+
+from os2sync_export.autogenerated_graphql_client.read_org_units_bulk import (
+    ReadOrgUnitsBulkOrgUnitsObjectsCurrent,
+)
+from os2sync_export.os2mo import bulk_orgunit_to_sts
 from os2sync_export.os2mo import get_sts_orgunit
+from tests.helpers import MockOs2moGet
 
 top_level_uuid = str(uuid4())
 other_top_level_uuid = str(uuid4())
@@ -22,3 +30,135 @@ async def test_get_sts_orgunit_not_under_top_level(
 ):
     res = await get_sts_orgunit(uuid4(), settings=mock_settings, graphql_session=None)
     assert res is None
+
+
+@pytest.mark.parametrize("uuid_from_it_systems", ([], ["FK-org uuid"]))
+@pytest.mark.parametrize("sync_managers", (True, False))
+@pytest.mark.parametrize("use_contact_for_tasks", (True, False))
+async def test_bulk_orgunit_to_sts_matches_get_sts_orgunit(
+    uuid_from_it_systems, sync_managers, use_contact_for_tasks, set_settings
+):
+    """The bulk GraphQL reader must give the same result as the REST based converter"""
+    settings = set_settings(
+        uuid_from_it_systems=uuid_from_it_systems,
+        sync_managers=sync_managers,
+        use_contact_for_tasks=use_contact_for_tasks,
+    )
+    top_uuid = str(settings.top_unit_uuid)
+    unit_uuid, parent_uuid, manager_uuid = (str(uuid4()) for _ in range(3))
+    fk_org_itsystem = {"uuid": str(uuid4()), "name": "FK-org uuid"}
+    other_itsystem = {"uuid": str(uuid4()), "name": "Other system"}
+    unit_itusers = [
+        {"itsystem": fk_org_itsystem, "user_key": str(uuid4())},
+        {"itsystem": other_itsystem, "user_key": "other"},
+    ]
+    parent_itusers = [{"itsystem": fk_org_itsystem, "user_key": str(uuid4())}]
+    manager_itusers = [
+        {
+            "uuid": str(uuid4()),
+            "user_key": str(uuid4()),
+            "engagement_uuid": None,
+            "itsystem": {"name": "FK-org uuid"},
+        }
+    ]
+    addresses = [
+        {
+            "address_type": {
+                "scope": "EMAIL",
+                "user_key": "Email",
+                "uuid": str(uuid4()),
+            },
+            "name": "test@example.com",
+        },
+        {
+            "address_type": {
+                "scope": "PHONE",
+                "user_key": "Phone",
+                "uuid": str(uuid4()),
+            },
+            "name": "12345678",
+        },
+    ]
+    kle_1, kle_2 = str(uuid4()), str(uuid4())
+    kles = [
+        {"kle_number": {"uuid": kle_1}, "kle_aspect": [{"name": "Udførende"}]},
+        {"kle_number": {"uuid": kle_2}, "kle_aspect": [{"name": "Ansvarlig"}]},
+    ]
+
+    rest_responses = {
+        f"{{BASE}}/ou/{unit_uuid}/": {
+            "uuid": unit_uuid,
+            "name": "Unit",
+            "org_unit_level": None,
+            "org_unit_type": None,
+            "parent": {"uuid": parent_uuid, "parent": {"uuid": top_uuid}},
+        },
+        f"{{BASE}}/ou/{unit_uuid}/details/it": unit_itusers,
+        f"{{BASE}}/ou/{parent_uuid}/details/it": parent_itusers,
+        f"{{BASE}}/ou/{unit_uuid}/details/address": addresses,
+        f"{{BASE}}/ou/{unit_uuid}/details/manager": [
+            {"person": {"uuid": manager_uuid}}
+        ],
+        f"{{BASE}}/ou/{unit_uuid}/details/kle": kles,
+    }
+
+    def os2mo_get(url, **_):
+        return MockOs2moGet(rest_responses[url])
+
+    with patch("os2sync_export.os2mo.os2mo_get", side_effect=os2mo_get):
+        with patch(
+            "os2sync_export.os2mo.get_user_it_accounts", return_value=manager_itusers
+        ):
+            expected = await get_sts_orgunit(
+                UUID(unit_uuid), settings=settings, graphql_session=None
+            )
+
+    bulk_unit = ReadOrgUnitsBulkOrgUnitsObjectsCurrent.parse_obj(
+        {
+            "uuid": unit_uuid,
+            "name": "Unit",
+            "parent": {"uuid": parent_uuid, "itusers": []},
+            "ancestors": [{"uuid": parent_uuid}, {"uuid": top_uuid}],
+            "unit_type": None,
+            "org_unit_level": None,
+            "org_unit_hierarchy_model": None,
+            "addresses": addresses,
+            "itusers": [],
+            "managers": [],
+            "kles": [],
+            "all_itusers": unit_itusers,
+            "parent_itusers": {"itusers": parent_itusers},
+            "manager_persons": [
+                {"person": [{"uuid": manager_uuid, "itusers": manager_itusers}]}
+            ],
+            "kles_with_aspects": [
+                {"kle_number": [k["kle_number"]], "kle_aspects": k["kle_aspect"]}
+                for k in kles
+            ],
+        }
+    )
+    assert expected is not None
+    assert bulk_orgunit_to_sts(bulk_unit, settings=settings) == expected
+
+
+async def test_bulk_orgunit_to_sts_not_under_top_level(mock_settings):
+    bulk_unit = ReadOrgUnitsBulkOrgUnitsObjectsCurrent.parse_obj(
+        {
+            "uuid": uuid4(),
+            "name": "Unit",
+            "parent": {"uuid": other_top_level_uuid, "itusers": []},
+            "ancestors": [{"uuid": other_top_level_uuid}],
+            "unit_type": None,
+            "org_unit_level": None,
+            "org_unit_hierarchy_model": None,
+            "addresses": [],
+            "itusers": [],
+            "managers": [],
+            "kles": [],
+            "all_itusers": [],
+            "parent_itusers": {"itusers": []},
+            "manager_persons": [],
+            "kles_with_aspects": [],
+        }
+    )
+    assert bulk_orgunit_to_sts(bulk_unit, settings=mock_settings) is None
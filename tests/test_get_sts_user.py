@@ -147,12 +147,10 @@ class TestGetStsUser(unittest.TestCase, MoEmployeeMixin):
 
     @patch.object(os2mo, "engagements_to_user", mock_engagements_to_user)
     @patch.object(os2mo, "pick_address", return_value=None)
-    @patch.object(os2mo, "org_unit_uuids", return_value={})
     async def _run(
         self,
         response,
         address_mock,
-        org_unit_uuids_mock,
         ad_user_key=None,
         os2sync_templates=None,
     ):
@@ -104,7 +104,9 @@ async def test_get_sts_user(
 ):
     gql_mock = AsyncMock()
     gql_mock.execute.return_value = {
-        "employees": {"objects": [{"current": {"itusers": query_response}}]}
+        "employees": {
+            "objects": [{"uuid": mo_uuid, "current": {"itusers": query_response}}]
+        }
     }
     settings = set_settings(
         uuid_from_it_systems=["FK-ORG UUID"],
@@ -171,7 +173,12 @@ async def test_get_sts_user_duplicate_username_no_uuid_itsystem(
     gql_mock = AsyncMock()
     gql_mock.execute.return_value = {
         "employees": {
-            "objects": [{"current": {"itusers": query_response_frederikshavn}}]
+            "objects": [
+                {
+                    "uuid": mo_uuid,
+                    "current": {"itusers": query_response_frederikshavn},
+                }
+            ]
         }
     }
     settings = set_settings(
@@ -196,7 +203,7 @@ async def test_get_sts_user_no_it_accounts(
     """Test that users without it-accounts creates one fk-org account"""
     gql_mock = AsyncMock()
     gql_mock.execute.return_value = {
-        "employees": {"objects": [{"current": {"itusers": []}}]}
+        "employees": {"objects": [{"uuid": mo_uuid, "current": {"itusers": []}}]}
     }
 
     await get_sts_user(
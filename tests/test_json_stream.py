@@ -0,0 +1,55 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+import json
+
+import pytest
+
+from os2sync_export.json_stream import iter_arrays
+
+document = {
+    "Id": "b5f3a4c0",
+    "Result": {
+        "Meta": {"Users": [1, 2]},
+        "OUs": [{"Uuid": "1", "Name": "Økonomi"}, {"Uuid": "2", "Level": 123456}],
+        "Count": 1.5e3,
+        "Users": [{"Uuid": "3", "Positions": [{"Name": "Udvikler"}]}],
+    },
+    "After": [{"Uuid": "4"}],
+}
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+@pytest.mark.parametrize("indent", [None, 2])
+async def test_iter_arrays(size, indent):
+    data = json.dumps(document, ensure_ascii=False, indent=indent).encode()
+
+    items = [item async for item in iter_arrays(chunked(data, size), ("Result",))]
+
+    assert items == [
+        ("OUs", {"Uuid": "1", "Name": "Økonomi"}),
+        ("OUs", {"Uuid": "2", "Level": 123456}),
+        ("Users", {"Uuid": "3", "Positions": [{"Name": "Udvikler"}]}),
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("data", [b'{"Result": null}', b'{"Other": {"OUs": []}}'])
+async def test_iter_arrays_missing_path(data):
+    with pytest.raises(LookupError):
+        [item async for item in iter_arrays(chunked(data, 3), ("Result",))]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "data", [b'{"Result": {"OUs": [1 2]}}', b'{"Result": {"OUs": [{"Uuid": "1"}']
+)
+async def test_iter_arrays_invalid(data):
+    with pytest.raises(ValueError):
+        [item async for item in iter_arrays(chunked(data, 3), ("Result",))]
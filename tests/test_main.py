@@ -1,7 +1,10 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
+from collections import OrderedDict
 from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
 from unittest.mock import call
 from unittest.mock import patch
 from uuid import uuid4
@@ -9,9 +12,14 @@ from uuid import uuid4
 import pytest
 from fastramqpi.events import Event
 
+from os2sync_export.__main__ import read_all_org_units
 from os2sync_export.main import amqp_trigger_it_user
+from os2sync_export.main import amqp_trigger_org_unit
 from os2sync_export.main import sync_org_unit
+from os2sync_export.main import sync_person
+from os2sync_export.os2mo import get_relevance_cache
 from os2sync_export.os2mo import is_relevant
+from os2sync_export.os2mo import relevance_cache_scope
 from os2sync_export.os2sync_models import OrgUnit
 
 
@@ -159,6 +167,7 @@ async def test_trigger_orgunit_employees_update(
     graphql_session,
 ):
     gql_mock = AsyncMock()
+    gql_mock.get_data = MagicMock()
     """Test react to orgunit event and all employees"""
     employee_uuids = {uuid4(), uuid4()}
     with patch("os2sync_export.main.find_employees", return_value=employee_uuids):
@@ -169,9 +178,143 @@ async def test_trigger_orgunit_employees_update(
             graphql_client=gql_mock,
             os2sync_client=os2sync_client,
         )
-    assert gql_mock.event_send.call_args_list == [
-        call(namespace="os2sync_export", routing_key="person", subject=str(u))
-        for u in employee_uuids
+    # The events are sent in one request
+    gql_mock.execute.assert_awaited_once()
+    variables = gql_mock.execute.await_args.kwargs["variables"]
+    assert variables == {
+        "namespace": "os2sync_export",
+        **{f"routing_key_{i}": "person" for i in range(len(employee_uuids))},
+        **{f"subject_{i}": str(u) for i, u in enumerate(employee_uuids)},
+    }
+
+
+@pytest.mark.parametrize(
+    "changed,fan_out",
+    [
+        ({}, False),
+        ({"PhoneNumber": "12345678"}, False),
+        ({"Name": "renamed"}, True),
+        ({"ParentOrgUnitUuid": uuid4()}, True),
+        ({"Uuid": uuid4()}, True),
+    ],
+)
+async def test_trigger_orgunit_employees_only_on_changed_positions(
+    changed, fan_out, mock_settings, os2sync_client, graphql_session
+):
+    """Employees are only synced again if fields their positions depend on changed"""
+    orgunit_uuid = uuid4()
+    org_unit = OrgUnit(Uuid=orgunit_uuid, Name="test", ParentOrgUnitUuid=None)
+    gql_mock = AsyncMock()
+    employee_uuid = uuid4()
+
+    async def sync(org_unit):
+        with patch("os2sync_export.main.is_relevant", return_value=True), patch(
+            "os2sync_export.main.get_sts_orgunit", return_value=org_unit
+        ), patch(
+            "os2sync_export.main.find_employees", return_value={employee_uuid}
+        ) as find_employees_mock:
+            await sync_org_unit(
+                event_uuid=Event(subject=orgunit_uuid, priority=1000),
+                settings=mock_settings,
+                graphql_session=graphql_session,
+                graphql_client=gql_mock,
+                os2sync_client=os2sync_client,
+            )
+        return find_employees_mock
+
+    # The first sync of an org_unit always syncs its employees
+    assert (await sync(org_unit)).called
+    find_employees_mock = await sync(org_unit.copy(update=changed))
+    assert find_employees_mock.called == fan_out
+
+
+@patch("os2sync_export.main.MAX_ORG_UNIT_POSITION_FIELDS", 2)
+@patch("os2sync_export.main._org_unit_position_fields", OrderedDict())
+async def test_trigger_orgunit_employees_forgets_least_recent(
+    mock_settings, os2sync_client, graphql_session
+):
+    """Only a bounded number of org_units are remembered, forgetting the least recent"""
+    first, second, third = uuid4(), uuid4(), uuid4()
+
+    async def sync(uuid):
+        with patch("os2sync_export.main.is_relevant", return_value=True), patch(
+            "os2sync_export.main.get_sts_orgunit",
+            return_value=OrgUnit(Uuid=uuid, Name="test", ParentOrgUnitUuid=None),
+        ), patch(
+            "os2sync_export.main.find_employees", return_value=set()
+        ) as find_employees_mock:
+            await sync_org_unit(
+                event_uuid=Event(subject=uuid, priority=1000),
+                settings=mock_settings,
+                graphql_session=graphql_session,
+                graphql_client=AsyncMock(),
+                os2sync_client=os2sync_client,
+            )
+        return find_employees_mock.called
+
+    assert await sync(first)
+    assert await sync(second)
+    # Using the first org_unit keeps it, so the second is forgotten
+    assert not await sync(first)
+    assert await sync(third)
+    assert not await sync(first)
+    assert await sync(second)
+
+
+async def test_trigger_orgunit_employees_not_relevant_anymore(
+    mock_settings, os2sync_client, graphql_session
+):
+    """Employees are synced again when an org_unit is no longer relevant"""
+    orgunit_uuid = uuid4()
+    org_unit = OrgUnit(Uuid=orgunit_uuid, Name="test", ParentOrgUnitUuid=None)
+    gql_mock = AsyncMock()
+    with patch("os2sync_export.main.get_sts_orgunit", return_value=org_unit), patch(
+        "os2sync_export.main.find_employees", return_value={uuid4()}
+    ) as find_employees_mock:
+        for relevant in (True, False, False):
+            with patch("os2sync_export.main.is_relevant", return_value=relevant):
+                await sync_org_unit(
+                    event_uuid=Event(subject=orgunit_uuid, priority=1000),
+                    settings=mock_settings,
+                    graphql_session=graphql_session,
+                    graphql_client=gql_mock,
+                    os2sync_client=os2sync_client,
+                )
+    assert find_employees_mock.call_count == 2
+
+
+async def test_sync_person_exclusive_per_subject(
+    mock_settings, os2sync_client, graphql_session
+):
+    """Events for the same person are handled in order, other persons concurrently"""
+    person_uuid, other_uuid = uuid4(), uuid4()
+    running = []
+    calls = []
+
+    async def get_sts_user(uuid, **kwargs):
+        running.append(uuid)
+        calls.append(list(running))
+        await asyncio.sleep(0.01)
+        running.remove(uuid)
+        return []
+
+    with patch("os2sync_export.main.get_sts_user", side_effect=get_sts_user):
+        await asyncio.gather(
+            *(
+                sync_person(
+                    event_uuid=Event(subject=uuid, priority=1000),
+                    settings=mock_settings,
+                    graphql_session=graphql_session,
+                    graphql_client=None,
+                    os2sync_client=os2sync_client,
+                )
+                for uuid in (person_uuid, person_uuid, other_uuid)
+            )
+        )
+    assert calls == [
+        [str(person_uuid)],
+        [str(person_uuid), str(other_uuid)],
+        [str(person_uuid)],
     ]
 
 
@@ -188,11 +331,12 @@ async def test_is_relevant(set_settings):
             "org_units": {
                 "objects": [
                     {
+                        "uuid": str(unit_uuid),
                         "current": {
                             "ancestors": [{"uuid": str(top_unit_uuid)}],
                             "org_unit_hierarchy_model": {"name": line_org},
                             "itusers": [],
-                        }
+                        },
                     }
                 ]
             }
@@ -209,7 +353,12 @@ async def test_is_not_below_top_unit(mock_settings):
     graphql_session.execute.side_effect = [
         {
             "org_units": {
-                "objects": [{"current": {"ancestors": [{"uuid": str(uuid4())}]}}]
+                "objects": [
+                    {
+                        "uuid": str(unit_uuid),
+                        "current": {"ancestors": [{"uuid": str(uuid4())}]},
+                    }
+                ]
             }
         }
     ]
@@ -231,11 +380,12 @@ async def test_is_relevant_wrong_hierarchy(set_settings):
             "org_units": {
                 "objects": [
                     {
+                        "uuid": str(unit_uuid),
                         "current": {
                             "ancestors": [{"uuid": str(top_unit_uuid)}],
                             "org_unit_hierarchy_model": {"name": "hidden"},
                             "itusers": [],
-                        }
+                        },
                     }
                 ]
             }
@@ -262,11 +412,12 @@ async def test_is_relevant_has_it_account(set_settings):
             "org_units": {
                 "objects": [
                     {
+                        "uuid": str(unit_uuid),
                         "current": {
                             "ancestors": [{"uuid": str(top_unit_uuid)}],
                             "org_unit_hierarchy_model": {"name": "hidden"},
                             "itusers": [{"itsystem": {"name": it_system_name}}],
-                        }
+                        },
                     }
                 ]
             }
@@ -277,6 +428,119 @@ async def test_is_relevant_has_it_account(set_settings):
     )
 
 
+async def test_is_relevant_cached(mock_settings):
+    """Concurrent and repeated lookups of a unit share one query within a sync run"""
+    unit_uuid = uuid4()
+    graphql_session = AsyncMock()
+
+    async def execute(*args, **kwargs):
+        await asyncio.sleep(0)
+        return {
+            "org_units": {
+                "objects": [
+                    {
+                        "uuid": str(unit_uuid),
+                        "current": {
+                            "ancestors": [{"uuid": str(mock_settings.top_unit_uuid)}],
+                        },
+                    }
+                ]
+            }
+        }
+
+    graphql_session.execute.side_effect = execute
+    with relevance_cache_scope():
+        results = await asyncio.gather(
+            *(is_relevant(graphql_session, unit_uuid, mock_settings) for _ in range(5))
+        )
+        assert await is_relevant(graphql_session, unit_uuid, mock_settings)
+    assert all(results)
+    graphql_session.execute.assert_awaited_once()
+
+    # Outside the run the process-wide cache is used
+    assert await is_relevant(graphql_session, unit_uuid, mock_settings)
+    assert graphql_session.execute.await_count == 2
+
+
+async def test_is_relevant_cache_disabled(set_settings):
+    settings = set_settings(relevance_cache_ttl=0)
+    graphql_session = AsyncMock()
+    graphql_session.execute.return_value = {"org_units": {"objects": []}}
+    unit_uuid = uuid4()
+
+    assert not await is_relevant(graphql_session, unit_uuid, settings)
+    assert not await is_relevant(graphql_session, unit_uuid, settings)
+    assert graphql_session.execute.await_count == 2
+
+
+async def test_is_relevant_failure_not_cached(set_settings):
+    mock_settings = set_settings(relevance_cache_ttl=60)
+    graphql_session = AsyncMock()
+    graphql_session.execute.side_effect = [
+        ValueError("Boom"),
+        {"org_units": {"objects": []}},
+    ]
+    unit_uuid = uuid4()
+
+    with pytest.raises(ValueError):
+        await is_relevant(graphql_session, unit_uuid, mock_settings)
+    assert not await is_relevant(graphql_session, unit_uuid, mock_settings)
+
+
+async def test_org_unit_event_invalidates_relevance(mock_settings):
+    unit_uuid = uuid4()
+    graphql_session = AsyncMock()
+    graphql_session.execute.return_value = {"org_units": {"objects": []}}
+    get_relevance_cache().prime(unit_uuid, True, ttl=60)
+
+    with patch("os2sync_export.main.add_org_unit_event"):
+        await amqp_trigger_org_unit(Event(subject=unit_uuid, priority=1000), None)
+
+    # The unit has moved out of the tree, which is found by querying it again
+    assert not await is_relevant(graphql_session, str(unit_uuid), mock_settings)
+    graphql_session.execute.assert_awaited_once()
+
+
+async def test_moved_parent_invalidates_relevance_of_children(set_settings):
+    settings = set_settings(relevance_cache_ttl=60)
+    parent_uuid, child_uuid = uuid4(), uuid4()
+    graphql_session = AsyncMock()
+    graphql_session.execute.return_value = {"org_units": {"objects": []}}
+    get_relevance_cache().prime(child_uuid, True, ttl=60)
+    assert await is_relevant(graphql_session, child_uuid, settings)
+    graphql_session.execute.assert_not_awaited()
+
+    # The parent is moved out of the tree, which also moves the child
+    with patch("os2sync_export.main.add_org_unit_event"):
+        await amqp_trigger_org_unit(Event(subject=parent_uuid, priority=1000), None)
+
+    assert not await is_relevant(graphql_session, child_uuid, settings)
+    graphql_session.execute.assert_awaited_once()
+
+
+async def test_read_all_org_units_primes_relevance_with_mo_uuids(set_settings):
+    settings = set_settings(uuid_from_it_systems=["FK-org uuid"])
+    mo_uuid, fk_org_uuid = uuid4(), uuid4()
+    graphql_session = AsyncMock()
+
+    async def pages(*args, **kwargs):
+        yield [mo_uuid]
+
+    with (
+        patch("os2sync_export.__main__.iter_org_unit_uuid_pages", pages),
+        patch("os2sync_export.os2mo.get_org_unit_hierarchy"),
+        patch(
+            "os2sync_export.os2mo.read_sts_orgunits",
+            return_value=[OrgUnit(Uuid=fk_org_uuid, Name="Enhed")],
+        ),
+        relevance_cache_scope(),
+    ):
+        org_units = await read_all_org_units(settings, AsyncMock())
+        assert list(org_units) == [fk_org_uuid]
+        assert await is_relevant(graphql_session, mo_uuid, settings)
+    graphql_session.execute.assert_not_awaited()
+
+
 async def test_amqp_trigger_it_user_no_old_accounts(set_settings):
     mock_settings = set_settings(uuid_from_it_systems=["FK-org uuid"])
     os2sync_client_mock = AsyncMock()
@@ -299,7 +563,7 @@ async def test_amqp_trigger_it_user_no_old_accounts(set_settings):
 @patch("os2sync_export.main.is_relevant")
 @patch(
     "os2sync_export.main.get_ituser_org_unit_and_employee_uuids",
-    return_value=("Irellevant orgunit", None),
+    return_value=(str(uuid4()), None),
 )
 async def test_amqp_trigger_it_user_deletes_old_accounts(
     relevant_mock, get_ituser_mock, set_settings
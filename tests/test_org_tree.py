@@ -0,0 +1,122 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+from unittest.mock import AsyncMock
+from uuid import UUID
+from uuid import uuid4
+
+from os2sync_export.autogenerated_graphql_client.read_org_tree import (
+    ReadOrgTreeOrgUnits,
+)
+from os2sync_export.org_tree import OrgTree
+from os2sync_export.org_tree import set_org_tree
+from os2sync_export.os2mo import is_relevant
+
+
+def org_units(
+    units: dict[UUID, UUID | None],
+    cursor: str | None = None,
+    hierarchy: str | None = None,
+    itsystems: list[str] | None = None,
+) -> ReadOrgTreeOrgUnits:
+    return ReadOrgTreeOrgUnits.parse_obj(
+        {
+            "page_info": {"next_cursor": cursor},
+            "objects": [
+                {
+                    "uuid": str(uuid),
+                    "current": {
+                        "parent": {"uuid": str(parent)} if parent else None,
+                        "org_unit_hierarchy_model": {"name": hierarchy}
+                        if hierarchy
+                        else None,
+                        "itusers": [
+                            {"itsystem": {"name": name}} for name in itsystems or []
+                        ],
+                    },
+                }
+                for uuid, parent in units.items()
+            ],
+        }
+    )
+
+
+async def test_build_and_refresh(mock_settings):
+    top, child, grandchild, other = (
+        mock_settings.top_unit_uuid,
+        uuid4(),
+        uuid4(),
+        uuid4(),
+    )
+    graphql_client = AsyncMock()
+    graphql_client.read_org_tree.side_effect = [
+        org_units({top: None, child: top}, cursor="next"),
+        org_units({grandchild: child, other: None}),
+    ]
+    org_tree = OrgTree()
+
+    await org_tree.build(graphql_client, limit=2)
+
+    assert org_tree.ready
+    assert org_tree.ancestors(grandchild) == [child, top]
+    assert org_tree.is_relevant(grandchild, mock_settings)
+    assert not org_tree.is_relevant(other, mock_settings)
+    assert org_tree.is_relevant(uuid4(), mock_settings) is None
+
+    # Moving a unit moves its subtree
+    graphql_client.read_org_tree.side_effect = [org_units({child: other})]
+    await org_tree.refresh(graphql_client, [child])
+    assert org_tree.ancestors(grandchild) == [child, other]
+    assert not org_tree.is_relevant(grandchild, mock_settings)
+
+    # Units which no longer exist are removed, and their subtree is unknown
+    graphql_client.read_org_tree.side_effect = [org_units({})]
+    await org_tree.refresh(graphql_client, [str(child)])
+    assert org_tree.is_relevant(child, mock_settings) is None
+    assert org_tree.is_relevant(grandchild, mock_settings) is None
+
+
+async def test_refresh_while_building(mock_settings):
+    top, child = mock_settings.top_unit_uuid, uuid4()
+    graphql_client = AsyncMock()
+    org_tree = OrgTree()
+
+    graphql_client.read_org_tree.side_effect = [org_units({child: top})]
+    await org_tree.refresh(graphql_client, [child])
+    assert not org_tree.ready
+
+    # The page read after the event is older than the event and is skipped
+    graphql_client.read_org_tree.side_effect = [
+        org_units({top: None, child: None}),
+    ]
+    await org_tree.build(graphql_client)
+    assert org_tree.ancestors(child) == [top]
+
+
+async def test_is_relevant_uses_org_tree(set_settings):
+    line_org = "linjeorganisation"
+    settings = set_settings(
+        filter_hierarchy_names=[line_org], uuid_from_it_systems=["FK-org uuid"]
+    )
+    top, hidden, with_it, unknown = settings.top_unit_uuid, uuid4(), uuid4(), uuid4()
+    graphql_client = AsyncMock()
+    graphql_client.read_org_tree.side_effect = [
+        org_units({top: None}, cursor="next", hierarchy=line_org),
+        org_units({hidden: top}, cursor="next", hierarchy="hidden"),
+        org_units({with_it: top}, hierarchy="hidden", itsystems=["FK-org uuid"]),
+    ]
+    org_tree = OrgTree()
+    await org_tree.build(graphql_client)
+    graphql_session = AsyncMock()
+    graphql_session.execute.return_value = {"org_units": {"objects": []}}
+
+    set_org_tree(org_tree)
+    try:
+        assert not await is_relevant(graphql_session, hidden, settings)
+        assert await is_relevant(graphql_session, with_it, settings)
+        graphql_session.execute.assert_not_awaited()
+        # Units missing from the index are queried
+        assert not await is_relevant(graphql_session, unknown, settings)
+        graphql_session.execute.assert_awaited_once()
+    finally:
+        set_org_tree(None)
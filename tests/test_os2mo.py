@@ -1,6 +1,8 @@
 # SPDX-FileCopyrightText: Magenta ApS
 #
 # SPDX-License-Identifier: MPL-2.0
+import asyncio
+import logging
 from unittest.mock import ANY
 from unittest.mock import AsyncMock
 from unittest.mock import MagicMock
@@ -8,27 +10,33 @@ from unittest.mock import patch
 from uuid import UUID
 from uuid import uuid4
 
+import httpx
 import pytest
 from freezegun import freeze_time
-from hypothesis import given
-from hypothesis import strategies as st
+from more_itertools import one
 from parameterized import parameterized  # type: ignore
 from pydantic import ValidationError
+from structlog.testing import capture_logs
 
 from os2sync_export.os2mo import addresses_to_orgunit
 from os2sync_export.os2mo import check_terminated_accounts
+from os2sync_export.os2mo import close_mo_session
+from os2sync_export.os2mo import create_mo_session
 from os2sync_export.os2mo import get_address_org_unit_and_employee_uuids
 from os2sync_export.os2mo import get_engagement_employee_uuid
 from os2sync_export.os2mo import get_ituser_org_unit_and_employee_uuids
 from os2sync_export.os2mo import get_kle_org_unit_uuid
 from os2sync_export.os2mo import get_manager_org_unit_uuid
 from os2sync_export.os2mo import get_org_unit_hierarchy
+from os2sync_export.os2mo import get_sts_user
 from os2sync_export.os2mo import get_work_address
 from os2sync_export.os2mo import is_ignored
 from os2sync_export.os2mo import is_terminated
 from os2sync_export.os2mo import kle_to_orgunit
 from os2sync_export.os2mo import manager_to_orgunit
-from os2sync_export.os2mo import org_unit_uuids
+from os2sync_export.os2mo import mo_response_cache_scope
+from os2sync_export.os2mo import mo_token_refreshes
+from os2sync_export.os2mo import os2mo_get
 from os2sync_export.os2mo import overwrite_position_uuids
 from os2sync_export.os2mo import overwrite_unit_uuids
 from os2sync_export.os2mo import partition_kle
@@ -213,20 +221,6 @@ class TestsMOAd:
         assert test_user == expected
 
 
-@patch("os2sync_export.os2mo.organization_uuid", return_value="root_uuid")
-@given(st.tuples(st.uuids()))
-async def test_org_unit_uuids(root_mock, hierarchy_uuids):
-    with patch("os2sync_export.os2mo.os2mo_get") as session_mock:
-        session_mock.return_value = MockOs2moGet({"items": [{"uuid": "test"}]})
-        await org_unit_uuids(hierarchy_uuids=hierarchy_uuids)
-
-    session_mock.assert_called_once_with(
-        "{BASE}/o/root_uuid/ou/",
-        limit=999999,
-        hierarchy_uuids=tuple(str(u) for u in hierarchy_uuids),
-    )
-
-
 @patch("os2sync_export.os2mo.organization_uuid", return_value="root_uuid")
 async def test_get_org_unit_hierarchy(root_mock):
     with patch(
@@ -325,6 +319,7 @@ async def test_get_address_org_unit_and_employee_uuids():
         "addresses": {
             "objects": [
                 {
+                    "uuid": str(addr_uuid_mock),
                     "validities": [
                         {
                             "org_unit_uuid": str(ou_uuid_mock),
@@ -334,7 +329,7 @@ async def test_get_address_org_unit_and_employee_uuids():
                             "org_unit_uuid": str(ou_uuid_mock),
                             "employee_uuid": str(e_uuid_mock),
                         },
-                    ]
+                    ],
                 }
             ]
         }
@@ -347,7 +342,7 @@ async def test_get_address_org_unit_and_employee_uuids():
     graphql_session_mock.execute.assert_called_with(
         ANY,
         variable_values={
-            "uuid": str(addr_uuid_mock),
+            "uuids": [str(addr_uuid_mock)],
         },
     )
     assert UUID(result_ou_uuid) == ou_uuid_mock
@@ -365,6 +360,7 @@ async def test_get_ituser_org_unit_and_employee_uuids():
             "itusers": {
                 "objects": [
                     {
+                        "uuid": str(ituser_uuid_mock),
                         "validities": [
                             {
                                 "org_unit_uuid": str(ou_uuid_mock),
@@ -374,7 +370,7 @@ async def test_get_ituser_org_unit_and_employee_uuids():
                                 "org_unit_uuid": str(ou_uuid_mock),
                                 "employee_uuid": str(e_uuid_mock),
                             },
-                        ]
+                        ],
                     }
                 ]
             }
@@ -388,7 +384,7 @@ async def test_get_ituser_org_unit_and_employee_uuids():
     graphql_session_mock.execute.assert_called_with(
         ANY,
         variable_values={
-            "uuid": str(ituser_uuid_mock),
+            "uuids": [str(ituser_uuid_mock)],
         },
     )
     assert UUID(result_ou_uuid) == ou_uuid_mock
@@ -404,6 +400,7 @@ async def test_get_manager_org_unit_uuid():
         "managers": {
             "objects": [
                 {
+                    "uuid": str(manager_uuid_mock),
                     "validities": [
                         {
                             "org_unit_uuid": str(ou_uuid_mock),
@@ -411,7 +408,7 @@ async def test_get_manager_org_unit_uuid():
                         {
                             "org_unit_uuid": str(ou_uuid_mock),
                         },
-                    ]
+                    ],
                 }
             ]
         }
@@ -424,7 +421,7 @@ async def test_get_manager_org_unit_uuid():
     graphql_session_mock.execute.assert_called_with(
         ANY,
         variable_values={
-            "uuid": str(manager_uuid_mock),
+            "uuids": [str(manager_uuid_mock)],
         },
     )
     assert UUID(result_ou_uuid) == ou_uuid_mock
@@ -441,7 +438,7 @@ async def test_get_manager_org_unit_uuid_not_found():
         graphql_session_mock.execute.assert_called_with(
             ANY,
             variable_values={
-                "uuids": str(manager_uuid_mock),
+                "uuids": [str(manager_uuid_mock)],
             },
         )
 
@@ -456,6 +453,7 @@ async def test_get_engagement_employee_uuid():
             "engagements": {
                 "objects": [
                     {
+                        "uuid": str(engagement_uuid_mock),
                         "validities": [
                             {
                                 "employee_uuid": str(e_uuid_mock),
@@ -463,7 +461,7 @@ async def test_get_engagement_employee_uuid():
                             {
                                 "employee_uuid": str(e_uuid_mock),
                             },
-                        ]
+                        ],
                     }
                 ]
             }
@@ -477,7 +475,7 @@ async def test_get_engagement_employee_uuid():
     graphql_session_mock.execute.assert_called_with(
         ANY,
         variable_values={
-            "uuid": str(engagement_uuid_mock),
+            "uuids": [str(engagement_uuid_mock)],
         },
     )
     assert UUID(result_e_uuid) == e_uuid_mock
@@ -493,6 +491,7 @@ async def test_get_kle_org_unit_uuid():
             "kles": {
                 "objects": [
                     {
+                        "uuid": str(kle_uuid_mock),
                         "validities": [
                             {
                                 "org_unit_uuid": str(ou_uuid_mock),
@@ -500,7 +499,7 @@ async def test_get_kle_org_unit_uuid():
                             {
                                 "org_unit_uuid": str(ou_uuid_mock),
                             },
-                        ]
+                        ],
                     }
                 ]
             }
@@ -512,7 +511,7 @@ async def test_get_kle_org_unit_uuid():
     graphql_session_mock.execute.assert_called_with(
         ANY,
         variable_values={
-            "uuid": str(kle_uuid_mock),
+            "uuids": [str(kle_uuid_mock)],
         },
     )
     assert UUID(result_ou_uuid) == ou_uuid_mock
@@ -751,3 +750,189 @@ def test_address_to_orgunit():
     assert orgunit["Post"] == post_value
     assert orgunit["Landline"] == landline_value
     assert orgunit["Url"] == url_value
+
+
+@pytest.mark.asyncio
+async def test_os2mo_get_reuses_session_and_token(respx_mock):
+    settings = dummy_settings
+    token_route = respx_mock.post(
+        f"{settings.fastramqpi.auth_server}/realms/{settings.fastramqpi.auth_realm}/protocol/openid-connect/token"
+    ).mock(
+        return_value=httpx.Response(
+            200, json={"access_token": "token", "expires_in": 300}
+        )
+    )
+    mo_route = respx_mock.get(f"{settings.fastramqpi.mo_url}/service/o/").mock(
+        return_value=httpx.Response(200, json=[])
+    )
+    refreshes = mo_token_refreshes._value.get()
+    with (
+        patch("os2sync_export.os2mo.get_os2sync_settings", return_value=settings),
+        patch(
+            "os2sync_export.os2mo.create_mo_session", wraps=create_mo_session
+        ) as create_session_mock,
+    ):
+        await os2mo_get("{BASE}/o/")
+        await os2mo_get("{BASE}/o/")
+        await close_mo_session()
+
+    create_session_mock.assert_called_once()
+    assert token_route.call_count == 1
+    assert mo_route.call_count == 2
+    assert mo_route.calls.last.request.headers["Authorization"] == "Bearer token"
+    assert mo_token_refreshes._value.get() == refreshes + 1
+
+
+@pytest.mark.asyncio
+async def test_os2mo_get_response_cache(respx_mock):
+    settings = dummy_settings
+    respx_mock.post(
+        f"{settings.fastramqpi.auth_server}/realms/{settings.fastramqpi.auth_realm}/protocol/openid-connect/token"
+    ).mock(
+        return_value=httpx.Response(
+            200, json={"access_token": "token", "expires_in": 300}
+        )
+    )
+    routes = {
+        path: respx_mock.get(f"{settings.fastramqpi.mo_url}/service/{path}").mock(
+            return_value=httpx.Response(200, json=[path])
+        )
+        for path in ("a/", "b/", "c/")
+    }
+    missing_route = respx_mock.get(f"{settings.fastramqpi.mo_url}/service/d/").mock(
+        return_value=httpx.Response(404)
+    )
+    with patch("os2sync_export.os2mo.get_os2sync_settings", return_value=settings):
+        with mo_response_cache_scope(2):
+            # Concurrent requests of the same url share a single request
+            responses = await asyncio.gather(
+                *(os2mo_get("{BASE}/a/") for _ in range(3))
+            )
+            assert [r.json() for r in responses] == [["a/"]] * 3
+            await os2mo_get("{BASE}/b/")
+            await os2mo_get("{BASE}/a/")
+            # The least recently used url is evicted
+            await os2mo_get("{BASE}/c/")
+            await os2mo_get("{BASE}/a/")
+            await os2mo_get("{BASE}/b/")
+            # Missing objects are not cached
+            for _ in range(2):
+                with pytest.raises(ValueError):
+                    await os2mo_get("{BASE}/d/")
+        # Outside the scope every request is sent to MO
+        await os2mo_get("{BASE}/a/")
+        await close_mo_session()
+
+    assert routes["a/"].call_count == 2
+    assert routes["b/"].call_count == 2
+    assert routes["c/"].call_count == 1
+    assert missing_route.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_mo_response_cache_scope_disabled():
+    with mo_response_cache_scope(0) as cache:
+        assert cache is None
+    with mo_response_cache_scope(10) as cache:
+        with mo_response_cache_scope(10) as nested_cache:
+            assert nested_cache is cache
+
+
+@pytest.mark.asyncio
+async def test_os2mo_get_logs_redacted_responses_at_debug(respx_mock, caplog):
+    settings = dummy_settings
+    respx_mock.post(
+        f"{settings.fastramqpi.auth_server}/realms/{settings.fastramqpi.auth_realm}/protocol/openid-connect/token"
+    ).mock(
+        return_value=httpx.Response(
+            200, json={"access_token": "token", "expires_in": 300}
+        )
+    )
+    employee = {"name": "Test", "cpr_no": "0101012222", "positions": ["x" * 100]}
+    respx_mock.get(f"{settings.fastramqpi.mo_url}/service/e/").mock(
+        return_value=httpx.Response(200, json=[{"person": employee}])
+    )
+    with (
+        patch("os2sync_export.os2mo.get_os2sync_settings", return_value=settings),
+        patch("os2sync_export.os2mo.LOG_RESPONSE_SAMPLE_RATE", 1),
+        patch("os2sync_export.os2mo.LOG_RESPONSE_MAX_LENGTH", 80),
+    ):
+        with capture_logs() as cap_log:
+            await os2mo_get("{BASE}/e/")
+        assert cap_log == []
+
+        caplog.set_level(logging.DEBUG)
+        with capture_logs() as cap_log:
+            res = await os2mo_get("{BASE}/e/")
+        await close_mo_session()
+
+    # The body is decoded once and left untouched by the redaction
+    assert res.json() is res.json()
+    assert res.json() == [{"person": employee}]
+    logged = one(cap_log)["response"]
+    assert "0101012222" not in logged
+    assert "'cpr_no': 'removed from logs'" in logged
+    assert len(logged) == 80 + len("...")
+
+
+@pytest.mark.asyncio
+async def test_get_sts_user_with_cached_responses(respx_mock, set_settings):
+    """Users of each fk-org account are built from the same cached responses"""
+    settings = set_settings(
+        uuid_from_it_systems=["FK-org uuid"], mo_response_cache_size=10
+    )
+    mo_uuid, unit_uuid = str(uuid4()), str(uuid4())
+    engagements = [str(uuid4()), str(uuid4())]
+    respx_mock.post(
+        f"{settings.fastramqpi.auth_server}/realms/{settings.fastramqpi.auth_realm}/protocol/openid-connect/token"
+    ).mock(
+        return_value=httpx.Response(
+            200, json={"access_token": "token", "expires_in": 300}
+        )
+    )
+    service = f"{settings.fastramqpi.mo_url}/service/e/{mo_uuid}"
+    respx_mock.get(f"{service}/").mock(
+        return_value=httpx.Response(
+            200, json={"uuid": mo_uuid, "name": "Test", "user_key": "test"}
+        )
+    )
+    engagement_route = respx_mock.get(url__regex=rf"{service}/details/engagement").mock(
+        return_value=httpx.Response(
+            200,
+            json=[
+                {
+                    "uuid": uuid,
+                    "org_unit": {"uuid": unit_uuid},
+                    "job_function": {"name": "Udvikler"},
+                    "is_primary": i == 0,
+                }
+                for i, uuid in enumerate(engagements)
+            ],
+        )
+    )
+    respx_mock.get(f"{service}/details/address").mock(
+        return_value=httpx.Response(200, json=[])
+    )
+    # One account for the first engagement, and one for every engagement
+    accounts = [
+        {
+            "itsystem": {"name": "FK-org uuid"},
+            "user_key": str(uuid4()),
+            "engagement_uuid": uuid,
+        }
+        for uuid in (engagements[0], None)
+    ]
+    with (
+        patch("os2sync_export.os2mo.get_os2sync_settings", return_value=settings),
+        patch("os2sync_export.os2mo.get_user_it_accounts", return_value=accounts),
+        patch("os2sync_export.os2mo.is_relevant", return_value=True),
+        patch("os2sync_export.os2mo.overwrite_position_uuids"),
+    ):
+        sts_users = await get_sts_user(mo_uuid, graphql_session=None, settings=settings)
+        await close_mo_session()
+
+    assert engagement_route.call_count == 1
+    assert sorted(
+        sorted((p["Name"], p["is_primary"]) for p in user["Positions"])
+        for user in sts_users
+    ) == [[("Udvikler", False), ("Udvikler", True)], [("Udvikler", True)]]
@@ -15,6 +15,8 @@ from fastapi.encoders import jsonable_encoder
 from os2sync_export.exceptions import NoPositionError
 from os2sync_export.os2sync import WritableOS2SyncClient
 from os2sync_export.os2sync import get_os2sync_client
+from os2sync_export.os2sync import user_changed
+from os2sync_export.os2sync import user_fingerprint
 from os2sync_export.os2sync_models import OrgUnit
 from os2sync_export.os2sync_models import User
 
@@ -168,7 +170,7 @@ async def test_os2sync_upsert_org_unit_ordered_tasks(mock_os2sync_client, respx_
 async def test_update_orgunit_upsert(mock_os2sync_client):
     mock_os2sync_client.upsert_org_unit = AsyncMock()
     await mock_os2sync_client.update_org_unit(o.Uuid, o)
-    mock_os2sync_client.upsert_org_unit.assert_called_with(o)
+    mock_os2sync_client.upsert_org_unit.assert_called_with(o, force=False)
 
 
 @pytest.mark.asyncio
@@ -263,6 +265,47 @@ async def test_get_hierarchy(
     assert users == expected_users
 
 
+@pytest.mark.asyncio
+async def test_get_snapshot(mock_os2sync_client, respx_mock):
+    """Only what tells whether an org_unit or user has changed is kept of the hierarchy"""
+    partial = OrgUnit(Uuid=uuid4(), Name="partial")
+    request_uuid = uuid4()
+    respx_mock.get(
+        f"{mock_os2sync_client.settings.os2sync_api_url}/hierarchy/{request_uuid}"
+    ).mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "Result": {
+                    "OUs": [
+                        {**jsonable_encoder(o2), "Timestamp": "2024-01-01T00:00:00"},
+                        {"Uuid": str(partial.Uuid), "Name": partial.Name},
+                    ],
+                    "Users": [{**u1, "Timestamp": "2024-01-01T00:00:00"}],
+                }
+            },
+        )
+    )
+
+    org_units, users = await mock_os2sync_client.get_snapshot(request_uuid=request_uuid)
+
+    assert org_units == {o2.Uuid: o2, partial.Uuid: None}
+    assert users == {user_uuid: user_fingerprint(u1)}
+    assert not user_changed(u1, users[user_uuid])
+
+
+@pytest.mark.asyncio
+async def test_get_hierarchy_no_connection(mock_os2sync_client, respx_mock):
+    """os2sync returns no result if it can't connect to fk-org"""
+    request_uuid = uuid4()
+    respx_mock.get(
+        f"{mock_os2sync_client.settings.os2sync_api_url}/hierarchy/{request_uuid}"
+    ).mock(return_value=httpx.Response(200, json={"Result": None}))
+
+    with pytest.raises(ConnectionError):
+        await mock_os2sync_client.get_existing_uuids(request_uuid)
+
+
 @pytest.mark.asyncio
 async def test_get_hierarchy_retry(mock_settings, mock_os2sync_client, respx_mock):
     """Test that we retry on http-errors"""
@@ -393,3 +436,101 @@ async def test_dry_run_update_user(dry_run, mock_settings, respx_mock):
         ).mock(return_value=httpx.Response(200))
 
     await client.update_user(user)
+
+
+@pytest.mark.asyncio
+async def test_os2sync_upsert_org_unit_from_snapshot_no_changes(mock_os2sync_client):
+    """An org_unit identical to its entry in the hierarchy is not written"""
+    mock_os2sync_client.os2sync_post = AsyncMock()
+    mock_os2sync_client.os2sync_get_org_unit = AsyncMock()
+
+    written = await mock_os2sync_client.upsert_org_unit_from_snapshot(o, {o.Uuid: o2})
+
+    assert not written
+    mock_os2sync_client.os2sync_post.assert_not_awaited()
+    mock_os2sync_client.os2sync_get_org_unit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_os2sync_upsert_org_unit_from_snapshot_changes(mock_os2sync_client):
+    """Fields from fk-org are merged from the hierarchy entry when the org_unit has changed"""
+    mock_os2sync_client.os2sync_post = AsyncMock()
+    org_unit = o.copy(update={"Name": "Changed name"})
+
+    written = await mock_os2sync_client.upsert_org_unit_from_snapshot(
+        org_unit, {o.Uuid: o2}
+    )
+
+    assert written
+    mock_os2sync_client.os2sync_post.assert_awaited_once_with(
+        "{BASE}/orgUnit/", json=o2.copy(update={"Name": "Changed name"}).json()
+    )
+
+
+@pytest.mark.asyncio
+async def test_os2sync_upsert_org_unit_from_snapshot_partial_entry(
+    mock_os2sync_client,
+):
+    """Entries without every field can't be compared, so we fall back to reading the org_unit from os2sync"""
+    mock_os2sync_client.upsert_org_unit = AsyncMock()
+
+    written = await mock_os2sync_client.upsert_org_unit_from_snapshot(o, {o.Uuid: None})
+
+    assert written
+    mock_os2sync_client.upsert_org_unit.assert_awaited_once_with(o, force=True)
+
+
+@pytest.mark.parametrize(
+    "entry,expected",
+    [
+        (None, True),
+        ({"Uuid": u1["Uuid"], "UserId": "bsg"}, True),
+        (u1, False),
+        ({**u1, "Timestamp": "2024-01-01T00:00:00"}, False),
+        ({**u1, "Email": "changed@digital-identity.dk"}, True),
+    ],
+)
+def test_user_changed(entry, expected):
+    assert user_changed(u1, entry and user_fingerprint(entry)) == expected
+
+
+def test_user_changed_hierarchy_entry():
+    """A payload from `get_sts_user_raw` compared with the users entry in fk-org"""
+    position = {"OrgUnitUuid": str(o.Uuid), "Name": "Udvikler"}
+    other_position = {"OrgUnitUuid": str(uuid4()), "Name": "Tester"}
+    payload = {
+        "Uuid": u1["Uuid"],
+        "UserId": "bsg",
+        "Positions": [
+            {**position, "is_primary": True},
+            {**other_position, "is_primary": False},
+        ],
+        "Person": {"Name": "Brian Storm Graversen", "Cpr": None},
+        "Email": "bsg@digital-identity.dk",
+        "PhoneNumber": None,
+        "Landline": None,
+        "Location": None,
+    }
+    # fk-org leaves out empty fields and doesn't know of is_primary
+    entry = {
+        "Uuid": u1["Uuid"],
+        "UserId": "bsg",
+        "Positions": [other_position, position],
+        "Person": {"Name": "Brian Storm Graversen"},
+        "Email": "bsg@digital-identity.dk",
+        "Timestamp": "2024-01-01T00:00:00",
+    }
+    assert not user_changed(payload, user_fingerprint(entry))
+    assert user_changed({**payload, "Location": "Kontor 15"}, user_fingerprint(entry))
+    assert user_changed(payload, user_fingerprint({**entry, "Positions": [position]}))
+
+
+def test_user_changed_position_order():
+    positions = [
+        {"OrgUnitUuid": str(uuid4()), "Name": "Udvikler"},
+        {"OrgUnitUuid": str(uuid4()), "Name": "Tester"},
+    ]
+    user = {**u1, "Positions": positions}
+    assert not user_changed(
+        user, user_fingerprint({**u1, "Positions": positions[::-1]})
+    )
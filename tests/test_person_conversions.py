@@ -74,6 +74,14 @@ class TestPersonNameTemplate(unittest.TestCase, MoEmployeeMixin):
         with self.assertRaises(FieldTemplateRenderError):
             person.to_json()
 
+    def test_templates_are_parsed_once(self):
+        settings = self._gen_settings(NICKNAME_TEMPLATE)
+        persons = [Person(self.mock_employee(), settings=settings) for _ in range(2)]
+        self.assertIs(persons[0].field_renderer, persons[1].field_renderer)
+        # Changing the templates gives another renderer
+        other = Person(self.mock_employee(), settings=self._gen_settings("{{ name }}"))
+        self.assertIsNot(other.field_renderer, persons[0].field_renderer)
+
     def _gen_settings(self, template):
         settings = dummy_settings
         settings.sync_cpr = True
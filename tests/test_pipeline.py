@@ -0,0 +1,88 @@
+# SPDX-FileCopyrightText: Magenta ApS
+#
+# SPDX-License-Identifier: MPL-2.0
+import asyncio
+
+import pytest
+
+from os2sync_export.pipeline import iter_pages
+from os2sync_export.pipeline import map_unordered
+
+
+async def numbers(n: int):
+    for i in range(n):
+        yield i
+
+
+async def test_map_unordered_bounded():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def double(i: int) -> int:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.001 * (i % 3))
+        in_flight -= 1
+        return 2 * i
+
+    results = [r async for r in map_unordered(double, numbers(20), concurrency=4)]
+
+    assert sorted(results) == [2 * i for i in range(20)]
+    assert max_in_flight == 4
+
+
+async def test_map_unordered_cancels_on_error():
+    cancelled = 0
+
+    async def work(i: int) -> int:
+        nonlocal cancelled
+        if i == 0:
+            raise ValueError(i)
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+        return i
+
+    with pytest.raises(ValueError):
+        [r async for r in map_unordered(work, range(10), concurrency=3)]
+    await asyncio.sleep(0)
+    assert cancelled == 2
+
+
+class Page:
+    def __init__(self, items: list[int], next_cursor: int | None) -> None:
+        self.items = items
+        self.page_info = type("PageInfo", (), {"next_cursor": next_cursor})
+
+
+async def test_iter_pages_reads_ahead():
+    cursors = []
+    cancelled = False
+
+    async def fetch(cursor: int | None) -> Page:
+        nonlocal cancelled
+        cursors.append(cursor)
+        if cursor == 2:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+        return Page([cursor or 0], next_cursor=(cursor or 0) + 1)
+
+    pages = iter_pages(fetch)
+    assert (await pages.__anext__()).items == [0]
+    await asyncio.sleep(0)
+    # The next page is requested before the current page has been processed
+    assert cursors == [None, 1]
+    assert (await pages.__anext__()).items == [1]
+    await asyncio.sleep(0)
+
+    # Closing the iterator cancels the page being read ahead
+    await pages.aclose()
+    await asyncio.sleep(0)
+    assert cursors == [None, 1, 2]
+    assert cancelled
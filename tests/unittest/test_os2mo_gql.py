@@ -9,6 +9,7 @@ from uuid import uuid4
 import pytest
 from more_itertools import one
 
+from os2sync_export.autogenerated_graphql_client import ClassFilter
 from os2sync_export.autogenerated_graphql_client.find_address_unit_or_person import (
     FindAddressUnitOrPersonAddresses,
 )
@@ -34,6 +35,12 @@ from os2sync_export.autogenerated_graphql_client.fragments import (
     AddressFieldsVisibility,
 )
 from os2sync_export.autogenerated_graphql_client.fragments import UnitFieldsItusers
+from os2sync_export.autogenerated_graphql_client.read_all_employee_uuids import (
+    ReadAllEmployeeUuidsEmployees,
+)
+from os2sync_export.autogenerated_graphql_client.read_org_unit_subtree_uuids import (
+    ReadOrgUnitSubtreeUuidsOrgUnits,
+)
 from os2sync_export.autogenerated_graphql_client.read_orgunit import (
     ReadOrgunitOrgUnitsObjectsCurrent,
 )
@@ -89,7 +96,10 @@ from os2sync_export.os2mo_gql import convert_to_os2sync
 from os2sync_export.os2mo_gql import filter_relevant_orgunit
 from os2sync_export.os2mo_gql import find_object_person
 from os2sync_export.os2mo_gql import find_object_unit
+from os2sync_export.os2mo_gql import iter_org_unit_uuid_pages
 from os2sync_export.os2mo_gql import mo_orgunit_to_os2sync
+from os2sync_export.os2mo_gql import read_all_person_uuids
+from os2sync_export.os2mo_gql import read_org_unit_subtree_parents
 from os2sync_export.os2mo_gql import sync_mo_user_to_fk_org
 
 TOP_UNIT_UUID = UUID("baccbf9b-d699-4118-a6fe-aeb813631a15")
@@ -293,11 +303,13 @@ async def test_sync_mo_user_to_fk_one_it_user(
         uuid=uuid4(),
         settings=mock_settings,
         os2sync_client=os2sync_client,
+        force=True,
     )
     os2sync_client.delete_user.assert_not_called()
     ituser = it_users.objects[0].current.itusers[0]
     os2sync_client.update_user.assert_called_once_with(
-        convert_to_os2sync(mock_settings, ituser, UUID(ituser.external_id))
+        convert_to_os2sync(mock_settings, ituser, UUID(ituser.external_id)),
+        force=True,
     )
 
 
@@ -1208,3 +1220,80 @@ def test_find_unit_or_person_objects_none(response_model):
 
     assert unit_result == set()
     assert person_result == set()
+
+
+async def test_read_all_person_uuids(mock_graphql_client):
+    uuids = [uuid4() for _ in range(3)]
+    mock_graphql_client.read_all_employee_uuids.side_effect = [
+        ReadAllEmployeeUuidsEmployees.parse_obj(
+            {
+                "page_info": {"next_cursor": "MA=="},
+                "objects": [{"uuid": uuids[0]}, {"uuid": uuids[1]}],
+            }
+        ),
+        ReadAllEmployeeUuidsEmployees.parse_obj(
+            {"page_info": {"next_cursor": None}, "objects": [{"uuid": uuids[2]}]}
+        ),
+    ]
+    assert await read_all_person_uuids(mock_graphql_client, limit=2) == set(uuids)
+    assert mock_graphql_client.read_all_employee_uuids.await_args_list[1].kwargs == {
+        "limit": 2,
+        "cursor": "MA==",
+    }
+
+
+async def test_iter_org_unit_uuid_pages(mock_graphql_client):
+    root, child, hierarchy = uuid4(), uuid4(), uuid4()
+    mock_graphql_client.read_org_unit_subtree_uuids.side_effect = [
+        ReadOrgUnitSubtreeUuidsOrgUnits.parse_obj(
+            {"page_info": {"next_cursor": "MA=="}, "objects": [{"uuid": root}]}
+        ),
+        ReadOrgUnitSubtreeUuidsOrgUnits.parse_obj(
+            {"page_info": {"next_cursor": None}, "objects": [{"uuid": child}]}
+        ),
+    ]
+
+    pages = [
+        page
+        async for page in iter_org_unit_uuid_pages(
+            mock_graphql_client, root=root, hierarchy_uuids=(hierarchy,), limit=1
+        )
+    ]
+
+    assert pages == [[root], [child]]
+    assert mock_graphql_client.read_org_unit_subtree_uuids.await_args_list[
+        1
+    ].kwargs == {
+        "root": root,
+        "hierarchy": ClassFilter(uuids=[hierarchy], from_date=None, to_date=None),
+        "limit": 1,
+        "cursor": "MA==",
+    }
+
+
+async def test_read_org_unit_subtree_parents(mock_graphql_client):
+    child, no_current = uuid4(), uuid4()
+    mock_graphql_client.read_org_unit_subtree_uuids.return_value = (
+        ReadOrgUnitSubtreeUuidsOrgUnits.parse_obj(
+            {
+                "page_info": {"next_cursor": None},
+                "objects": [
+                    {"uuid": TOP_UNIT_UUID, "current": {"parent": None}},
+                    {"uuid": child, "current": {"parent": {"uuid": TOP_UNIT_UUID}}},
+                    {"uuid": no_current, "current": None},
+                ],
+            }
+        )
+    )
+    assert await read_org_unit_subtree_parents(
+        mock_graphql_client, root=TOP_UNIT_UUID
+    ) == {
+        TOP_UNIT_UUID: None,
+        child: TOP_UNIT_UUID,
+    }
+    assert mock_graphql_client.read_org_unit_subtree_uuids.await_args.kwargs == {
+        "root": TOP_UNIT_UUID,
+        "hierarchy": None,
+        "limit": 1_000,
+        "cursor": None,
+    }